@@ -19,11 +19,39 @@ def create_app():
     from app.routes.health import health_bp
     app.register_blueprint(health_bp)
 
+    from app.routes.admin import admin_bp
+    app.register_blueprint(admin_bp)
+
     with app.app_context():
         db.create_all()
 
+    start_chat_service(app)
+
     # Initialize Prometheus metrics
     if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
         PrometheusMetrics(app, path="/metrics")
         
     return app
+
+def start_chat_service(app):
+    """
+    Warm up the RAG pipeline according to CHAT_SERVICE_STARTUP:
+    - "eager": build it now, blocking. Under `gunicorn --preload` this runs once in the
+      master and forked workers inherit the ready vector store.
+    - "background": build it in a daemon thread so the worker starts serving /health at once.
+    - "lazy": build it on the first /chat or /ready request.
+    """
+    mode = app.config.get('CHAT_SERVICE_STARTUP', 'lazy')
+    watch_interval = float(app.config.get('KNOWLEDGE_BASE_WATCH_INTERVAL', 0))
+    if mode not in ('lazy', 'eager', 'background'):
+        raise ValueError(f"Unknown CHAT_SERVICE_STARTUP mode: {mode}")
+    if mode == 'lazy' and watch_interval <= 0:
+        return
+
+    from app.services.chat import initialize_chat_service, start_background_initialization, start_knowledge_base_watcher
+    if mode == 'eager':
+        initialize_chat_service()
+    elif mode == 'background':
+        start_background_initialization()
+    # Reloads are skipped until the pipeline exists, so a lazy service still picks up edits.
+    start_knowledge_base_watcher(watch_interval)
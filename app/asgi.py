@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app.extensions import CORS_ORIGINS
+from app.routes.auth import AuthError, authenticate
+from app.routes.chat import (
+    chat_failed_requests_total,
+    chat_requests_total,
+    chat_input,
+    chat_payload,
+    chat_response_latency_seconds,
+    REJECTED_MESSAGE,
+    load_conversation,
+    record_cache_result,
+    record_chat_event,
+    remember_exchange,
+    user_key,
+    user_rate_limiter,
+)
+from app.services.chat import agenerate_rag_answer, message_content
+from app.services.rate_limit import ChatRejected
+from app.services.timing import span, track_request
+
+
+logger = logging.getLogger(__name__)
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def _cors_headers(headers):
+    """Mirror the Flask-CORS policy from app.extensions for responses served outside Flask."""
+    origin = headers.get(b"origin", b"").decode("latin-1")
+    if origin not in CORS_ORIGINS:
+        return []
+    return [
+        (b"access-control-allow-origin", origin.encode("latin-1")),
+        (b"access-control-allow-credentials", b"true"),
+        (b"vary", b"Origin"),
+    ]
+
+
+async def _send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            *extra_headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def create_asgi_app(flask_app=None):
+    """
+    ASGI application serving `POST /chat` natively on the event loop through
+    agenerate_rag_answer, so embedding and LLM round-trips do not pin a worker thread per
+    request. Every other route (auth, health, metrics, streaming) is delegated to the
+    regular Flask app through a WSGI adapter.
+    """
+    if flask_app is None:
+        from app import create_app
+        flask_app = create_app()
+    wsgi_app = WsgiToAsgi(flask_app)
+
+    def authenticate_request(auth_header):
+        with flask_app.app_context():
+            return authenticate(auth_header, flask_app.config['SECRET_KEY'])
+
+    def timing_headers(timings):
+        if not flask_app.config.get('CHAT_TIMING_HEADER') or not timings.stages:
+            return []
+        return [(b"server-timing", timings.server_timing().encode("latin-1"))]
+
+    async def handle_chat(scope, receive, send):
+        with track_request() as timings:
+            await respond_chat(scope, receive, send, timings)
+
+    async def respond_chat(scope, receive, send, timings):
+        headers = dict(scope["headers"])
+        cors = _cors_headers(headers)
+        try:
+            with span("auth"):
+                current_user = await asyncio.to_thread(authenticate_request, headers.get(b"authorization", b"").decode("latin-1"))
+        except AuthError as e:
+            await _send_json(send, 401, {"error": str(e)}, cors)
+            return
+
+        chat_requests_total.inc()
+        start_time = time.time()
+        message = ""
+        try:
+            data = json.loads(await _read_body(receive) or b"{}")
+            message = data.get("message", "")
+            logger.info(f"Received chat request from user '{current_user}' ({len(message)} chars).")
+            user_rate_limiter.acquire(user_key(current_user))
+            conversation = await asyncio.to_thread(load_conversation, current_user)
+            result = await agenerate_rag_answer(chat_input(conversation, message))
+            response_content = message_content(result["messages"][-1]) or "Error processing request"
+            record_cache_result(result.get("cache"))
+            await asyncio.to_thread(remember_exchange, current_user, message, response_content)
+            logger.info(f"Sending chat response to user '{current_user}' ({len(response_content)} chars).")
+            chat_response_latency_seconds.observe(time.time() - start_time)
+            record_chat_event("chat", current_user, message, start_time, 200, response_content, result)
+            await _send_json(send, 200, chat_payload(response_content, result), [*cors, *timing_headers(timings)])
+        except ChatRejected as e:
+            logger.warning(f"Chat request rejected ({e.reason}): {e}")
+            chat_response_latency_seconds.observe(time.time() - start_time)
+            record_chat_event("chat", current_user, message, start_time, e.status_code, error=e.reason)
+            retry_after = (b"retry-after", e.retry_after_header.encode("ascii"))
+            await _send_json(send, e.status_code, {"error": REJECTED_MESSAGE}, [*cors, retry_after])
+        except Exception as e:
+            chat_failed_requests_total.inc()
+            logger.error(f"Failed to process chat request: {e}")
+            chat_response_latency_seconds.observe(time.time() - start_time)
+            record_chat_event("chat", current_user, message, start_time, 500, error=str(e))
+            await _send_json(send, 500, {"response": "Internal server error"}, cors)
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            await _lifespan(receive, send)
+        elif scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/chat":
+            await handle_chat(scope, receive, send)
+        else:
+            await wsgi_app(scope, receive, send)
+
+    return app
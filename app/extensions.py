@@ -1,8 +1,55 @@
+import sqlite3
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
 
 db = SQLAlchemy()
 
 from flask_cors import CORS
 
+CORS_ORIGINS = ["http://localhost:3001", "https://thankful-smoke-08a741103.1.azurestaticapps.net"]
+
 def init_cors(app):
-    CORS(app, origins=["http://localhost:3001", "https://thankful-smoke-08a741103.1.azurestaticapps.net"], supports_credentials=True)
+    CORS(app, origins=CORS_ORIGINS, supports_credentials=True)
+
+def normalize_database_uri(uri):
+    """Accept the ``postgres://`` scheme many hosting providers export, which SQLAlchemy rejects."""
+    if uri.startswith("postgres://"):
+        return "postgresql://" + uri[len("postgres://"):]
+    return uri
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def database_engine_options(uri, pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=1800, busy_timeout=5.0):
+    """
+    SQLAlchemy engine options for ``uri``. File-based SQLite and server databases get a sized
+    connection pool; SQLite also waits up to ``busy_timeout`` seconds for a write lock instead
+    of failing with "database is locked". In-memory SQLite keeps SQLAlchemy's default pool.
+    """
+    url = make_url(uri)
+    if _is_memory_sqlite(url):
+        return {}
+    options = {"pool_size": pool_size, "max_overflow": max_overflow, "pool_timeout": pool_timeout}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"timeout": busy_timeout}
+    else:
+        # Drop connections the server or a proxy closed while they sat idle in the pool.
+        options.update(pool_recycle=pool_recycle, pool_pre_ping=True)
+    return options
+
+@event.listens_for(Engine, "connect")
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """
+    WAL lets readers (logins, token checks) proceed while a registration writes, and
+    synchronous=NORMAL is safe under WAL. Applied to every new SQLite connection.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    finally:
+        cursor.close()
@@ -0,0 +1,35 @@
+import hmac
+import logging
+
+from flask import Blueprint, current_app, jsonify, request
+
+admin_bp = Blueprint('admin', __name__)
+logger = logging.getLogger(__name__)
+
+
+def _is_admin(req):
+    """Compare the X-Admin-Key header with ADMIN_API_KEY; admin endpoints are disabled while it is unset."""
+    expected = current_app.config.get('ADMIN_API_KEY')
+    provided = req.headers.get('X-Admin-Key', '')
+    return bool(expected) and hmac.compare_digest(provided.encode('utf-8'), expected.encode('utf-8'))
+
+
+@admin_bp.route('/admin/reload-knowledge-base', methods=['POST'])
+def reload_knowledge_base():
+    """
+    Re-read the knowledge base files and re-index only the entries that changed, without a
+    restart. Returns the number of added, updated and removed entries and the new version.
+    """
+    if not _is_admin(request):
+        logger.warning("Rejected knowledge base reload: invalid or missing admin key.")
+        return jsonify({'error': 'Forbidden'}), 403
+
+    from app.services import chat as chat_service
+    try:
+        stats = chat_service.reload_knowledge_base()
+    except chat_service.ChatServiceUnavailable:
+        return jsonify({'error': 'Chat service is not initialized'}), 503
+    except Exception as e:
+        logger.error(f"Knowledge base reload failed: {e}")
+        return jsonify({'error': 'Knowledge base reload failed'}), 500
+    return jsonify(stats), 200
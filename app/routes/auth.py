@@ -1,11 +1,15 @@
 from flask import Blueprint, request, jsonify
 import logging
-from prometheus_flask_exporter import Counter
+import os
+from prometheus_flask_exporter import Counter, Gauge, Histogram
 import jwt
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta, timezone
-from werkzeug.security import generate_password_hash, check_password_hash
 from app.extensions import db
 from app.models.user import User
+from app.services.auth_cache import AuthCache, AuthenticatedUser, auth_cache_hits_total, auth_cache_misses_total
+from app.services.passwords import PasswordHasher, PasswordHasherBusy
+from app.services.timing import span
 
 
 
@@ -19,6 +23,36 @@ login_success_total = Counter('login_success_total', 'Total number of successful
 registration_attempts_total = Counter('registration_attempts_total', 'Total number of registration attempts')
 registration_failed_total = Counter('registration_failed_total', 'Total number of failed registration attempts')
 registration_success_total = Counter('registration_success_total', 'Total number of successful registrations')
+password_hash_duration_seconds = Histogram('password_hash_duration_seconds', 'Time spent hashing or verifying passwords in seconds', ['operation'])
+password_hash_queue_depth = Gauge('password_hash_queue_depth', 'Password hashing operations queued or running')
+password_hash_rejected_total = Counter('password_hash_rejected_total', 'Total number of requests rejected because the password hashing queue was full')
+password_rehash_total = Counter('password_rehash_total', 'Total number of stored password hashes upgraded to the current parameters on login')
+
+# Seconds clients are asked to wait (Retry-After) when password hashing is saturated
+PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', '1'))
+password_hasher = PasswordHasher(observe=lambda operation, seconds: password_hash_duration_seconds.labels(operation=operation).observe(seconds))
+password_hash_queue_depth.set_function(lambda: password_hasher.pending)
+
+# Validated tokens and user lookups are cached so protected routes skip the database
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', '10000'))
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', '300'))
+auth_cache = AuthCache(max_entries=AUTH_CACHE_SIZE, ttl_seconds=AUTH_CACHE_TTL)
+
+def hasher_busy_response():
+    password_hash_rejected_total.inc()
+    logger.warning("Password hashing queue is full, asking the client to retry.")
+    return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': str(PASSWORD_HASH_RETRY_AFTER)}
+
+def upgrade_password_hash(user, password):
+    """Re-hash a stored password made with outdated parameters. Failures only cost a retry on a later login."""
+    try:
+        user.password = password_hasher.hash(password)
+        db.session.commit()
+        password_rehash_total.inc()
+        logger.info(f"Upgraded password hash for user '{user.username}'.")
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Could not upgrade password hash for user '{user.username}': {e}")
 
 @auth_bp.route('/users/register', methods=['POST'])
 def register():
@@ -31,14 +65,21 @@ def register():
         logger.warning("Registration failed: missing username or password.")
         registration_failed_total.inc()
         return jsonify({'error': 'Username and password required'}), 400
-    if User.query.filter_by(username=username).first():
-        logger.warning(f"Registration failed: user '{username}' already exists.")
+    try:
+        hashed_pw = password_hasher.hash(password)
+    except PasswordHasherBusy:
         registration_failed_total.inc()
-        return jsonify({'error': 'User already exists'}), 409
-    hashed_pw = generate_password_hash(password)
+        return hasher_busy_response()
     user = User(username=username, password=hashed_pw)
     db.session.add(user)
-    db.session.commit()
+    # The unique constraint on username decides concurrent signups; a pre-query would race.
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        logger.warning(f"Registration failed: user '{username}' already exists.")
+        registration_failed_total.inc()
+        return jsonify({'error': 'User already exists'}), 409
     logger.info(f"User '{username}' registered successfully.")
     registration_success_total.inc()
     return jsonify({'message': 'User registered successfully'}), 201
@@ -51,42 +92,100 @@ def login():
     logger.info(f"Login attempt for username: {username}")
     login_attempts_total.inc()
     user = User.query.filter_by(username=username).first()
-    if not user or not check_password_hash(user.password, password):
+    try:
+        valid = bool(user) and password_hasher.verify(user.password, password)
+    except PasswordHasherBusy:
+        login_failed_total.inc()
+        return hasher_busy_response()
+    if not valid:
         logger.warning(f"Login failed for username: {username}")
         login_failed_total.inc()
         return jsonify({'error': 'Invalid credentials'}), 401
+    if password_hasher.needs_rehash(user.password):
+        upgrade_password_hash(user, password)
     from flask import current_app
     token = jwt.encode({
         'user_id': user.id,
+        'username': user.username,
         'exp': datetime.now(timezone.utc) + timedelta(hours=2)
     }, current_app.config['SECRET_KEY'], algorithm='HS256')
     logger.info(f"User '{username}' logged in successfully.")
     login_success_total.inc()
     return jsonify({'token': token}), 200
 
+class AuthError(Exception):
+    """Authentication failure carrying the message returned to the client with a 401."""
+
+def _load_user(claims, cache):
+    """
+    Resolve token claims to an AuthenticatedUser. The database is only queried to confirm the
+    user still exists when ``cache`` has no recent answer; the username comes from the token
+    when it carries one (tokens issued before the claim existed fall back to the database row).
+    """
+    try:
+        user_id = claims['user_id']
+    except KeyError:
+        raise AuthError('Token is invalid!')
+
+    user = cache.get_user(user_id) if cache is not None else None
+    if user is not None:
+        auth_cache_hits_total.labels(tier='user').inc()
+    else:
+        if cache is not None:
+            auth_cache_misses_total.inc()
+        record = db.session.get(User, user_id)
+        if record is None:
+            logger.warning(f"Token refers to unknown user id {user_id}.")
+            raise AuthError('Token is invalid!')
+        user = AuthenticatedUser(record.id, record.username)
+        if cache is not None:
+            cache.put_user(user)
+    return AuthenticatedUser(user.id, claims.get('username') or user.username)
+
+def authenticate(auth_header, secret_key, cache=auth_cache):
+    """
+    Validate a ``Bearer <jwt>`` Authorization header and return the matching AuthenticatedUser.
+    Raises AuthError with the client-facing message on failure. Needs an app context on a
+    cache miss. Pass ``cache=None`` to always decode the token and query the database.
+    """
+    parts = (auth_header or '').split()
+
+    if len(parts) != 2 or parts[0] != 'Bearer':
+        logger.warning("Token missing or invalid format in request.")
+        raise AuthError('Token is missing or invalid format')
+
+    token = parts[1]
+
+    if cache is not None:
+        user = cache.get_token(token, secret_key)
+        if user is not None:
+            auth_cache_hits_total.labels(tier='token').inc()
+            return user
+
+    try:
+        data = jwt.decode(token, secret_key, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        logger.warning("Token has expired.")
+        raise AuthError('Token has expired')
+    except jwt.InvalidTokenError:
+        raise AuthError('Token is invalid!')
+
+    user = _load_user(data, cache)
+    if cache is not None:
+        cache.put_token(token, secret_key, user, data.get('exp', float('inf')))
+    return user
+
 def token_required(f):
     from functools import wraps
     from flask import current_app
 
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization', '')
-        parts = auth_header.split()
-
-        if len(parts) != 2 or parts[0] != 'Bearer':
-            logger.warning("Token missing or invalid format in request.")
-            return jsonify({'error': 'Token is missing or invalid format'}), 401
-
-        token = parts[1]
-
         try:
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = db.session.get(User, data['user_id'])
-        except jwt.ExpiredSignatureError:
-            logger.warning("Token has expired.")
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token is invalid!'}), 401
+            with span("auth"):
+                current_user = authenticate(request.headers.get('Authorization', ''), current_app.config['SECRET_KEY'])
+        except AuthError as e:
+            return jsonify({'error': str(e)}), 401
 
         return f(current_user, *args, **kwargs)
     return decorated
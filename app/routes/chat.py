@@ -1,8 +1,22 @@
 import os
+import json
+import time
 import openai
 import logging
-from flask import Blueprint, request, jsonify
-from app.services.chat import generate_rag_answer
+from functools import wraps
+from flask import Blueprint, Response, current_app, make_response, request, jsonify, stream_with_context
+from app.services.chat import (
+    ERROR_MESSAGE,
+    UNAVAILABLE_MESSAGE,
+    ChatServiceUnavailable,
+    generate_rag_answer,
+    generate_rag_answers,
+    stream_rag_answer,
+)
+from app.services.chat_events import emit_chat_event
+from app.services.conversation import Conversation, get_conversation_memory
+from app.services.rate_limit import ChatRejected, UserRateLimiter
+from app.services.timing import profiler, track_request
 from prometheus_flask_exporter import Counter, Histogram
 
 
@@ -12,51 +26,275 @@ logger = logging.getLogger(__name__)
 chat_requests_total = Counter('chat_requests_total', 'Total number of chat requests')
 chat_failed_requests_total = Counter('chat_failed_requests_total', 'Total number of failed chat requests')
 chat_response_latency_seconds = Histogram('chat_response_latency_seconds', 'Chat response latency in seconds')
+chat_cache_hits_total = Counter('chat_cache_hits_total', 'Total number of chat answers served from the response cache', ['tier'])
+chat_cache_misses_total = Counter('chat_cache_misses_total', 'Total number of chat requests that missed the response cache')
+chat_stream_first_token_seconds = Histogram('chat_stream_first_token_seconds', 'Time to first streamed token in seconds')
+chat_stream_duration_seconds = Histogram('chat_stream_duration_seconds', 'Total duration of streamed chat responses in seconds')
+chat_batch_size = Histogram('chat_batch_size', 'Number of questions per /chat/batch request', buckets=(1, 5, 10, 25, 50, 100, 250, 500))
+chat_batch_failed_items_total = Counter('chat_batch_failed_items_total', 'Total number of /chat/batch questions that returned an error')
+
+# Maximum number of questions accepted by one /chat/batch request
+CHAT_BATCH_MAX_ITEMS = int(os.environ.get("CHAT_BATCH_MAX_ITEMS", "100"))
+
+# Per-user token bucket, configured through CHAT_RATE_LIMIT_PER_MINUTE / CHAT_RATE_LIMIT_BURST
+user_rate_limiter = UserRateLimiter()
+
+REJECTED_MESSAGE = "Demasiadas solicitudes en este momento. Por favor, inténtalo de nuevo en unos segundos."
+
+def record_cache_result(cache_tier):
+    if cache_tier == "miss":
+        chat_cache_misses_total.inc()
+    elif cache_tier:
+        chat_cache_hits_total.labels(tier=cache_tier).inc()
+
+def timed_request(f):
+    """
+    Collect per-stage timings (auth included) for the wrapped view, run it under the sampling
+    slow-request profiler, and expose the breakdown in a Server-Timing header when
+    CHAT_TIMING_HEADER is enabled.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        with track_request() as timings, profiler.profile(request.endpoint or "request"):
+            response = make_response(f(*args, **kwargs))
+        if current_app.config.get('CHAT_TIMING_HEADER') and timings.stages:
+            response.headers['Server-Timing'] = timings.server_timing()
+        return response
+    return wrapper
+
+def user_key(current_user):
+    return getattr(current_user, "id", current_user)
+
+def load_conversation(current_user):
+    """The user's stored conversation; chat keeps working without history if the store fails."""
+    try:
+        return get_conversation_memory().load(user_key(current_user))
+    except Exception as e:
+        logger.warning(f"Could not load conversation history: {e}")
+        return Conversation()
+
+def remember_exchange(current_user, message, answer):
+    if not answer or answer in (ERROR_MESSAGE, UNAVAILABLE_MESSAGE):
+        return
+    try:
+        get_conversation_memory().record(user_key(current_user), message, answer)
+    except Exception as e:
+        logger.warning(f"Could not store conversation history: {e}")
+
+def rejected_response(error):
+    """429/503 answer with Retry-After for a request refused by admission control."""
+    logger.warning(f"Chat request rejected ({error.reason}): {error}")
+    response = jsonify({"error": REJECTED_MESSAGE})
+    response.status_code = error.status_code
+    response.headers["Retry-After"] = error.retry_after_header
+    return response
+
+def chat_payload(response_content, result):
+    """Response body; answers served straight from an FAQ entry carry their "source" for auditing."""
+    payload = {"response": response_content}
+    if result.get("source"):
+        payload["source"] = result["source"]
+    return payload
+
+def record_chat_event(endpoint, current_user, message, start_time, status, response=None, result=None, error=None):
+    """Structured record of one question and its answer (or failure), written off the request path."""
+    event = {
+        "ts": time.time(),
+        "endpoint": endpoint,
+        "user": str(user_key(current_user)),
+        "status": status,
+        "latency_ms": round((time.time() - start_time) * 1e3, 1),
+        "message": message,
+        "response": response,
+    }
+    for key in ("cache", "source"):
+        if result and result.get(key):
+            event[key] = result[key]
+    if error:
+        event["error"] = error
+    emit_chat_event(event)
+
+def record_batch_failure(current_user, messages, start_time, status, error):
+    """One event per question of a batch that failed as a whole, like the per-item events of a successful one."""
+    for message in messages:
+        record_chat_event("chat_batch", current_user, message, start_time, status, error=error)
+
+def chat_input(conversation, message):
+    """Chat state with the stored history before the new user message."""
+    return {
+        "messages": [*conversation.messages, {"role": "user", "content": message}],
+        "summary": conversation.summary,
+    }
 
 def handle_chat_request(current_user):
     chat_requests_total.inc()
-    import time
     start_time = time.time()
     data = request.get_json()
     message = data.get("message", "")
-    logger.info(f"Received chat request from user '{current_user}': {message}")
-
-    input = {
-        "messages": [
-            {
-                "role": "user",
-                "content": message
-            }
-        ]
-    }
+    logger.debug(f"Received chat request from user '{current_user}' ({len(message)} chars).")
 
     try:
+        user_rate_limiter.acquire(user_key(current_user))
+        input = chat_input(load_conversation(current_user), message)
         result = generate_rag_answer(input)
         response_message = result["messages"][-1]
 
+        record_cache_result(result.get("cache"))
+
         # Handle both dict and object responses
         if isinstance(response_message, dict):
             response_content = response_message.get("content", "Error processing request")
         else:
             response_content = response_message.content
 
-        logger.info(f"Sending chat response to user '{current_user}': {response_content}")
+        remember_exchange(current_user, message, response_content)
+        logger.info(f"Sending chat response to user '{current_user}' ({len(response_content)} chars).")
+        chat_response_latency_seconds.observe(time.time() - start_time)
+        record_chat_event("chat", current_user, message, start_time, 200, response_content, result)
+        return jsonify(chat_payload(response_content, result))
+    except ChatRejected as e:
         chat_response_latency_seconds.observe(time.time() - start_time)
-        return jsonify({"response": response_content})
+        record_chat_event("chat", current_user, message, start_time, e.status_code, error=e.reason)
+        return rejected_response(e)
     except Exception as e:
         chat_failed_requests_total.inc()
         logger.error(f"Failed to process chat request: {e}")
         chat_response_latency_seconds.observe(time.time() - start_time)
+        record_chat_event("chat", current_user, message, start_time, 500, error=str(e))
         return jsonify({"response": "Internal server error"}), 500
 
+def handle_chat_batch_request(current_user):
+    """
+    Answer a list of independent questions (no conversation memory) in one request. The
+    response holds one entry per question, in order: {"response": ...} or {"error": ...}.
+    """
+    chat_requests_total.inc()
+    start_time = time.time()
+    data = request.get_json(silent=True) or {}
+    messages = data.get("messages")
+    if not isinstance(messages, list) or not messages or not all(isinstance(m, str) and m.strip() for m in messages):
+        return jsonify({"error": "'messages' must be a non-empty list of questions"}), 400
+    if len(messages) > CHAT_BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {CHAT_BATCH_MAX_ITEMS} messages per batch"}), 400
+    logger.info(f"Received batch chat request from user '{current_user}' with {len(messages)} messages.")
+    chat_batch_size.observe(len(messages))
+
+    try:
+        user_rate_limiter.acquire(user_key(current_user), cost=len(messages))
+        results = generate_rag_answers(messages)
+    except ChatRejected as e:
+        chat_response_latency_seconds.observe(time.time() - start_time)
+        record_batch_failure(current_user, messages, start_time, e.status_code, e.reason)
+        return rejected_response(e)
+    except ChatServiceUnavailable as e:
+        chat_failed_requests_total.inc()
+        logger.error(f"Chat service unavailable: {e}.")
+        chat_response_latency_seconds.observe(time.time() - start_time)
+        record_batch_failure(current_user, messages, start_time, 503, str(e))
+        return jsonify({"error": UNAVAILABLE_MESSAGE}), 503
+    except Exception as e:
+        chat_failed_requests_total.inc()
+        logger.error(f"Failed to process batch chat request: {e}")
+        chat_response_latency_seconds.observe(time.time() - start_time)
+        record_batch_failure(current_user, messages, start_time, 500, str(e))
+        return jsonify({"error": "Internal server error"}), 500
+
+    items = []
+    for message, result in zip(messages, results):
+        record_cache_result(result.get("cache"))
+        if "error" in result:
+            chat_batch_failed_items_total.inc()
+            items.append({"error": result["error"]})
+            record_chat_event("chat_batch", current_user, message, start_time, 500, error=result["error"])
+        else:
+            items.append(chat_payload(result["response"], result))
+            record_chat_event("chat_batch", current_user, message, start_time, 200, result["response"], result)
+    chat_response_latency_seconds.observe(time.time() - start_time)
+    return jsonify({"results": items})
+
+def sse_event(data, event=None):
+    """Format one Server-Sent Event carrying a JSON payload."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def handle_chat_stream_request(current_user):
+    """
+    Stream the answer as Server-Sent Events: one `data: {"token": ...}` event per chunk,
+    then `event: done`, or `event: error` if generation fails midway.
+    """
+    chat_requests_total.inc()
+    start_time = time.time()
+    data = request.get_json()
+    message = data.get("message", "")
+    logger.debug(f"Received streaming chat request from user '{current_user}' ({len(message)} chars).")
+
+    try:
+        user_rate_limiter.acquire(user_key(current_user))
+    except ChatRejected as e:
+        record_chat_event("chat_stream", current_user, message, start_time, e.status_code, error=e.reason)
+        return rejected_response(e)
+    input = chat_input(load_conversation(current_user), message)
+
+    def events():
+        meta = {}
+        first_token = True
+        parts = []
+        try:
+            for token in stream_rag_answer(input, meta=meta):
+                if first_token:
+                    chat_stream_first_token_seconds.observe(time.time() - start_time)
+                    first_token = False
+                parts.append(token)
+                yield sse_event({"token": token})
+            record_cache_result(meta.get("cache"))
+            remember_exchange(current_user, message, "".join(parts))
+            logger.info(f"Finished streaming chat response to user '{current_user}'.")
+            record_chat_event("chat_stream", current_user, message, start_time, 200, "".join(parts), meta)
+            yield sse_event({"source": meta["source"]} if meta.get("source") else {}, event="done")
+        except ChatRejected as e:
+            logger.warning(f"Chat stream rejected ({e.reason}): {e}")
+            record_chat_event("chat_stream", current_user, message, start_time, e.status_code, "".join(parts), error=e.reason)
+            yield sse_event({"error": REJECTED_MESSAGE, "retry_after": e.retry_after_header}, event="error")
+        except Exception as e:
+            chat_failed_requests_total.inc()
+            logger.error(f"Failed to stream chat response: {e}")
+            record_chat_event("chat_stream", current_user, message, start_time, 500, "".join(parts), error=str(e))
+            yield sse_event({"error": "Internal server error"}, event="error")
+        finally:
+            chat_stream_duration_seconds.observe(time.time() - start_time)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 def create_chat_bp():
     from app.routes.auth import token_required
 
     chat_bp = Blueprint('chat', __name__)
 
-    @chat_bp.route("/chat", methods=["POST"])
+    @chat_bp.route("/chat", methods=["POST"], endpoint="chat")
+    @timed_request
     @token_required
     def chat(current_user):
         return handle_chat_request(current_user)
 
+    @chat_bp.route("/chat/stream", methods=["POST"], endpoint="chat_stream")
+    @token_required
+    def chat_stream(current_user):
+        return handle_chat_stream_request(current_user)
+
+    @chat_bp.route("/chat/batch", methods=["POST"], endpoint="chat_batch")
+    @timed_request
+    @token_required
+    def chat_batch(current_user):
+        return handle_chat_batch_request(current_user)
+
+    @chat_bp.route("/chat/history", methods=["DELETE"], endpoint="chat_history")
+    @token_required
+    def clear_chat_history(current_user):
+        get_conversation_memory().clear(user_key(current_user))
+        return jsonify({"message": "Conversation history cleared"})
+
     return chat_bp
@@ -8,3 +8,21 @@ def health():
     Health check endpoint. Returns 200 OK if the service is up.
     """
     return jsonify({"status": "ok"}), 200
+
+
+@health_bp.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness check endpoint. Returns 200 once the RAG pipeline is warm and 503 while it is
+    still being built ("initializing") or after the last attempt failed ("failed"), so load
+    balancers only route chat traffic to ready workers. A probe starts the build in the
+    background when nothing else has (lazy startup) and retries a failed one.
+    """
+    from app.services import chat as chat_service
+    if chat_service.is_initialized:
+        return jsonify({"status": "ready"}), 200
+    failed = chat_service.init_error is not None
+    chat_service.start_background_initialization()
+    if failed:
+        return jsonify({"status": "failed"}), 503
+    return jsonify({"status": "initializing"}), 503
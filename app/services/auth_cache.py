@@ -0,0 +1,90 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from prometheus_flask_exporter import Counter
+
+
+auth_cache_hits_total = Counter('auth_cache_hits_total', 'Total number of authentications served from cache', ['tier'])
+auth_cache_misses_total = Counter('auth_cache_misses_total', 'Total number of authentications that needed a database lookup')
+
+
+class AuthenticatedUser(NamedTuple):
+    """The identity a protected route receives: enough for /chat without a database session."""
+    id: int
+    username: str
+
+    def __str__(self):
+        return self.username
+
+
+class AuthCache:
+    """
+    Bounded TTL cache in front of JWT validation.
+
+    - Token tier: a token already validated in this process skips signature checks entirely.
+      Entries never outlive the token's own ``exp`` claim.
+    - User tier: confirms the user behind a token still exists without a database round-trip,
+      for up to ``ttl_seconds`` after the last lookup.
+
+    ``invalidate_user`` drops a user and every cached token of theirs, so the next request goes
+    back to the database (e.g. after deleting the user or changing their password). The cache
+    is per process: other workers pick up a change when their entries expire.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=300, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._tokens = OrderedDict()  # key -> (AuthenticatedUser, expires_at)
+        self._users = OrderedDict()  # user id -> (AuthenticatedUser, expires_at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _token_key(token, secret_key):
+        # The signing key is part of the key so a token validated under one secret is never reused under another.
+        return hashlib.sha256(f"{secret_key}\0{token}".encode("utf-8")).digest()
+
+    def _get(self, entries, key):
+        with self._lock:
+            entry = entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= self.clock():
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            return entry[0]
+
+    def _put(self, entries, key, value, expires_at):
+        with self._lock:
+            entries[key] = (value, expires_at)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def get_token(self, token, secret_key):
+        return self._get(self._tokens, self._token_key(token, secret_key))
+
+    def put_token(self, token, secret_key, user, token_expires_at):
+        expires_at = min(self.clock() + self.ttl_seconds, token_expires_at)
+        self._put(self._tokens, self._token_key(token, secret_key), user, expires_at)
+
+    def get_user(self, user_id):
+        return self._get(self._users, user_id)
+
+    def put_user(self, user):
+        self._put(self._users, user.id, user, self.clock() + self.ttl_seconds)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+            for key in [key for key, (user, _) in self._tokens.items() if user.id == user_id]:
+                del self._tokens[key]
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
@@ -1,14 +1,28 @@
 from dotenv import load_dotenv
-import glob
+import asyncio
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import NamedTuple
 
-from langchain_community.document_loaders import TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.vectorstores import InMemoryVectorStore
 from langchain_openai import OpenAIEmbeddings
-from langchain.tools.retriever import create_retriever_tool
+from langchain_core.tools import BaseTool
 from langgraph.graph import MessagesState
 from langchain.chat_models import init_chat_model
+from app.services.context import build_context, chat_prompt_tokens, get_token_counter
+from app.services.embedding_cache import PersistentEmbeddingCache, QueryEmbeddingCache, embed_queries, replace_base_embeddings
+from app.services.knowledge_base import KnowledgeBaseWatcher, load_faq_documents
+from app.services.knowledge_index import build_snapshot, index_changes, open_shared_snapshot, share_snapshot, update_snapshot
+from app.services.model_router import ModelRouter
+from app.services.rate_limit import ChatRejected, LLMGuard
+from app.services.response_cache import ResponseCache
+from app.services.single_flight import SingleFlight
+from app.services.text import normalize_text
+from app.services.timing import span
+from prometheus_flask_exporter import Counter, Histogram
 
 
 # Configure logging
@@ -21,91 +35,712 @@ load_dotenv()
 # Model configuration
 MODEL_NAME = "openai:gpt-4.1"
 MODEL_TEMPERATURE = 0
+# Faster, cheaper model for greetings and short lookups; low-confidence answers escalate to
+# MODEL_NAME (empty sends every question to MODEL_NAME)
+FAST_MODEL_NAME = os.environ.get("FAST_MODEL_NAME", "openai:gpt-4.1-mini")
+
+# Chunk embeddings are cached on disk and shared across workers and restarts
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", "instance/embedding_cache")
+
+# The vector index is memory-mapped from here so all workers share one copy (empty keeps it in process memory)
+VECTOR_INDEX_DIR = os.environ.get("VECTOR_INDEX_DIR", "instance/vector_index")
+
+# Query embeddings are cached in-process, optionally backed by a SQLite file shared across workers
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+QUERY_EMBEDDING_CACHE_TTL = float(os.environ.get("QUERY_EMBEDDING_CACHE_TTL", "86400"))
+QUERY_EMBEDDING_CACHE_DB = os.environ.get("QUERY_EMBEDDING_CACHE_DB") or None
+
+# Maximum number of tokens of retrieved knowledge base context included in each prompt
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1200"))
+
+# Answer cache: exact normalized-query tier plus an embedding-similarity tier
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", "0.95"))
+
+# Minimum seconds between initialization attempts started by /ready after a failed one
+CHAT_SERVICE_INIT_RETRY_INTERVAL = float(os.environ.get("CHAT_SERVICE_INIT_RETRY_INTERVAL", "10"))
+
+# Maximum number of LLM calls in flight for one batch of questions
+BATCH_LLM_CONCURRENCY = int(os.environ.get("BATCH_LLM_CONCURRENCY", "4"))
+
+knowledge_base_reload_duration_seconds = Histogram('knowledge_base_reload_duration_seconds', 'Duration of knowledge base reloads in seconds')
+knowledge_base_reload_changes_total = Counter('knowledge_base_reload_changes_total', 'Knowledge base entries changed by reloads', ['change'])
+chat_answers_total = Counter('chat_answers_total', 'Chat answers by source: faq, cache and coalesced answers are served without their own LLM call', ['source'])
+
+# Every LLM call goes through the guard: global concurrency cap, retries with backoff, circuit breaker
+llm_guard = LLMGuard()
+# Identical concurrent questions share one in-flight retrieval and generation
+single_flight = SingleFlight()
 
 # Global variables
 response_model = None
-retriever_tool = None
+embeddings = None
+response_cache = None
+knowledge = None  # current KnowledgeSnapshot; replaced as a whole on reload
 is_initialized = False
+init_error = None  # message of the last failed initialization, cleared once one succeeds
+_init_failed_at = None
+_init_lock = threading.Lock()
+_init_thread = None
+_init_thread_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_watcher = None
+
+def _build_embeddings():
+    query_embeddings = QueryEmbeddingCache(
+        OpenAIEmbeddings(),
+        max_entries=QUERY_EMBEDDING_CACHE_SIZE,
+        ttl_seconds=QUERY_EMBEDDING_CACHE_TTL,
+        db_path=QUERY_EMBEDDING_CACHE_DB,
+    )
+    return PersistentEmbeddingCache(query_embeddings, EMBEDDING_CACHE_DIR)
+
+def _shared(snapshot):
+    """``snapshot`` on the memory-mapped index shared by all workers, if VECTOR_INDEX_DIR is set."""
+    if not VECTOR_INDEX_DIR:
+        return snapshot
+    try:
+        return share_snapshot(snapshot, VECTOR_INDEX_DIR)
+    except Exception as e:
+        logger.warning(f"Could not share the vector index through {VECTOR_INDEX_DIR}, keeping it in memory: {e}")
+        return snapshot
+
+def _published(documents, embeddings):
+    """
+    The snapshot for ``documents`` on the index another worker already published under
+    VECTOR_INDEX_DIR, or None. Mapping it embeds nothing and never copies the vectors into
+    this worker's heap, where freed pages would stay resident.
+    """
+    if not VECTOR_INDEX_DIR:
+        return None
+    try:
+        snapshot = open_shared_snapshot(documents, embeddings, VECTOR_INDEX_DIR)
+    except Exception as e:
+        logger.warning(f"Could not open the shared vector index in {VECTOR_INDEX_DIR}, building it: {e}")
+        return None
+    if snapshot is not None:
+        logger.info(f"Mapped the shared vector index published in {VECTOR_INDEX_DIR}.")
+    return snapshot
+
+def _initial_snapshot(documents, embeddings):
+    """The startup snapshot: the shared index another worker already published, else built and shared."""
+    return _published(documents, embeddings) or _shared(build_snapshot(documents, embeddings))
+
+def _reloaded_snapshot(previous, documents):
+    """
+    ``(snapshot, IndexChanges)`` after a reload: the index another worker already published for
+    ``documents`` if there is one, else ``previous`` updated in memory and then shared.
+    """
+    changes = index_changes(previous, documents)
+    if not changes.total:
+        return previous, changes
+    published = _published(documents, previous.vectorstore.embedding)
+    if published is not None:
+        return published, changes
+    snapshot, changes = update_snapshot(previous, documents)
+    return _shared(snapshot), changes
+
+def _build_model():
+    """The chat model: a ModelRouter over MODEL_NAME and, when configured, FAST_MODEL_NAME."""
+    full = init_chat_model(MODEL_NAME, temperature=MODEL_TEMPERATURE, max_retries=0)
+    fast = init_chat_model(FAST_MODEL_NAME, temperature=MODEL_TEMPERATURE, max_retries=0) if FAST_MODEL_NAME else None
+    return ModelRouter(full, fast)
+
+def _build_pipeline():
+    """Build the chat model, embeddings and knowledge base snapshot."""
+    logger.info("Initializing chat model...")
+    model = _build_model()
+
+    logger.info("Loading knowledge base FAQ entries...")
+    documents = load_faq_documents()
+
+    logger.info(f"Creating vector index, retriever and retriever tool for {len(documents)} FAQ entries...")
+    cached_embeddings = _build_embeddings()
+    snapshot = _initial_snapshot(documents, cached_embeddings)
+    get_token_counter()
+    return model, cached_embeddings, snapshot
 
 def initialize_chat_service():
-    """Initialize OpenAI chat service and RAG components"""
-    global response_model, retriever_tool, is_initialized
-    
+    """
+    Initialize OpenAI chat service and RAG components.
+    Single-flight: concurrent callers wait on a lock and only the first one builds the pipeline.
+    """
+    global response_model, embeddings, response_cache, knowledge, is_initialized, init_error, _init_failed_at
+
     if is_initialized:
         logger.info("Chat service already initialized.")
         return
 
+    with _init_lock:
+        if is_initialized:
+            logger.info("Chat service initialized by a concurrent caller.")
+            return
+        try:
+            response_model, embeddings, knowledge = _build_pipeline()
+            response_cache = ResponseCache(
+                max_entries=RESPONSE_CACHE_SIZE,
+                ttl_seconds=RESPONSE_CACHE_TTL,
+                similarity_threshold=RESPONSE_CACHE_SIMILARITY,
+                embed_query=embeddings.embed_query,
+            )
+            is_initialized = True
+            init_error = None
+            logger.info("Chat service initialized successfully.")
+        except Exception as e:
+            init_error = str(e) or type(e).__name__
+            _init_failed_at = time.monotonic()
+            logger.error(f"Failed to initialize chat service: {e}")
+            logger.error("Chat functionality will be unavailable.")
+
+def start_background_initialization():
+    """
+    Build the pipeline in a daemon thread, unless it is ready, already being built, or the last
+    attempt failed less than CHAT_SERVICE_INIT_RETRY_INTERVAL seconds ago. Returns the thread or None.
+    """
+    global _init_thread
+    if is_initialized:
+        return None
+    with _init_thread_lock:
+        if _init_thread is not None and _init_thread.is_alive():
+            return None
+        if _init_failed_at is not None and time.monotonic() - _init_failed_at < CHAT_SERVICE_INIT_RETRY_INTERVAL:
+            return None
+        _init_thread = threading.Thread(target=initialize_chat_service, name="chat-service-init", daemon=True)
+        _init_thread.start()
+        return _init_thread
+
+def reload_knowledge_base(paths=None):
+    """
+    Re-read the knowledge base and atomically swap in a new snapshot. Only new or changed FAQ
+    entries are embedded; requests already in flight finish on the snapshot they started with.
+    The response cache is invalidated through the knowledge base version. Returns a summary dict.
+    """
+    global knowledge
+    if not is_initialized:
+        raise ChatServiceUnavailable("chat service is not initialized")
+
+    with _reload_lock:
+        start_time = time.perf_counter()
+        snapshot, changes = _reloaded_snapshot(knowledge, load_faq_documents(paths))
+        knowledge = snapshot
+        duration = time.perf_counter() - start_time
+
+    knowledge_base_reload_duration_seconds.observe(duration)
+    for change, count in changes._asdict().items():
+        if count:
+            knowledge_base_reload_changes_total.labels(change=change).inc(count)
+    logger.info(
+        f"Knowledge base reloaded in {duration:.3f}s: {changes.added} added, {changes.updated} updated, "
+        f"{changes.removed} removed (version {snapshot.version})."
+    )
+    return {**changes._asdict(), "version": snapshot.version, "duration_seconds": round(duration, 4)}
+
+def start_knowledge_base_watcher(interval):
+    """Poll the knowledge base files every ``interval`` seconds and hot-reload them on change (once per process)."""
+    global _watcher
+    if interval <= 0 or _watcher is not None:
+        return _watcher
+
+    def on_change():
+        if is_initialized:
+            reload_knowledge_base()
+
+    _watcher = KnowledgeBaseWatcher(on_change, interval)
+    _watcher.start()
+    logger.info(f"Watching knowledge base files every {interval}s for changes.")
+    return _watcher
+
+def _reset_after_fork():
+    """
+    Runs in forked workers (e.g. gunicorn --preload). The vector store built by the master is
+    inherited as-is, but locks, HTTP clients and the watcher thread must not be shared with
+    the parent.
+    """
+    global _init_lock, _init_thread, _init_thread_lock, _reload_lock, _watcher, response_model, llm_guard, single_flight
+    _init_lock = threading.Lock()
+    _init_thread, _init_thread_lock = None, threading.Lock()
+    _reload_lock = threading.Lock()
+    llm_guard = LLMGuard()
+    single_flight = SingleFlight()
+    if _watcher is not None:
+        interval, _watcher = _watcher.interval, None
+        start_knowledge_base_watcher(interval)
+    if not is_initialized:
+        return
     try:
-        logger.info("Initializing chat model...")
-        response_model = init_chat_model(MODEL_NAME, temperature=MODEL_TEMPERATURE)
+        response_model = _build_model()
+        replace_base_embeddings(embeddings, OpenAIEmbeddings())
+    except Exception as e:
+        logger.error(f"Failed to recreate API clients after fork: {e}")
 
-        logger.info("Loading and processing knowledge base documents...")
-        paths = glob.glob("knowledge_base/*.yaml")
-        docs = [TextLoader(path).load() for path in paths]
-        document_list = [item for sublist in docs for item in sublist]
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
-        logger.info("Splitting documents for vector storage...")
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            chunk_size=100, chunk_overlap=50
-        )
-        docs_splits = text_splitter.split_documents(document_list)
+def _semantic_cache(retriever, query):
+    """
+    Whether the response cache may embed ``query`` for its semantic tier. Queries the hybrid
+    retriever answers from BM25 alone skip it, so they need no embedding call at all.
+    """
+    if retriever is None:
+        return True
+    try:
+        return not retriever.takes_lexical_path(query)
+    except Exception as e:
+        logger.warning(f"Lexical fast path check failed, using the semantic cache: {e}")
+        return True
 
-        logger.info("Creating in-memory vector store and retriever...")
-        vectorstore = InMemoryVectorStore.from_documents(
-            documents=docs_splits, embedding=OpenAIEmbeddings()
-        )
-        retriever = vectorstore.as_retriever()
+def _cache_lookup(cache, query, version, semantic=True, vector=None):
+    try:
+        with span("cache_lookup"):
+            return cache.get(query, version, semantic, vector)
+    except Exception as e:
+        logger.warning(f"Response cache lookup failed, continuing without it: {e}")
+        return None, None
 
-        logger.info("Creating retriever tool...")
-        retriever_tool = create_retriever_tool(
-            retriever,
-            "retrieve_blog_posts",
-            "Buscador de información basada en experiencias de viajes de buceo por Colombia",
-        )
-        is_initialized = True
-        logger.info("Chat service initialized successfully.")
+def _cache_store(cache, query, answer, version, semantic=True, vector=None):
+    try:
+        with span("cache_store"):
+            cache.put(query, answer, version, semantic, vector)
+    except Exception as e:
+        logger.warning(f"Could not store answer in response cache: {e}")
+
+def _generate(llm, prompt, query, history=(), summary=""):
+    """One LLM answer for ``prompt``, routed across model tiers when ``llm`` is a ModelRouter."""
+    if isinstance(llm, ModelRouter):
+        return llm.generate(prompt, query, history, summary, call=lambda model, value: llm_guard.call(model.invoke, value))
+    return llm_guard.call(llm.invoke, prompt)
+
+async def _agenerate(llm, prompt, query, history=(), summary=""):
+    if isinstance(llm, ModelRouter):
+        return await llm.agenerate(prompt, query, history, summary, acall=lambda model, value: llm_guard.acall(_ainvoke, model, value))
+    return await llm_guard.acall(_ainvoke, llm, prompt)
+
+def _coalesce_key(query, version):
+    return version, normalize_text(query)
+
+def _shared_answer(result):
+    """A coalesced follower's copy of the leader's answer."""
+    logger.debug("Answer shared with an identical in-flight request.")
+    chat_answers_total.labels(source="coalesced").inc()
+    return {"messages": list(result["messages"])}
+
+def message_content(message):
+    """Text of a chat message, whether it is a dict or a LangChain message object."""
+    if isinstance(message, dict):
+        return message.get("content", "")
+    return message.content
+
+UNAVAILABLE_MESSAGE = "Lo siento, el servicio de chat no está disponible en este momento."
+ERROR_MESSAGE = "Sorry, an error occurred while processing your request."
 
+class ChatServiceUnavailable(RuntimeError):
+    """Raised when the RAG pipeline could not be initialized."""
+
+class _Dependencies(NamedTuple):
+    """What a request is answered with. Injected dependencies leave the optional parts unset."""
+    retriever: object
+    llm: object
+    cache: ResponseCache = None
+    # Knowledge base version the cache and coalescing are keyed on
+    version: str = None
+    faq_matcher: object = None
+    # The snapshot's HybridRetriever: batched retrieval, and which queries take the lexical fast path
+    hybrid: object = None
+
+def _resolve_dependencies(retriever, llm):
+    """
+    The injected retriever and llm without a cache or FAQ fast path, or the current knowledge
+    snapshot's retriever tool, FAQ question index and HybridRetriever with the global model
+    (initialized on demand) and the global response cache.
+    """
+    if retriever is not None and llm is not None:
+        return _Dependencies(retriever, llm)
+    # Initialize if not already done
+    if not is_initialized:
+        logger.info("Chat service not initialized. Initializing now...")
+        initialize_chat_service()
+    # Check if initialization was successful
+    snapshot = knowledge
+    if not is_initialized or response_model is None or snapshot is None:
+        raise ChatServiceUnavailable("retriever or response model not initialized")
+    return _Dependencies(
+        snapshot.retriever_tool, response_model, response_cache, snapshot.version, snapshot.faq_matcher, snapshot.retriever,
+    )
+
+def _faq_match(matcher, query):
+    """The FAQ entry answering ``query`` confidently enough to skip retrieval and the LLM, or None."""
+    if matcher is None:
+        return None
+    try:
+        with span("faq_match"):
+            match = matcher.match(query)
     except Exception as e:
-        logger.error(f"Failed to initialize chat service: {e}")
-        logger.error("Chat functionality will be unavailable.")
+        logger.warning(f"FAQ matching failed, continuing with the RAG path: {e}")
+        return None
+    if match is not None:
+        logger.debug(f"Answer served from FAQ entry {match.document.id} (score {match.score:.2f}) without the LLM.")
+        chat_answers_total.labels(source="faq").inc()
+    return match
+
+def format_history(history, summary=""):
+    """Conversation block for the prompt: the rolling summary, then the recent messages."""
+    parts = []
+    if summary:
+        parts.append(f"Resumen de la conversación:\n{summary}")
+    if history:
+        lines = "\n".join(
+            f"{'Usuario' if _message_role(m) == 'user' else 'Asistente'}: {message_content(m)}" for m in history
+        )
+        parts.append(f"Conversación reciente:\n{lines}")
+    return "\n\n".join(parts)
+
+def build_prompt(query, context, history=(), summary=""):
+    conversation = format_history(history, summary)
+    return (
+        "Rol:Eres un asistente de buceo en Colombia, educado y enfocado en el cliente. "
+        "Siempre debes responder de manera amable y servicial.\n\n"
+        f"Contexto:\n{context}\n\n"
+        + (f"{conversation}\n\n" if conversation else "")
+        + f"Pregunta del usuario: {query}"
+    )
+
+def _message_role(message):
+    if isinstance(message, dict):
+        return message.get("role", "user")
+    return "user" if getattr(message, "type", "") == "human" else "assistant"
+
+def _conversation(state):
+    """Split a chat state into ``(query, history, summary)``: the last message is the question."""
+    messages = state["messages"]
+    return message_content(messages[-1]), list(messages[:-1]), state.get("summary", "")
+
+def _retrieval_query(query, history):
+    """
+    Follow-ups such as "¿y cuánto cuesta?" do not name what they refer to, so retrieval also
+    sees the previous user question.
+    """
+    previous = [message_content(m) for m in history if _message_role(m) == "user"]
+    return f"{previous[-1]} {query}" if previous else query
+
+def _retrieval_input(retriever, query):
+    """
+    Input for ``retriever.invoke``. Retriever tools that return artifacts are called with a tool
+    call so they hand back the scored Documents instead of their pre-joined string content.
+    """
+    if isinstance(retriever, BaseTool) and retriever.response_format == "content_and_artifact":
+        return {"name": retriever.name, "args": {"query": query}, "id": "rag_context", "type": "tool_call"}
+    return {"query": query}
+
+def _retrieval_output(result):
+    return getattr(result, "artifact", None) or getattr(result, "content", result)
+
+def _prompt_from_retrieved(query, retrieved, history=(), summary=""):
+    logger.debug("Retrieved context from knowledge base.")
+    with span("prompt_build"):
+        context = build_context(retrieved, budget=CONTEXT_TOKEN_BUDGET)
+        full_prompt = build_prompt(query, context, history, summary)
+        chat_prompt_tokens.observe(get_token_counter().count(full_prompt))
+    return full_prompt
+
+def _retrieve(retriever, query):
+    with span("retrieval"):
+        return _retrieval_output(retriever.invoke(_retrieval_input(retriever, query)))
+
+async def _aretrieve(retriever, query):
+    with span("retrieval"):
+        return _retrieval_output(await _ainvoke(retriever, _retrieval_input(retriever, query)))
+
+async def _ainvoke(runnable, value):
+    """Await ``ainvoke`` when available, otherwise run the blocking ``invoke`` in a worker thread."""
+    if hasattr(runnable, "ainvoke"):
+        return await runnable.ainvoke(value)
+    return await asyncio.to_thread(runnable.invoke, value)
+
+class _Question:
+    """
+    One question through the answer stages every entry point (sync, asyncio, batch, stream)
+    shares: ``served`` tries the FAQ fast path and then the response cache, ``prompt`` builds
+    the prompt from the retrieved documents and ``generated`` records an LLM answer. The entry
+    points only differ in how they retrieve and call the model.
+
+    Follow-ups (history or a summary) depend on the conversation, so they are neither served
+    from nor stored in the response cache, nor shared with other requests.
+    """
+
+    def __init__(self, deps, query, history=(), summary=""):
+        self.deps = deps
+        self.query = query
+        self.history = list(history)
+        self.summary = summary
+        self.followup = bool(history or summary)
+        self.cache = None if self.followup else deps.cache
+        # Query embedding computed up front by the batch path, reused by the cache and retrieval
+        self.vector = None
+
+    @cached_property
+    def semantic(self):
+        """Whether the response cache may embed the query; lexical fast path queries skip it."""
+        return _semantic_cache(self.deps.hybrid, self.query)
+
+    @property
+    def retrieval_query(self):
+        return _retrieval_query(self.query, self.history)
+
+    def faq(self):
+        """``(answer, {"source": ...})`` from the FAQ fast path, or None."""
+        match = _faq_match(self.deps.faq_matcher, self.query)
+        return None if match is None else (match.answer, {"source": match.source})
+
+    def cached(self):
+        """``(answer, {"cache": tier})`` from the response cache, or None."""
+        if self.cache is None:
+            return None
+        answer, tier = _cache_lookup(self.cache, self.query, self.deps.version, self.semantic, self.vector)
+        if answer is None:
+            return None
+        logger.debug(f"Answer served from {tier} response cache.")
+        chat_answers_total.labels(source="cache").inc()
+        return answer, {"cache": tier}
+
+    def served(self):
+        """An answer that needs neither retrieval nor the LLM, as ``(answer, extra result keys)``, or None."""
+        return self.faq() or self.cached()
+
+    def prompt(self, retrieved):
+        return _prompt_from_retrieved(self.query, retrieved, self.history, self.summary)
+
+    def generated(self, answer):
+        """Count an LLM answer and store it in the response cache. Returns the extra result keys."""
+        chat_answers_total.labels(source="llm").inc()
+        if self.cache is None:
+            return {}
+        _cache_store(self.cache, self.query, answer, self.deps.version, self.semantic, self.vector)
+        return {"cache": "miss"}
+
+def _served_result(answer, extra):
+    return {"messages": [{"role": "assistant", "content": answer}], **extra}
 
 def generate_rag_answer(state: MessagesState, retriever=None, llm=None):
     """
     Generate a RAG answer. Allows dependency injection for retriever and llm for testability.
-    If not provided, uses the global retriever_tool and response_model.
-    """
-    global response_model, retriever_tool, is_initialized
-
-    # Use injected dependencies or fall back to globals
-    if retriever is None or llm is None:
-        # Initialize if not already done
-        if not is_initialized:
-            logger.info("Chat service not initialized. Initializing now...")
-            initialize_chat_service()
-        # Check if initialization was successful
-        if not is_initialized or response_model is None or retriever_tool is None:
-            logger.error("Chat service unavailable: retriever or response model not initialized.")
-            return {"messages": [{"role": "assistant", "content": "Lo siento, el servicio de chat no está disponible en este momento."}]}
-        retriever = retriever_tool
-        llm = response_model
+    If not provided, uses the current knowledge snapshot's retriever tool and the global
+    response_model, and answers are served from / stored in the global response cache. The
+    result then carries a "cache" key set to "exact", "semantic" or "miss".
 
+    Messages before the last one in ``state["messages"]``, plus an optional ``state["summary"]``,
+    are added to the prompt as conversation history; such follow-ups bypass the response cache.
+
+    With the global pipeline, concurrent requests for the same question (same normalized text
+    and knowledge base version) are coalesced: one runs retrieval and generation and the others
+    wait for it and receive a copy of its answer, without a "cache" key.
+
+    Admission-control rejections (ChatRejected: LLM concurrency limit, open circuit, provider
+    still throttling after retries) are raised so the caller can answer with Retry-After.
+    """
     try:
-        query = state["messages"][-1]["content"]
-        logger.info(f"Received user query: {query}")
-        docs = retriever.invoke({"query": query})
-        logger.info("Retrieved context from knowledge base.")
-
-        full_prompt = (
-            "Rol:Eres un asistente de buceo en Colombia, educado y enfocado en el cliente. "
-            "Siempre debes responder de manera amable y servicial.\n\n"
-            f"Contexto:\n{docs}\n\n"
-            f"Pregunta del usuario: {query}"
-        )
+        deps = _resolve_dependencies(retriever, llm)
+    except ChatServiceUnavailable as e:
+        logger.error(f"Chat service unavailable: {e}.")
+        return {"messages": [{"role": "assistant", "content": UNAVAILABLE_MESSAGE}]}
+
+    try:
+        question = _Question(deps, *_conversation(state))
+        logger.debug(f"Received user query ({len(question.query)} chars).")
+        served = question.served()
+        if served is not None:
+            return _served_result(*served)
+        if question.followup or deps.version is None:
+            # Nothing to share the answer with.
+            return _answer(question)
+        result, shared = single_flight.do(_coalesce_key(question.query, deps.version), lambda: _answer(question))
+        return _shared_answer(result) if shared else result
+    except ChatRejected:
+        raise
+    except Exception as e:
+        logger.error(f"Error generating response: {e}")
+        return {"messages": [{"role": "assistant", "content": ERROR_MESSAGE}]}
 
-        logger.info("Sending prompt to LLM.")
-        response = llm.invoke(full_prompt)
-        logger.info("LLM response generated successfully.")
-        return {"messages": [response]}
+def _answer(question):
+    """Retrieval, generation and the bookkeeping of the generated answer for one question."""
+    prompt = question.prompt(_retrieve(question.deps.retriever, question.retrieval_query))
+
+    logger.debug("Sending prompt to LLM.")
+    with span("llm"):
+        response = _generate(question.deps.llm, prompt, question.query, question.history, question.summary)
+    logger.debug("LLM response generated successfully.")
+    return {"messages": [response], **question.generated(message_content(response))}
+
+async def agenerate_rag_answer(state: MessagesState, retriever=None, llm=None):
+    """
+    Asyncio variant of generate_rag_answer for the ASGI entry point: retrieval and generation
+    use ``ainvoke`` so one event loop can multiplex many in-flight chats. Blocking steps
+    (first-time initialization, response cache lookups) run in worker threads.
+    """
+    try:
+        if retriever is None or llm is None:
+            deps = await asyncio.to_thread(_resolve_dependencies, retriever, llm)
+        else:
+            deps = _resolve_dependencies(retriever, llm)
+    except ChatServiceUnavailable as e:
+        logger.error(f"Chat service unavailable: {e}.")
+        return {"messages": [{"role": "assistant", "content": UNAVAILABLE_MESSAGE}]}
+
+    try:
+        question = _Question(deps, *_conversation(state))
+        logger.debug(f"Received user query ({len(question.query)} chars).")
+        served = await asyncio.to_thread(question.served)
+        if served is not None:
+            return _served_result(*served)
+        if question.followup or deps.version is None:
+            return await _aanswer(question)
+        result, shared = await single_flight.ado(_coalesce_key(question.query, deps.version), lambda: _aanswer(question))
+        return _shared_answer(result) if shared else result
+    except ChatRejected:
+        raise
     except Exception as e:
         logger.error(f"Error generating response: {e}")
-        return {"messages": [{"role": "assistant", "content": "Sorry, an error occurred while processing your request."}]}
+        return {"messages": [{"role": "assistant", "content": ERROR_MESSAGE}]}
+
+async def _aanswer(question):
+    """Asyncio counterpart of _answer."""
+    prompt = question.prompt(await _aretrieve(question.deps.retriever, question.retrieval_query))
+
+    logger.debug("Sending prompt to LLM.")
+    with span("llm"):
+        response = await _agenerate(question.deps.llm, prompt, question.query, question.history, question.summary)
+    logger.debug("LLM response generated successfully.")
+    extra = await asyncio.to_thread(question.generated, message_content(response))
+    return {"messages": [response], **extra}
+
+def _embed_for_cache(deps, questions):
+    """
+    Embed every question the response cache's semantic tier will look up in one call, through
+    the snapshot's embeddings, so neither the per-question lookups nor batched retrieval embed
+    them again.
+    """
+    semantic = [question for question in questions if question.cache is not None and question.semantic]
+    if not semantic or deps.hybrid is None:
+        return
+    with span("embedding"):
+        vectors = embed_queries(deps.hybrid.vector_retriever.vectorstore.embeddings, [q.query for q in semantic])
+    for question, vector in zip(semantic, vectors):
+        question.vector = vector
+
+def _batch_retrieve(retriever, queries, vectors=None):
+    """Retrieved context per query, batched when the retriever supports it."""
+    if hasattr(retriever, "batch_retrieve"):
+        if vectors is not None and any(vector is not None for vector in vectors):
+            return retriever.batch_retrieve(queries, vectors=vectors)
+        return retriever.batch_retrieve(queries)
+    return [_retrieval_output(retriever.invoke(_retrieval_input(retriever, query))) for query in queries]
+
+def _invoke_all(llm, prompts, queries, max_concurrency):
+    """
+    Call the LLM for every prompt with at most ``max_concurrency`` in flight (and within the
+    global llm_guard limits), each routed by its query. Failures are returned in place.
+    """
+    def call(prompt, query):
+        try:
+            return _generate(llm, prompt, query)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        return list(executor.map(call, prompts, queries))
+
+def generate_rag_answers(queries, retriever=None, llm=None, max_concurrency=BATCH_LLM_CONCURRENCY):
+    """
+    Answer many independent questions with the same prompt logic as generate_rag_answer, but
+    batched: FAQ matches and cached answers are served first, the remaining queries are embedded
+    in one call and searched as one matrix operation, and LLM calls run with at most
+    ``max_concurrency`` in flight.
+
+    Returns one dict per query, in order: ``{"response": text}`` (plus "cache" when the global
+    response cache is used, or "source" for FAQ answers) or ``{"error": message}``. Raises
+    ChatServiceUnavailable when the pipeline is down.
+    """
+    deps = _resolve_dependencies(retriever, llm)
+    logger.debug(f"Received batch of {len(queries)} user queries.")
+
+    questions = [_Question(deps, query) for query in queries]
+    served = [question.faq() for question in questions]
+    _embed_for_cache(deps, [question for question, answer in zip(questions, served) if answer is None])
+    results = [None] * len(questions)
+    pending = []
+    for position, question in enumerate(questions):
+        answer = served[position] or question.cached()
+        if answer is not None:
+            results[position] = {"response": answer[0], **answer[1]}
+        else:
+            pending.append(position)
+    if not pending:
+        return results
+
+    try:
+        with span("retrieval"):
+            # The snapshot's HybridRetriever rather than its tool, for ``batch_retrieve``
+            retrieved = _batch_retrieve(
+                deps.hybrid or deps.retriever, [questions[p].query for p in pending], [questions[p].vector for p in pending]
+            )
+        prompts = [questions[p].prompt(found) for p, found in zip(pending, retrieved)]
+    except Exception as e:
+        logger.error(f"Error retrieving context for batch: {e}")
+        for position in pending:
+            results[position] = {"error": ERROR_MESSAGE}
+        return results
+
+    logger.debug(f"Sending {len(prompts)} prompts to LLM with concurrency {max_concurrency}.")
+    with span("llm"):
+        responses = _invoke_all(deps.llm, prompts, [questions[p].query for p in pending], max_concurrency)
+    for position, response in zip(pending, responses):
+        if isinstance(response, Exception):
+            logger.error(f"Error generating response for batch item {position}: {response}")
+            results[position] = {"error": ERROR_MESSAGE}
+            continue
+        answer = message_content(response)
+        results[position] = {"response": answer, **questions[position].generated(answer)}
+    return results
+
+def stream_rag_answer(state: MessagesState, retriever=None, llm=None, meta=None):
+    """
+    Streaming variant of generate_rag_answer: yields the answer as text chunks while the model
+    produces them. FAQ and cached answers are yielded as a single chunk. If ``meta`` is a dict
+    it receives the "cache" tier, or the FAQ "source", once the generator is exhausted.
+
+    Unlike generate_rag_answer, errors are raised to the caller (ChatServiceUnavailable when
+    the pipeline is down) because a partially sent stream cannot be replaced by a fallback body.
+    """
+    meta = meta if meta is not None else {}
+    deps = _resolve_dependencies(retriever, llm)
+
+    question = _Question(deps, *_conversation(state))
+    logger.debug(f"Received streaming user query ({len(question.query)} chars).")
+    served = question.served()
+    if served is not None:
+        answer, extra = served
+        meta.update(extra)
+        yield answer
+        return
+
+    full_prompt = question.prompt(_retrieve(deps.retriever, question.retrieval_query))
+
+    logger.debug("Streaming prompt to LLM.")
+    llm = deps.llm
+    if isinstance(llm, ModelRouter):
+        # Streamed tokens cannot be taken back to escalate, so streams use the full model.
+        llm = llm.full
+    parts = []
+    # Includes the time the client takes to consume each chunk.
+    with span("llm"):
+        if not hasattr(llm, "stream"):
+            chunks = [llm_guard.call(llm.invoke, full_prompt)]
+        else:
+            chunks = llm_guard.stream(llm.stream, full_prompt)
+        for chunk in chunks:
+            text = message_content(chunk)
+            if text:
+                parts.append(text)
+                yield text
+    logger.debug("LLM response streamed successfully.")
+    meta.update(question.generated("".join(parts)))
@@ -0,0 +1,252 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_flask_exporter import Counter, Gauge
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is only safe with a single writer process
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+# Where structured chat events go: "jsonl", "sqlite" or "none"
+CHAT_EVENTS_SINK = os.environ.get("CHAT_EVENTS_SINK", "jsonl")
+CHAT_EVENTS_PATH = os.environ.get("CHAT_EVENTS_PATH") or (
+    "instance/chat_events.sqlite3" if CHAT_EVENTS_SINK == "sqlite" else "instance/chat_events.jsonl"
+)
+# The events file is rotated past this size, keeping CHAT_EVENTS_BACKUPS old files (.1 is the newest)
+CHAT_EVENTS_MAX_BYTES = int(os.environ.get("CHAT_EVENTS_MAX_BYTES", str(50 * 1024 * 1024)))
+CHAT_EVENTS_BACKUPS = int(os.environ.get("CHAT_EVENTS_BACKUPS", "5"))
+# Events waiting for the writer; beyond this they are dropped instead of blocking requests
+CHAT_EVENTS_QUEUE_SIZE = int(os.environ.get("CHAT_EVENTS_QUEUE_SIZE", "10000"))
+# The writer flushes after this many events or seconds, whichever comes first
+CHAT_EVENTS_BATCH_SIZE = int(os.environ.get("CHAT_EVENTS_BATCH_SIZE", "200"))
+CHAT_EVENTS_FLUSH_INTERVAL = float(os.environ.get("CHAT_EVENTS_FLUSH_INTERVAL", "1"))
+
+chat_events_written_total = Counter('chat_events_written_total', 'Total number of chat events written to the event log')
+chat_events_dropped_total = Counter('chat_events_dropped_total', 'Chat events dropped, labelled by reason (queue_full or write_error)', ['reason'])
+chat_events_queue_depth = Gauge('chat_events_queue_depth', 'Chat events waiting for the background writer')
+
+_STOP = object()
+
+
+def _rotate(path, backups):
+    """Shift ``path`` to ``path.1``, ``path.1`` to ``path.2``, ... dropping the oldest."""
+    if backups <= 0:
+        os.remove(path)
+        return
+    for number in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{number}"):
+            os.replace(f"{path}.{number}", f"{path}.{number + 1}")
+    os.replace(path, f"{path}.1")
+
+
+class _RotatingFile:
+    """Size-based rotation shared by the sinks, coordinated across workers with a lock file."""
+
+    def __init__(self, path, max_bytes, backups):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        with open(f"{self.path}.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _rotate_if_full(self):
+        if self.max_bytes > 0 and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            _rotate(self.path, self.backups)
+
+
+class JsonlEventSink(_RotatingFile):
+    """One JSON object per line. Each batch is appended with a single write under the lock file."""
+
+    def write(self, events):
+        data = "".join(json.dumps(event, ensure_ascii=False, default=str) + "\n" for event in events).encode("utf-8")
+        with self._locked():
+            self._rotate_if_full()
+            with open(self.path, "ab") as f:
+                f.write(data)
+
+
+class SQLiteEventSink(_RotatingFile):
+    """
+    Events in a ``chat_events`` table: the filterable fields as columns and the whole event as
+    JSON in ``data``. The connection is closed after each batch so rotation can rename the file.
+    """
+
+    def write(self, events):
+        rows = [
+            (event.get("ts"), event.get("endpoint"), event.get("user"), event.get("status"), event.get("latency_ms"),
+             json.dumps(event, ensure_ascii=False, default=str))
+            for event in events
+        ]
+        with self._locked():
+            self._rotate_if_full()
+            conn = sqlite3.connect(self.path, timeout=5)
+            try:
+                with conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS chat_events "
+                        "(ts REAL, endpoint TEXT, user TEXT, status INTEGER, latency_ms REAL, data TEXT NOT NULL)"
+                    )
+                    conn.executemany(
+                        "INSERT INTO chat_events (ts, endpoint, user, status, latency_ms, data) VALUES (?, ?, ?, ?, ?, ?)", rows
+                    )
+            finally:
+                conn.close()
+
+
+class ChatEventLog:
+    """
+    Structured chat events written off the request path. ``emit`` only puts the event on a
+    bounded in-memory queue, and drops it (counted in chat_events_dropped_total) when the
+    queue is full, so a slow sink never blocks /chat. A background thread drains the queue
+    and hands events to the sink in batches of up to ``batch_size``, at least every
+    ``flush_interval`` seconds. The thread starts on first use in each process, so forked
+    workers get their own.
+    """
+
+    def __init__(self, sink, queue_size=CHAT_EVENTS_QUEUE_SIZE, batch_size=CHAT_EVENTS_BATCH_SIZE,
+                 flush_interval=CHAT_EVENTS_FLUSH_INTERVAL):
+        self.sink = sink
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name="chat-event-writer", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+        atexit.register(self.close)
+
+    def emit(self, event):
+        """Queue ``event`` (a JSON-serializable dict) for writing. Returns False if it was dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            chat_events_dropped_total.labels(reason="queue_full").inc()
+            return False
+        return True
+
+    def _next_batch(self, events):
+        """Up to ``batch_size`` events, waiting at most ``flush_interval`` after the first one."""
+        batch = [events.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] is not _STOP and len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(events.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, events):
+        stopped = False
+        while not stopped:
+            batch = self._next_batch(events)
+            stopped = batch[-1] is _STOP
+            pending = batch[:-1] if stopped else batch
+            try:
+                if pending:
+                    self.sink.write(pending)
+                    chat_events_written_total.inc(len(pending))
+            except Exception as e:
+                chat_events_dropped_total.labels(reason="write_error").inc(len(pending))
+                logger.warning(f"Could not write {len(pending)} chat events: {e}")
+            finally:
+                chat_events_queue_depth.set(events.qsize())
+                for _ in batch:
+                    events.task_done()
+
+    def flush(self, timeout=5.0):
+        """Wait until every queued event has been handed to the sink. Returns False on timeout."""
+        events = self._queue
+        deadline = time.monotonic() + timeout
+        while events is not None and events.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=5.0):
+        """Write what is queued and stop the writer thread of this process."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            events, thread, self._pid = self._queue, self._thread, None
+        try:
+            events.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Chat event queue still full at shutdown; dropping queued events.")
+            return
+        thread.join(timeout)
+
+
+def create_chat_event_log():
+    """Build the event log configured through the CHAT_EVENTS_* environment variables, or None."""
+    if CHAT_EVENTS_SINK == "none":
+        return None
+    if CHAT_EVENTS_SINK == "jsonl":
+        sink = JsonlEventSink(CHAT_EVENTS_PATH, CHAT_EVENTS_MAX_BYTES, CHAT_EVENTS_BACKUPS)
+    elif CHAT_EVENTS_SINK == "sqlite":
+        sink = SQLiteEventSink(CHAT_EVENTS_PATH, CHAT_EVENTS_MAX_BYTES, CHAT_EVENTS_BACKUPS)
+    else:
+        raise ValueError(f"Unknown CHAT_EVENTS_SINK: {CHAT_EVENTS_SINK}")
+    return ChatEventLog(sink)
+
+
+_event_log = None
+_event_log_lock = threading.Lock()
+_event_log_created = False
+
+
+def get_chat_event_log():
+    """Process-wide ChatEventLog, created on first use; None when CHAT_EVENTS_SINK is "none"."""
+    global _event_log, _event_log_created
+    if not _event_log_created:
+        with _event_log_lock:
+            if not _event_log_created:
+                _event_log = create_chat_event_log()
+                _event_log_created = True
+    return _event_log
+
+
+def emit_chat_event(event):
+    """Queue a chat event on the process-wide log; never raises into the request."""
+    try:
+        event_log = get_chat_event_log()
+        if event_log is not None:
+            event_log.emit(event)
+    except Exception as e:
+        logger.warning(f"Could not record chat event: {e}")
@@ -0,0 +1,116 @@
+import logging
+import threading
+
+from langchain_core.documents import Document
+from prometheus_flask_exporter import Histogram
+
+from app.services.text import normalize_text
+
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_MODEL = "gpt-4.1"
+FALLBACK_ENCODING = "o200k_base"
+
+chat_prompt_tokens = Histogram(
+    'chat_prompt_tokens', 'Number of tokens in prompts sent to the LLM',
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000),
+)
+
+
+class TokenCounter:
+    """Counts and truncates text in model tokens using tiktoken."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+
+    def count(self, text):
+        return len(self.encoding.encode(text))
+
+    def truncate(self, text, max_tokens):
+        return self.encoding.decode(self.encoding.encode(text)[:max_tokens])
+
+
+class ApproximateTokenCounter:
+    """Fallback when the tiktoken encoding cannot be loaded: roughly four characters per token."""
+
+    chars_per_token = 4
+
+    def count(self, text):
+        return -(-len(text) // self.chars_per_token)
+
+    def truncate(self, text, max_tokens):
+        return text[:max_tokens * self.chars_per_token]
+
+
+_token_counter = None
+_token_counter_lock = threading.Lock()
+
+
+def get_token_counter():
+    """Shared token counter for TOKENIZER_MODEL, loaded once per process."""
+    global _token_counter
+    if _token_counter is None:
+        with _token_counter_lock:
+            if _token_counter is None:
+                try:
+                    import tiktoken
+                    try:
+                        encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+                    except KeyError:
+                        encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+                    _token_counter = TokenCounter(encoding)
+                except Exception as e:
+                    logger.warning(f"Could not load tiktoken encoding, approximating token counts: {e}")
+                    _token_counter = ApproximateTokenCounter()
+    return _token_counter
+
+
+def _as_documents(retrieved):
+    """Accept a list of Documents or a retriever tool's string output (chunks separated by blank lines)."""
+    if isinstance(retrieved, str):
+        return [Document(page_content=chunk.strip()) for chunk in retrieved.split("\n\n") if chunk.strip()]
+    return list(retrieved)
+
+
+def _deduplicate(documents):
+    """Drop chunks whose text is identical to, or contained in, a chunk kept before them."""
+    kept, kept_texts = [], []
+    for document in documents:
+        text = normalize_text(document.page_content)
+        if not text or any(text in other for other in kept_texts):
+            continue
+        # A later, longer chunk supersedes shorter ones it fully contains.
+        overlapped = [i for i, other in enumerate(kept_texts) if other in text]
+        for i in reversed(overlapped):
+            del kept[i], kept_texts[i]
+        kept.append(document)
+        kept_texts.append(text)
+    return kept
+
+
+def build_context(retrieved, budget, counter=None, separator="\n\n"):
+    """
+    Turn retrieval output into a prompt context of at most ``budget`` tokens: deduplicate
+    overlapping chunks, order them by ``metadata["score"]`` (retrieval order breaks ties and is
+    used when no score is present), and pack them greedily. Chunks that do not fit are
+    dropped; if not even the best one fits, it is truncated to the budget.
+    """
+    counter = counter or get_token_counter()
+    documents = _deduplicate(_as_documents(retrieved))
+    ranked = sorted(enumerate(documents), key=lambda item: (-item[1].metadata.get("score", 0.0), item[0]))
+
+    parts, used = [], 0
+    separator_tokens = counter.count(separator)
+    for _, document in ranked:
+        cost = counter.count(document.page_content) + (separator_tokens if parts else 0)
+        if used + cost <= budget:
+            parts.append(document.page_content)
+            used += cost
+    if not parts and ranked and budget > 0:
+        parts.append(counter.truncate(ranked[0][1].page_content, budget))
+
+    dropped = len(ranked) - len(parts)
+    if dropped:
+        logger.debug(f"Context budget of {budget} tokens kept {len(parts)} chunks and dropped {dropped}.")
+    return separator.join(parts)
@@ -0,0 +1,341 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from prometheus_flask_exporter import Histogram
+
+from app.services.context import get_token_counter
+from app.services.timing import span
+
+
+logger = logging.getLogger(__name__)
+
+# Conversation store backend: "memory" (per-process LRU) or "sqlite" (shared by every worker on the host)
+CONVERSATION_STORE = os.environ.get("CONVERSATION_STORE", "memory")
+CONVERSATION_DB = os.environ.get("CONVERSATION_DB", "instance/conversations.sqlite3")
+CONVERSATION_MAX_USERS = int(os.environ.get("CONVERSATION_MAX_USERS", "10000"))
+CONVERSATION_TTL = float(os.environ.get("CONVERSATION_TTL", "86400"))
+# Recent messages kept verbatim; older ones are folded into the rolling summary
+CONVERSATION_MAX_MESSAGES = int(os.environ.get("CONVERSATION_MAX_MESSAGES", "6"))
+CONVERSATION_SUMMARY_TOKENS = int(os.environ.get("CONVERSATION_SUMMARY_TOKENS", "300"))
+# "extractive" keeps the questions and the start of each answer; "llm" asks the chat model for a summary
+CONVERSATION_SUMMARY_MODE = os.environ.get("CONVERSATION_SUMMARY_MODE", "extractive")
+# Background threads writing "llm" summaries, so requests never wait for the summary call
+CONVERSATION_SUMMARY_WORKERS = int(os.environ.get("CONVERSATION_SUMMARY_WORKERS", "2"))
+
+conversation_history_tokens = Histogram(
+    'conversation_history_tokens', 'Tokens of conversation history (summary and recent messages) included in prompts',
+    buckets=(0, 50, 100, 250, 500, 750, 1000, 1500, 2000),
+)
+conversation_summary_duration_seconds = Histogram('conversation_summary_duration_seconds', 'Time spent compacting conversation history into the rolling summary in seconds')
+
+
+class Conversation(NamedTuple):
+    """A user's rolling summary plus their most recent messages as ``{"role", "content"}`` dicts."""
+    summary: str = ""
+    messages: tuple = ()
+
+
+class InMemoryConversationStore:
+    """Per-process LRU of conversations, bounded to ``max_users`` and expiring after ``ttl_seconds`` idle."""
+
+    def __init__(self, max_users=CONVERSATION_MAX_USERS, ttl_seconds=CONVERSATION_TTL, clock=time.monotonic):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries = OrderedDict()  # user key -> (Conversation, expires_at)
+        self._lock = threading.Lock()
+
+    def _get(self, user_key):
+        entry = self._entries.get(user_key)
+        if entry is None:
+            return Conversation()
+        if entry[1] <= self.clock():
+            del self._entries[user_key]
+            return Conversation()
+        self._entries.move_to_end(user_key)
+        return entry[0]
+
+    def _save(self, user_key, conversation):
+        self._entries[user_key] = (conversation, self.clock() + self.ttl_seconds)
+        self._entries.move_to_end(user_key)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def get(self, user_key):
+        with self._lock:
+            return self._get(user_key)
+
+    def save(self, user_key, conversation):
+        with self._lock:
+            self._save(user_key, conversation)
+
+    def update(self, user_key, change):
+        """Replace the conversation with ``change(conversation)`` atomically; returns the new one."""
+        with self._lock:
+            conversation = change(self._get(user_key))
+            self._save(user_key, conversation)
+            return conversation
+
+    def delete(self, user_key):
+        with self._lock:
+            self._entries.pop(user_key, None)
+
+
+class SQLiteConversationStore:
+    """Conversations in a SQLite file, so every worker on the host sees the same history."""
+
+    def __init__(self, db_path=CONVERSATION_DB, ttl_seconds=CONVERSATION_TTL, clock=time.time):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS conversations "
+            "(user_key TEXT PRIMARY KEY, summary TEXT NOT NULL, messages TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        # One connection per thread and process; SQLite handles must not cross a fork.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _get(self, conn, user_key):
+        row = conn.execute(
+            "SELECT summary, messages FROM conversations WHERE user_key = ? AND expires_at > ?", (user_key, self.clock())
+        ).fetchone()
+        if row is None:
+            return Conversation()
+        return Conversation(row[0], tuple(json.loads(row[1])))
+
+    def _save(self, conn, user_key, conversation):
+        conn.execute(
+            "INSERT OR REPLACE INTO conversations (user_key, summary, messages, expires_at) VALUES (?, ?, ?, ?)",
+            (user_key, conversation.summary, json.dumps(list(conversation.messages), ensure_ascii=False), self.clock() + self.ttl_seconds),
+        )
+
+    def get(self, user_key):
+        return self._get(self._connect(), user_key)
+
+    def save(self, user_key, conversation):
+        self._save(self._connect(), user_key, conversation)
+
+    def update(self, user_key, change):
+        """
+        Replace the conversation with ``change(conversation)`` in one write transaction, so
+        concurrent updates from any worker are serialized; returns the new conversation.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conversation = change(self._get(conn, user_key))
+            self._save(conn, user_key, conversation)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return conversation
+
+    def delete(self, user_key):
+        self._connect().execute("DELETE FROM conversations WHERE user_key = ?", (user_key,))
+
+
+def _first_sentence(text, limit=160):
+    sentence = text.strip().split("\n", 1)[0].split(". ", 1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rstrip() + "…"
+
+
+def extractive_summary(summary, messages):
+    """Append one line per old message: the user's questions verbatim and the gist of each answer."""
+    lines = [summary] if summary else []
+    for message in messages:
+        speaker = "Usuario" if message["role"] == "user" else "Asistente"
+        lines.append(f"{speaker}: {_first_sentence(message['content'])}")
+    return "\n".join(lines)
+
+
+class LLMSummarizer:
+    """
+    Ask a chat model to fold old messages into the running summary. The call goes through the
+    chat service's LLMGuard like every other LLM call (concurrency cap, retries, circuit breaker).
+    """
+
+    def __init__(self, get_llm, get_guard=None):
+        self.get_llm = get_llm
+        self.get_guard = get_guard or _llm_guard
+
+    def __call__(self, summary, messages):
+        transcript = "\n".join(
+            f"{'Usuario' if m['role'] == 'user' else 'Asistente'}: {m['content']}" for m in messages
+        )
+        prompt = (
+            "Resume en pocas frases la conversación entre un cliente y un asistente de buceo, "
+            "conservando destinos, fechas, precios y preferencias mencionadas.\n\n"
+            f"Resumen previo:\n{summary or '(vacío)'}\n\nMensajes nuevos:\n{transcript}"
+        )
+        response = self.get_guard().call(self.get_llm().invoke, prompt)
+        return response.get("content", "") if isinstance(response, dict) else response.content
+
+
+class ConversationMemory:
+    """
+    Server-side multi-turn memory keyed by user. The last ``max_messages`` messages are kept
+    verbatim; when a conversation grows past that, the oldest ones are folded into a rolling
+    summary (bounded to ``summary_tokens``), so the history added to prompts stays bounded.
+
+    Each exchange is appended through the store's atomic ``update``, so concurrent requests
+    from the same user never lose one another's messages. With ``background_workers`` the
+    (slow, LLM) summarizer runs on a thread pool after the request instead of inside it; the
+    new summary replaces exactly the messages it covers, keeping anything appended meanwhile.
+    """
+
+    def __init__(self, store, max_messages=CONVERSATION_MAX_MESSAGES, summary_tokens=CONVERSATION_SUMMARY_TOKENS,
+                 summarizer=extractive_summary, counter=None, background_workers=0):
+        self.store = store
+        self.max_messages = max_messages
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.counter = counter
+        self.background_workers = background_workers
+        self._lock = threading.Lock()
+        self._compacting = set()
+        self._executor = None
+        self._pid = None
+
+    def load(self, user_key):
+        with span("history_load"):
+            conversation = self.store.get(str(user_key))
+        counter = self.counter or get_token_counter()
+        tokens = counter.count(conversation.summary) + sum(counter.count(m["content"]) for m in conversation.messages)
+        conversation_history_tokens.observe(tokens)
+        return conversation
+
+    def _compact(self, conversation):
+        overflow = len(conversation.messages) - self.max_messages
+        if overflow <= 0:
+            return conversation
+        # Fold whole exchanges so a question is never kept without its answer.
+        overflow += overflow % 2
+        old, recent = conversation.messages[:overflow], conversation.messages[overflow:]
+        start = time.perf_counter()
+        with span("summarize"):
+            try:
+                summary = self.summarizer(conversation.summary, list(old))
+            except Exception as e:
+                logger.warning(f"Conversation summarization failed, keeping extractive summary: {e}")
+                summary = extractive_summary(conversation.summary, old)
+            summary = self._bound(summary)
+        conversation_summary_duration_seconds.observe(time.perf_counter() - start)
+        return Conversation(summary, tuple(recent))
+
+    def _bound(self, summary):
+        """Keep the most recent lines of the summary that fit in ``summary_tokens``."""
+        counter = self.counter or get_token_counter()
+        lines = summary.split("\n")
+        while len(lines) > 1 and counter.count("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        summary = "\n".join(lines)
+        return counter.truncate(summary, self.summary_tokens) if counter.count(summary) > self.summary_tokens else summary
+
+    def record(self, user_key, question, answer):
+        """
+        Append one exchange and compact the history if needed. Returns the background
+        compaction's Future when one was scheduled, else None.
+        """
+        user_key = str(user_key)
+        exchange = ({"role": "user", "content": question}, {"role": "assistant", "content": answer})
+
+        def append(conversation):
+            conversation = Conversation(conversation.summary, conversation.messages + exchange)
+            return conversation if self.background_workers else self._compact(conversation)
+
+        with span("history_save"):
+            conversation = self.store.update(user_key, append)
+        if self.background_workers and len(conversation.messages) > self.max_messages:
+            return self._schedule_compaction(user_key)
+        return None
+
+    def _schedule_compaction(self, user_key):
+        with self._lock:
+            if user_key in self._compacting and self._pid == os.getpid():
+                return None
+            if self._pid != os.getpid():
+                # Forked workers get their own pool; the parent's threads do not exist here.
+                self._executor = ThreadPoolExecutor(self.background_workers, thread_name_prefix="conversation-summary")
+                self._compacting = set()
+                self._pid = os.getpid()
+            self._compacting.add(user_key)
+            return self._executor.submit(self._compact_stored, user_key)
+
+    def _compact_stored(self, user_key):
+        try:
+            before = self.store.get(user_key)
+            compacted = self._compact(before)
+            folded = len(before.messages) - len(compacted.messages)
+            if not folded:
+                return
+
+            def apply(current):
+                if current.summary != before.summary or current.messages[:folded] != before.messages[:folded]:
+                    return current  # cleared or compacted by another worker meanwhile
+                return Conversation(compacted.summary, current.messages[folded:])
+
+            self.store.update(user_key, apply)
+        except Exception as e:
+            logger.warning(f"Background conversation compaction failed: {e}")
+        finally:
+            with self._lock:
+                self._compacting.discard(user_key)
+
+    def clear(self, user_key):
+        self.store.delete(str(user_key))
+
+
+def _chat_model():
+    from app.services import chat as chat_service
+    if chat_service.response_model is None:
+        raise RuntimeError("chat model not initialized")
+    return chat_service.response_model
+
+
+def _llm_guard():
+    from app.services import chat as chat_service
+    return chat_service.llm_guard
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_conversation_memory():
+    """Process-wide ConversationMemory, created on first use."""
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = create_conversation_memory()
+    return _memory
+
+
+def create_conversation_memory():
+    """Build the memory configured through the CONVERSATION_* environment variables."""
+    if CONVERSATION_STORE == "sqlite":
+        store = SQLiteConversationStore(CONVERSATION_DB)
+    elif CONVERSATION_STORE == "memory":
+        store = InMemoryConversationStore()
+    else:
+        raise ValueError(f"Unknown CONVERSATION_STORE: {CONVERSATION_STORE}")
+    if CONVERSATION_SUMMARY_MODE == "llm":
+        return ConversationMemory(store, summarizer=LLMSummarizer(_chat_model), background_workers=CONVERSATION_SUMMARY_WORKERS)
+    return ConversationMemory(store)
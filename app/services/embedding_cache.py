@@ -0,0 +1,300 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from prometheus_flask_exporter import Counter
+
+from app.services.text import normalize_text
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+
+query_embedding_cache_hits_total = Counter('query_embedding_cache_hits_total', 'Total number of query embeddings served from cache', ['tier'])
+query_embedding_cache_misses_total = Counter('query_embedding_cache_misses_total', 'Total number of query embeddings computed by the model')
+
+
+def _model_identity(embeddings):
+    """Name used to namespace cached vectors so switching models never reuses stale ones."""
+    if isinstance(embeddings, QueryEmbeddingCache):
+        return _model_identity(embeddings.embeddings)
+    model = getattr(embeddings, "model", None)
+    return f"{type(embeddings).__name__}:{model}" if model else type(embeddings).__name__
+
+
+def embed_queries(embeddings, texts):
+    """
+    Embed many queries with as few model calls as possible. Cache wrappers answer what they
+    can and send the rest on; a plain model embeds them all in one ``embed_documents`` call.
+    """
+    if isinstance(embeddings, (PersistentEmbeddingCache, QueryEmbeddingCache)):
+        return embeddings.embed_queries(texts)
+    return embeddings.embed_documents(list(texts)) if texts else []
+
+
+class PersistentEmbeddingCache(Embeddings):
+    """
+    Content-addressed on-disk cache in front of an embeddings model.
+
+    Document vectors are stored as a float32 matrix in ``vectors.f32`` (read back through
+    ``np.memmap``) with an ``index.json`` sidecar mapping chunk hashes to rows. Each embedding
+    model gets its own subdirectory, named by a hash of the model, so models with different
+    vector sizes can share ``cache_dir``. The files are shared by every worker and survive
+    restarts, so only new or changed chunks are sent to the underlying model. Query embeddings
+    are passed through untouched.
+    """
+
+    def __init__(self, embeddings, cache_dir):
+        self.embeddings = embeddings
+        self.namespace = _model_identity(embeddings)
+        self.cache_dir = os.path.join(cache_dir, hashlib.sha256(self.namespace.encode("utf-8")).hexdigest()[:16])
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.cache_dir, LOCK_FILE), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        if not os.path.exists(path):
+            return {"dim": None, "keys": []}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_index(self, index):
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+
+    def _load_matrix(self, index):
+        rows, dim = len(index["keys"]), index["dim"]
+        if not rows:
+            return None
+        return np.memmap(os.path.join(self.cache_dir, VECTORS_FILE), dtype=np.float32, mode="r", shape=(rows, dim))
+
+    def _append(self, index, keys, vectors):
+        """Append rows after the last committed one, then publish them through the index."""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if index["dim"] is None:
+            index["dim"] = int(matrix.shape[1])
+        elif matrix.shape[1] != index["dim"]:
+            raise ValueError(f"Embedding dimension changed from {index['dim']} to {matrix.shape[1]}")
+        path = os.path.join(self.cache_dir, VECTORS_FILE)
+        with open(path, "ab") as f:
+            # Drop any partial rows left behind by a writer that died before publishing its index.
+            f.truncate(len(index["keys"]) * index["dim"] * matrix.itemsize)
+            f.write(matrix.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        index["keys"].extend(keys)
+        self._write_index(index)
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        index = self._read_index()
+        rows = {key: row for row, key in enumerate(index["keys"])}
+        missing = {key: text for key, text in zip(keys, texts) if key not in rows}
+
+        if missing:
+            with self._locked():
+                # Another worker may have embedded the same chunks while we waited for the lock.
+                index = self._read_index()
+                rows = {key: row for row, key in enumerate(index["keys"])}
+                missing = {key: text for key, text in missing.items() if key not in rows}
+                if missing:
+                    logger.info(f"Embedding {len(missing)} new chunks ({len(texts) - len(missing)} cached).")
+                    vectors = self.embeddings.embed_documents(list(missing.values()))
+                    start = len(index["keys"])
+                    self._append(index, list(missing), vectors)
+                    rows.update({key: start + i for i, key in enumerate(missing)})
+        else:
+            logger.info(f"All {len(texts)} chunk embeddings served from cache.")
+
+        matrix = self._load_matrix(index)
+        if matrix is None:
+            return []
+        return [matrix[rows[key]].tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text):
+        return await self.embeddings.aembed_query(text)
+
+    def embed_queries(self, texts):
+        # Query vectors are not written to the chunk cache.
+        return embed_queries(self.embeddings, texts)
+
+
+class QueryEmbeddingCache(Embeddings):
+    """
+    Bounded LRU cache of query embeddings keyed by normalized text, so repeated or trivially
+    different phrasings ("¿Precio?" / "precio") are embedded once.
+
+    Entries expire after ``ttl_seconds``. If ``db_path`` is given, misses also consult a SQLite
+    table shared by every worker on the host before calling the model. Document embeddings are
+    passed through untouched.
+    """
+
+    def __init__(self, embeddings, max_entries=2048, ttl_seconds=86400, db_path=None, clock=time.time):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.clock = clock
+        self.namespace = _model_identity(embeddings)
+        self._entries = OrderedDict()  # key -> (vector, expires_at)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings "
+                    "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, expires_at REAL NOT NULL)"
+                )
+
+    def _connect(self):
+        # One connection per thread and process; SQLite handles must not cross a fork.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _key(self, text):
+        return f"{self.namespace}\0{normalize_text(text)}"
+
+    def _get_memory(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _put_memory(self, key, vector, expires_at):
+        with self._lock:
+            self._entries[key] = (vector, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_shared(self, key, now):
+        try:
+            row = self._connect().execute(
+                "SELECT vector, expires_at FROM query_embeddings WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Query embedding store read failed: {e}")
+            return None
+        if row is None:
+            return None
+        vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+        self._put_memory(key, vector, row[1])
+        return vector
+
+    def _put_shared(self, key, vector, expires_at):
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector, expires_at) VALUES (?, ?, ?)",
+                (key, np.asarray(vector, dtype=np.float32).tobytes(), expires_at),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Query embedding store write failed: {e}")
+
+    def _lookup(self, key):
+        now = self.clock()
+        vector = self._get_memory(key, now)
+        if vector is not None:
+            query_embedding_cache_hits_total.labels(tier="memory").inc()
+            return vector
+        if self.db_path:
+            vector = self._get_shared(key, now)
+            if vector is not None:
+                query_embedding_cache_hits_total.labels(tier="sqlite").inc()
+                return vector
+        query_embedding_cache_misses_total.inc()
+        return None
+
+    def _store(self, key, vector):
+        expires_at = self.clock() + self.ttl_seconds
+        self._put_memory(key, vector, expires_at)
+        if self.db_path:
+            self._put_shared(key, vector, expires_at)
+
+    def embed_query(self, text):
+        key = self._key(text)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._store(key, vector)
+        return vector
+
+    async def aembed_query(self, text):
+        key = self._key(text)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self._store(key, vector)
+        return vector
+
+    def embed_queries(self, texts):
+        """Serve cached queries and embed the misses (deduplicated by normalized text) in one call."""
+        keys = [self._key(text) for text in texts]
+        vectors = {key: self._lookup(key) for key in dict.fromkeys(keys)}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if vectors[key] is None:
+                missing.setdefault(key, text)
+        if missing:
+            for key, vector in zip(missing, embed_queries(self.embeddings, list(missing.values()))):
+                self._store(key, vector)
+                vectors[key] = vector
+        return [vectors[key] for key in keys]
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return await self.embeddings.aembed_documents(texts)
+
+
+def replace_base_embeddings(embeddings, base):
+    """Swap the model at the bottom of a stack of cache wrappers, e.g. to give a forked worker fresh HTTP clients."""
+    wrapper = embeddings
+    while isinstance(wrapper.embeddings, (PersistentEmbeddingCache, QueryEmbeddingCache)):
+        wrapper = wrapper.embeddings
+    wrapper.embeddings = base
@@ -0,0 +1,103 @@
+import math
+import os
+from typing import NamedTuple
+
+from app.services.knowledge_base import DESTINATION_ALIASES, detect_destination
+from app.services.lexical import tokenize
+from app.services.text import normalize_text
+
+
+# Minimum similarity between a query and an FAQ question for the stored answer to be returned
+# as-is, without calling the LLM (0 disables the fast path)
+FAQ_FAST_PATH_THRESHOLD = float(os.environ.get("FAQ_FAST_PATH_THRESHOLD", "0.8"))
+# Required lead of the best match over the best match with a different answer
+FAQ_FAST_PATH_MARGIN = float(os.environ.get("FAQ_FAST_PATH_MARGIN", "0.15"))
+
+# Words that only name a destination; the destination itself is matched through metadata
+_DESTINATION_TERMS = frozenset(
+    term
+    for destination, aliases in DESTINATION_ALIASES.items()
+    for phrase in (destination, *aliases)
+    for term in tokenize(phrase)
+)
+
+
+class FAQMatch(NamedTuple):
+    document: object
+    score: float
+
+    @property
+    def answer(self):
+        return self.document.metadata["answer"]
+
+    @property
+    def source(self):
+        """Audit tag for answers served from the knowledge base without the LLM."""
+        return {"type": "faq", "entry": self.document.id, "score": round(self.score, 3)}
+
+
+def _terms(text):
+    terms = frozenset(tokenize(text)) - _DESTINATION_TERMS
+    # "no" is a stopword for search, but "¿Qué no incluye el viaje?" needs a different answer.
+    if "no" in normalize_text(text).split():
+        terms |= {"no"}
+    return terms
+
+
+class FAQMatcher:
+    """
+    Precomputed index of the knowledge base's FAQ questions. ``match`` compares a query with
+    every question of the destination it names (IDF-weighted cosine over normalized terms) and
+    returns the entry only when the best match clears ``threshold`` and leads every entry with
+    a different answer by ``margin``; generic questions such as "¿Qué incluye el viaje?" exist for
+    several destinations, so without a destination in the query they never clear the margin.
+    """
+
+    def __init__(self, documents, threshold=FAQ_FAST_PATH_THRESHOLD, margin=FAQ_FAST_PATH_MARGIN):
+        self.threshold = threshold
+        self.margin = margin
+        self.entries = [
+            (document, _terms(document.metadata["question"]))
+            for document in documents
+            if document.metadata.get("question") and document.metadata.get("answer")
+        ]
+        n = len(self.entries)
+        frequencies = {}
+        for _, terms in self.entries:
+            for term in terms:
+                frequencies[term] = frequencies.get(term, 0) + 1
+        self.idf = {term: math.log(1 + n / frequency) for term, frequency in frequencies.items()}
+        # Words never seen in a question weigh like the rarest ones, so they lower the score.
+        self.unknown_idf = math.log(1 + n) if n else 1.0
+        self.norms = [self._norm(terms) for _, terms in self.entries]
+
+    def _weight(self, term):
+        return self.idf.get(term, self.unknown_idf)
+
+    def _norm(self, terms):
+        return math.sqrt(sum(self._weight(term) ** 2 for term in terms))
+
+    def match(self, query):
+        """The confidently matching FAQMatch for ``query``, or None to use the full RAG path."""
+        if self.threshold <= 0 or not self.entries:
+            return None
+        terms = _terms(query)
+        if not terms:
+            return None
+        destination = detect_destination(query)
+        query_norm = self._norm(terms)
+        scored = []
+        for (document, entry_terms), norm in zip(self.entries, self.norms):
+            if destination and document.metadata.get("destination") != destination:
+                continue
+            shared = terms & entry_terms
+            if shared and norm:
+                scored.append((sum(self._weight(term) ** 2 for term in shared) / (query_norm * norm), document))
+        if not scored:
+            return None
+        scored.sort(key=lambda item: item[0], reverse=True)
+        best_score, best = scored[0]
+        runner_up = next((score for score, document in scored[1:] if document.metadata["answer"] != best.metadata["answer"]), 0.0)
+        if best_score < self.threshold or best_score - runner_up < self.margin:
+            return None
+        return FAQMatch(best, best_score)
@@ -0,0 +1,160 @@
+import glob
+import hashlib
+import logging
+import os
+import threading
+
+import yaml
+from langchain_core.documents import Document
+
+from app.services.text import normalize_text
+
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_BASE_GLOB = "knowledge_base/*.yaml"
+
+# Destination (or course) each FAQ file describes, keyed by file name without extension
+DESTINATIONS = {
+    "faq_general": "General",
+    "faq_gorgona2024": "Gorgona",
+    "faq_natacion": "Natación",
+    "faq_providencia2025": "Providencia",
+    "faq_pulmon_libre": "Pulmón libre",
+    "faq_sai2024": "San Andrés",
+}
+
+# Normalized phrases that identify a destination inside a user query
+DESTINATION_ALIASES = {
+    "Gorgona": ["gorgona"],
+    "Natación": ["natacion", "nadar"],
+    "Providencia": ["providencia"],
+    "Pulmón libre": ["pulmon libre", "apnea"],
+    "San Andrés": ["san andres", "sai"],
+}
+
+
+def destination_for(path):
+    """Destination for a knowledge base file, derived from its name when it is not registered."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if stem in DESTINATIONS:
+        return DESTINATIONS[stem]
+    return stem.removeprefix("faq_").rstrip("0123456789").replace("_", " ").strip().capitalize()
+
+
+def detect_destination(query):
+    """Return the destination mentioned in ``query``, or None if it names none or several."""
+    padded = f" {normalize_text(query)} "
+    found = {
+        destination
+        for destination, aliases in DESTINATION_ALIASES.items()
+        if any(f" {alias} " in padded for alias in aliases)
+    }
+    return found.pop() if len(found) == 1 else None
+
+
+def format_entry(destination, question, answer):
+    return f"Destino: {destination}\nPregunta: {question}\nRespuesta: {answer}"
+
+
+def load_faq_file(path):
+    """
+    Load one ``pregunta``/``respuesta`` YAML file as one Document per Q&A pair.
+    Files that fail to parse are loaded whole as a single raw-text Document so no content is lost.
+    """
+    destination = destination_for(path)
+    with open(path, "r", encoding="utf-8") as f:
+        raw = f.read()
+    try:
+        entries = yaml.safe_load(raw) or []
+        if not isinstance(entries, list):
+            raise ValueError("expected a list of pregunta/respuesta entries")
+    except (yaml.YAMLError, ValueError) as e:
+        logger.error(f"Could not parse FAQ file '{path}', loading it as raw text: {e}")
+        return [Document(id=os.path.basename(path), page_content=raw, metadata={"source": path, "destination": destination})]
+
+    documents = []
+    for position, entry in enumerate(entries):
+        question = str(entry.get("pregunta", "")).strip()
+        answer = str(entry.get("respuesta", "")).strip()
+        if not question or not answer:
+            logger.warning(f"Skipping incomplete FAQ entry {position} in '{path}'.")
+            continue
+        documents.append(Document(
+            id=f"{os.path.basename(path)}#{position}",
+            page_content=format_entry(destination, question, answer),
+            metadata={
+                "source": path,
+                "destination": destination,
+                "entry": position,
+                "question": question,
+                "answer": answer,
+            },
+        ))
+    return documents
+
+
+def load_faq_documents(paths=None):
+    """Load every FAQ file (defaults to ``knowledge_base/*.yaml``) as one Document per Q&A pair."""
+    paths = sorted(paths if paths is not None else glob.glob(KNOWLEDGE_BASE_GLOB))
+    return [document for path in paths for document in load_faq_file(path)]
+
+
+def knowledge_base_version(documents):
+    """Content hash of the loaded documents; changes whenever any FAQ entry changes."""
+    digest = hashlib.sha256()
+    for document in documents:
+        digest.update(document.page_content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def _file_signatures(pattern):
+    signatures = {}
+    for path in glob.glob(pattern):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        signatures[path] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+
+class KnowledgeBaseWatcher:
+    """
+    Polls the knowledge base files every ``interval`` seconds and calls ``on_change`` when a file
+    is added, removed or modified. Polling keeps it dependency-free and works on network mounts.
+    """
+
+    def __init__(self, on_change, interval, pattern=KNOWLEDGE_BASE_GLOB):
+        self.on_change = on_change
+        self.interval = interval
+        self.pattern = pattern
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._signatures = _file_signatures(self.pattern)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="knowledge-base-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self):
+        """Compare file signatures with the last check and call ``on_change`` if they differ."""
+        signatures = _file_signatures(self.pattern)
+        if signatures == self._signatures:
+            return False
+        self._signatures = signatures
+        logger.info("Knowledge base files changed on disk, reloading.")
+        try:
+            self.on_change()
+        except Exception as e:
+            logger.error(f"Knowledge base reload failed: {e}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
@@ -0,0 +1,125 @@
+import hashlib
+from typing import NamedTuple
+
+from langchain.tools.retriever import create_retriever_tool
+from langchain_core.tools import BaseTool
+
+from app.services.faq_answers import FAQMatcher
+from app.services.knowledge_base import knowledge_base_version
+from app.services.lexical import BM25Index
+from app.services.retrieval import DestinationRetriever, HybridRetriever
+from app.services.vector_index import MmapVectorStore, NumpyVectorStore
+
+
+class KnowledgeSnapshot(NamedTuple):
+    """
+    Immutable view of the indexed knowledge base. Reloads build a new snapshot and swap it in
+    as a single reference, so in-flight requests keep using the one they started with.
+    """
+    documents: list
+    vectorstore: NumpyVectorStore
+    retriever_tool: BaseTool
+    version: str
+    # The retriever behind the tool, used directly for batched retrieval
+    retriever: HybridRetriever = None
+    # FAQ question index for answers served without the LLM
+    faq_matcher: FAQMatcher = None
+
+
+class IndexChanges(NamedTuple):
+    added: int
+    updated: int
+    removed: int
+
+    @property
+    def total(self):
+        return self.added + self.updated + self.removed
+
+
+def _make_snapshot(documents, vectorstore, lexical_index=None, faq_matcher=None):
+    retriever = HybridRetriever(
+        vector_retriever=DestinationRetriever(vectorstore=vectorstore),
+        lexical_index=BM25Index(documents) if lexical_index is None else lexical_index,
+    )
+    retriever_tool = create_retriever_tool(
+        retriever,
+        "retrieve_blog_posts",
+        "Buscador de información basada en experiencias de viajes de buceo por Colombia",
+        response_format="content_and_artifact",
+    )
+    return KnowledgeSnapshot(
+        documents, vectorstore, retriever_tool, knowledge_base_version(documents), retriever,
+        FAQMatcher(documents) if faq_matcher is None else faq_matcher,
+    )
+
+
+def build_snapshot(documents, embeddings):
+    """Index ``documents`` from scratch."""
+    vectorstore = NumpyVectorStore.from_documents(documents=documents, embedding=embeddings)
+    return _make_snapshot(documents, vectorstore)
+
+
+def _diff(previous, documents):
+    """``(added, updated, removed ids)`` going from ``previous`` to ``documents``."""
+    old = {document.id: document for document in previous.documents}
+    new_ids = {document.id for document in documents}
+    added = [d for d in documents if d.id not in old]
+    updated = [d for d in documents if d.id in old and old[d.id].page_content != d.page_content]
+    removed = [doc_id for doc_id in old if doc_id not in new_ids]
+    return added, updated, removed
+
+
+def index_changes(previous, documents):
+    """The IndexChanges ``update_snapshot(previous, documents)`` would apply, without applying them."""
+    return IndexChanges(*map(len, _diff(previous, documents)))
+
+
+def update_snapshot(previous, documents):
+    """
+    Build a snapshot for ``documents`` reusing ``previous``: only entries whose id is new or
+    whose content changed are embedded, removed entries are deleted, and everything else keeps
+    its vector. ``previous`` itself is left untouched. Returns ``(snapshot, IndexChanges)``.
+    """
+    added, updated, removed = _diff(previous, documents)
+    changes = IndexChanges(len(added), len(updated), len(removed))
+    if not changes.total:
+        return previous, changes
+
+    vectorstore = previous.vectorstore.copy()
+    vectorstore.delete([d.id for d in updated] + removed)
+    if added or updated:
+        vectorstore.add_documents(added + updated, ids=[d.id for d in added + updated])
+    return _make_snapshot(documents, vectorstore), changes
+
+
+def _shared_index_key(version, embedding):
+    # PersistentEmbeddingCache namespaces vectors by model; other embedders by their class.
+    model = getattr(embedding, "namespace", None) or type(embedding).__name__
+    return f"{version}-{hashlib.sha256(model.encode('utf-8')).hexdigest()[:8]}"
+
+
+def share_snapshot(snapshot, directory):
+    """
+    ``snapshot`` with its vector store moved to a memory-mapped index under ``directory``,
+    named after the knowledge base version and embedding model. Workers with the same
+    knowledge base map the same files, so the embedding matrix takes one copy of RAM instead
+    of one per worker. The rest of the snapshot is not shared: ``documents``, the BM25 index
+    and the FAQ matcher stay in each worker's heap.
+    """
+    key = _shared_index_key(snapshot.version, snapshot.vectorstore.embedding)
+    vectorstore = MmapVectorStore.share(snapshot.vectorstore, directory, key)
+    if vectorstore is snapshot.vectorstore:
+        return snapshot
+    return _make_snapshot(snapshot.documents, vectorstore, snapshot.retriever.lexical_index, snapshot.faq_matcher)
+
+
+def open_shared_snapshot(documents, embeddings, directory):
+    """
+    Snapshot for ``documents`` on the index another worker already published under
+    ``directory`` with ``share_snapshot``, or None. Nothing is embedded and the vectors never
+    enter the heap; building the snapshot and then sharing it would leave the in-memory matrix
+    behind as freed memory the allocator keeps.
+    """
+    key = _shared_index_key(knowledge_base_version(documents), embeddings)
+    vectorstore = MmapVectorStore.open(embeddings, directory, key)
+    return None if vectorstore is None else _make_snapshot(documents, vectorstore)
@@ -0,0 +1,103 @@
+import math
+from collections import Counter, defaultdict
+
+from app.services.text import normalize_text
+
+
+# Common Spanish function words, accent-folded to match normalize_text output
+SPANISH_STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes como con contra cual cuales cuando cuanto
+cuanta cuantos cuantas de del desde donde durante e el ella ellas ellos en entre era es esa esas ese
+eso esos esta estan estas este esto estos fue ha hay hasta la las le les lo los me mi mis mucho muy
+ni no nos o os otra otro para pero poco por porque puedo puede que quien se ser si sin sobre son su
+sus tambien te tengo tiene tienen tu tus un una unas uno unos y ya yo
+""".split())
+
+# Synonyms folded onto one term so "costo del viaje" matches "precio Gorgona"
+CANONICAL_TERMS = {
+    "costo": "precio",
+    "cuesta": "precio",
+    "tarifa": "precio",
+    "valor": "precio",
+    "vale": "precio",
+    "cuando": "fecha",
+}
+
+
+def tokenize(text):
+    """
+    Spanish-aware tokens: accent-folded, lowercased, stopwords removed, plural 's' stripped and
+    a few synonyms canonicalized.
+    """
+    tokens = []
+    for token in normalize_text(text).split():
+        if token in SPANISH_STOPWORDS and token not in CANONICAL_TERMS:
+            continue
+        if len(token) > 3 and token.endswith("s"):
+            token = token[:-1]
+        tokens.append(CANONICAL_TERMS.get(token, token))
+    return tokens
+
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring over LangChain Documents. Search costs no
+    remote calls, so keyword lookups such as "precio Gorgona" can skip the query embedding.
+
+    The FAQ question (``metadata["question"]``) is indexed a second time on top of the page
+    content, so long answers don't drown out the question they answer.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.documents = list(documents)
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc position: term frequency}
+        self.lengths = []
+        for position, document in enumerate(self.documents):
+            counts = Counter(tokenize(document.page_content) + tokenize(document.metadata.get("question", "")))
+            self.lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self.postings[term][position] = frequency
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        n = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query, k=4, filter=None):
+        """
+        Return up to ``k`` ``(document, score, matched_terms)`` tuples, best first. ``filter`` is a
+        dict of metadata values every result must match. ``matched_terms`` is the number of
+        distinct query terms found in the document.
+        """
+        terms = set(tokenize(query))
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for term in terms:
+            for position, frequency in self.postings.get(term, {}).items():
+                length_norm = 1 - self.b + self.b * self.lengths[position] / self.average_length
+                scores[position] += self.idf[term] * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                matched[position] += 1
+        if filter:
+            scores = {
+                position: score for position, score in scores.items()
+                if all(self.documents[position].metadata.get(key) == value for key, value in filter.items())
+            }
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [(self.documents[position], scores[position], matched[position]) for position in best]
+
+    def is_confident(self, query, results, max_terms=4, margin=1.2):
+        """
+        Whether the top lexical hit is good enough to answer without vector search: the query is
+        a short keyword lookup, the top document contains every query term, and it outscores the
+        runner-up by ``margin``.
+        """
+        terms = set(tokenize(query))
+        if not results or not terms or len(terms) > max_terms:
+            return False
+        _, top_score, top_matched = results[0]
+        if top_matched < len(terms):
+            return False
+        return len(results) == 1 or top_score >= margin * results[1][1]
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+import re
+import time
+
+from prometheus_flask_exporter import Counter, Histogram
+
+from app.services.context import get_token_counter
+from app.services.rate_limit import ChatRejected
+from app.services.text import normalize_text
+
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+FULL = "full"
+
+# Questions longer than this many words always go to the full model
+MODEL_ROUTING_MAX_WORDS = int(os.environ.get("MODEL_ROUTING_MAX_WORDS", "25"))
+
+# Greetings, thanks and goodbyes that need no reasoning at all
+_SMALL_TALK = re.compile(
+    r"^(hola|buenas|buenos dias|buenas tardes|buenas noches|hey|saludos|gracias|muchas gracias|"
+    r"ok|vale|listo|perfecto|genial|chao|adios|hasta luego|hasta pronto)( \w+)?$"
+)
+# Requests that ask the model to compare, recommend, plan or explain rather than look something up
+_COMPLEX = re.compile(
+    r"\b(compar\w*|diferencias?|versus|vs|recomiend\w*|recomendaci\w*|mejor|peor|convien\w*|"
+    r"por que|explica\w*|planea\w*|planific\w*|itinerario|organiza\w*|si no|que pasa si|en caso de)\b"
+)
+# Phrases of a fast-tier answer that did not find what it needed
+_UNCERTAIN = re.compile(
+    r"\b(no tengo (esa |la )?informacion|no cuento con|no dispongo de|no estoy segur[oa]|"
+    r"no puedo (responder|ayudarte con)|no (se menciona|aparece|esta) en el contexto|"
+    r"no tengo datos|no encuentro)"
+)
+
+llm_route_decisions_total = Counter('llm_route_decisions_total', 'Chat questions routed to each model tier, labelled by reason', ['tier', 'reason'])
+llm_tier_requests_total = Counter('llm_tier_requests_total', 'LLM calls per model tier', ['tier'])
+llm_tier_failures_total = Counter('llm_tier_failures_total', 'Failed LLM calls per model tier', ['tier'])
+llm_tier_latency_seconds = Histogram('llm_tier_latency_seconds', 'LLM call latency per model tier in seconds', ['tier'])
+llm_tier_tokens_total = Counter('llm_tier_tokens_total', 'LLM tokens per model tier, labelled by kind (prompt or completion)', ['tier', 'kind'])
+llm_escalations_total = Counter('llm_escalations_total', 'Fast-tier answers escalated to the full model, labelled by reason', ['reason'])
+
+
+def classify_query(query, history=(), summary="", max_words=MODEL_ROUTING_MAX_WORDS):
+    """
+    ``(tier, reason)`` for a question: greetings and short single lookups go to the fast tier;
+    long, multi-part or open-ended questions and long conversations go to the full model.
+    """
+    text = normalize_text(query)
+    if not text:
+        return FULL, "empty"
+    if _SMALL_TALK.match(text):
+        return FAST, "small_talk"
+    if summary:
+        return FULL, "long_conversation"
+    if len(text.split()) > max_words:
+        return FULL, "long_question"
+    if (query or "").count("?") > 1:
+        return FULL, "multi_question"
+    if _COMPLEX.search(text):
+        return FULL, "complex"
+    return FAST, "lookup"
+
+
+def _content(response):
+    if isinstance(response, dict):
+        return response.get("content", "")
+    return getattr(response, "content", response if isinstance(response, str) else "")
+
+
+def escalation_reason(response):
+    """Why a fast-tier answer should be regenerated by the full model, or None to keep it."""
+    metadata = getattr(response, "response_metadata", None) or {}
+    if metadata.get("finish_reason") == "length":
+        return "truncated"
+    answer = normalize_text(_content(response))
+    if not answer:
+        return "empty"
+    if _UNCERTAIN.search(answer):
+        return "uncertain"
+    return None
+
+
+def _invoke(model, prompt):
+    return model.invoke(prompt)
+
+
+async def _ainvoke(model, prompt):
+    if hasattr(model, "ainvoke"):
+        return await model.ainvoke(prompt)
+    return await asyncio.to_thread(model.invoke, prompt)
+
+
+class ModelRouter:
+    """
+    Routes each question to a fast or a full chat model.
+
+    The fast, cheaper model takes greetings and short lookups (``classify_query``) and the full
+    model everything else. ``generate`` regenerates low-confidence fast answers
+    (``escalation_reason``) with the full model, and also retries fast-tier failures there
+    unless they are admission-control rejections. ``call`` / ``acall`` wrap each model call,
+    so admission control and retries apply per tier. Without a fast model every question goes
+    to the full one.
+
+    Plain ``invoke``/``ainvoke`` use the full model, so the router stands in for it wherever a
+    chat model is invoked directly (e.g. conversation summaries). Streams cannot be escalated
+    once sent, so streaming callers use ``full`` themselves.
+    """
+
+    def __init__(self, full, fast=None, classify=classify_query, escalate=escalation_reason):
+        self.tiers = {FULL: full}
+        if fast is not None:
+            self.tiers[FAST] = fast
+        self.classify = classify
+        self.escalate = escalate
+
+    @property
+    def full(self):
+        return self.tiers[FULL]
+
+    def route(self, query, history=(), summary=""):
+        tier, reason = self.classify(query, history, summary)
+        if tier not in self.tiers:
+            tier, reason = FULL, "no_fast_tier"
+        llm_route_decisions_total.labels(tier=tier, reason=reason).inc()
+        logger.debug(f"Routing question to the {tier} model ({reason}).")
+        return tier
+
+    def _observe(self, tier, prompt, start, response):
+        llm_tier_latency_seconds.labels(tier=tier).observe(time.perf_counter() - start)
+        usage = getattr(response, "usage_metadata", None) or {}
+        counter = get_token_counter()
+        prompt_tokens = usage.get("input_tokens") or counter.count(prompt if isinstance(prompt, str) else str(prompt))
+        completion_tokens = usage.get("output_tokens") or counter.count(_content(response) or "")
+        llm_tier_tokens_total.labels(tier=tier, kind="prompt").inc(prompt_tokens)
+        llm_tier_tokens_total.labels(tier=tier, kind="completion").inc(completion_tokens)
+
+    def _call(self, tier, prompt, call):
+        llm_tier_requests_total.labels(tier=tier).inc()
+        start = time.perf_counter()
+        try:
+            response = call(self.tiers[tier], prompt)
+        except Exception:
+            llm_tier_failures_total.labels(tier=tier).inc()
+            raise
+        self._observe(tier, prompt, start, response)
+        return response
+
+    async def _acall(self, tier, prompt, acall):
+        llm_tier_requests_total.labels(tier=tier).inc()
+        start = time.perf_counter()
+        try:
+            response = await acall(self.tiers[tier], prompt)
+        except Exception:
+            llm_tier_failures_total.labels(tier=tier).inc()
+            raise
+        self._observe(tier, prompt, start, response)
+        return response
+
+    def _escalation(self, tier, response):
+        if tier == FULL:
+            return None
+        reason = self.escalate(response)
+        if reason is not None:
+            llm_escalations_total.labels(reason=reason).inc()
+            logger.debug(f"Escalating fast-model answer to the full model ({reason}).")
+        return reason
+
+    def _escalate_error(self, error):
+        llm_escalations_total.labels(reason="error").inc()
+        logger.warning(f"Fast model failed, escalating to the full model: {error}")
+
+    def generate(self, prompt, query, history=(), summary="", call=_invoke):
+        """The answer to ``prompt`` from the tier ``query`` routes to, escalated if needed."""
+        tier = self.route(query, history, summary)
+        try:
+            response = self._call(tier, prompt, call)
+        except ChatRejected:
+            raise
+        except Exception as e:
+            if tier == FULL:
+                raise
+            self._escalate_error(e)
+            return self._call(FULL, prompt, call)
+        if self._escalation(tier, response) is not None:
+            response = self._call(FULL, prompt, call)
+        return response
+
+    async def agenerate(self, prompt, query, history=(), summary="", acall=_ainvoke):
+        """Asyncio counterpart of ``generate``; ``acall(model, prompt)`` returns an awaitable."""
+        tier = self.route(query, history, summary)
+        try:
+            response = await self._acall(tier, prompt, acall)
+        except ChatRejected:
+            raise
+        except Exception as e:
+            if tier == FULL:
+                raise
+            self._escalate_error(e)
+            return await self._acall(FULL, prompt, acall)
+        if self._escalation(tier, response) is not None:
+            response = await self._acall(FULL, prompt, acall)
+        return response
+
+    def invoke(self, prompt):
+        return self._call(FULL, prompt, _invoke)
+
+    async def ainvoke(self, prompt):
+        return await self._acall(FULL, prompt, _ainvoke)
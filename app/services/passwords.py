@@ -0,0 +1,101 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+logger = logging.getLogger(__name__)
+
+# werkzeug hash method, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000". Stored hashes
+# made with other parameters are upgraded on the user's next successful login.
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+# Hashes computed in parallel, and how many more requests may wait for a free worker
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get("PASSWORD_HASH_QUEUE_SIZE", "16"))
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a small dedicated thread pool so a login burst
+    uses at most ``workers`` cores and leaves the request threads serving /chat and /health
+    responsive. hashlib's scrypt and PBKDF2 release the GIL, so threads hash in parallel.
+
+    At most ``workers + queue_size`` operations are in flight; beyond that ``hash``/``verify``
+    raise PasswordHasherBusy immediately instead of queueing without bound.
+    """
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=PASSWORD_HASH_WORKERS, queue_size=PASSWORD_HASH_QUEUE_SIZE, observe=None):
+        self.method = method
+        self.workers = workers
+        self.capacity = workers + queue_size
+        # Optional callback(operation, seconds) run in the worker, used for latency metrics.
+        self.observe = observe
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._method_prefix = None
+
+    @property
+    def pending(self):
+        """Operations queued or running."""
+        return self._pending
+
+    def _get_executor(self):
+        # Created lazily and per process: worker threads do not survive a fork.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hasher")
+                self._slots = threading.BoundedSemaphore(self.capacity)
+                self._pending = 0
+                self._pid = os.getpid()
+            return self._executor
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _run(self, operation, fn, *args):
+        executor = self._get_executor()
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy(f"{self.capacity} password operations already in flight")
+        with self._lock:
+            self._pending += 1
+        try:
+            future = executor.submit(self._timed, operation, fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future.result()
+
+    def _timed(self, operation, fn, *args):
+        if self.observe is None:
+            return fn(*args)
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.observe(operation, time.perf_counter() - start)
+
+    def hash(self, password):
+        return self._run("hash", generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run("verify", check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when ``password_hash`` was made with a different method or cost than the configured one."""
+        if self._method_prefix is None:
+            # werkzeug expands shorthand methods ("scrypt") to their full parameters; hash once to learn them.
+            self._method_prefix = generate_password_hash("", self.method, salt_length=1).split("$", 1)[0]
+        return password_hash.split("$", 1)[0] != self._method_prefix
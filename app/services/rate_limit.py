@@ -0,0 +1,409 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+
+from prometheus_flask_exporter import Counter, Gauge
+
+
+logger = logging.getLogger(__name__)
+
+# Per-user token bucket in front of /chat: sustained requests per minute and burst size
+CHAT_RATE_LIMIT_PER_MINUTE = float(os.environ.get("CHAT_RATE_LIMIT_PER_MINUTE", "20"))
+CHAT_RATE_LIMIT_BURST = int(os.environ.get("CHAT_RATE_LIMIT_BURST", "10"))
+# Cap on LLM calls in flight per process (threads and event loops together), and how long a request may wait for a slot
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "2"))
+# Retries of throttled or failed upstream calls, with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.environ.get("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.environ.get("LLM_RETRY_MAX_DELAY", "8"))
+# Consecutive failed calls that open the circuit, and seconds before a trial call is let through
+CIRCUIT_BREAKER_FAILURES = int(os.environ.get("CIRCUIT_BREAKER_FAILURES", "5"))
+CIRCUIT_BREAKER_RESET_SECONDS = float(os.environ.get("CIRCUIT_BREAKER_RESET_SECONDS", "30"))
+
+chat_rejected_total = Counter('chat_rejected_total', 'Total number of chat requests rejected by admission control', ['reason'])
+llm_in_flight = Gauge('llm_in_flight', 'LLM calls currently in flight')
+llm_retries_total = Counter('llm_retries_total', 'Total number of retried LLM calls')
+circuit_breaker_state = Gauge('llm_circuit_breaker_state', 'LLM circuit breaker state (0 closed, 1 half-open, 2 open)')
+circuit_breaker_opened_total = Counter('llm_circuit_breaker_opened_total', 'Total number of times the LLM circuit breaker opened')
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+_EXHAUSTED = object()
+
+
+class ChatRejected(RuntimeError):
+    """A chat request refused before or instead of reaching the LLM; answered with ``status_code`` and Retry-After."""
+    status_code = 429
+    reason = "rejected"
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, int(-(-self.retry_after // 1))))
+
+
+class UserRateLimited(ChatRejected):
+    reason = "user_rate"
+
+
+class ConcurrencyLimited(ChatRejected):
+    reason = "concurrency"
+
+
+class CircuitOpen(ChatRejected):
+    status_code = 503
+    reason = "circuit_open"
+
+
+class UpstreamUnavailable(ChatRejected):
+    """The provider kept throttling or failing after every retry."""
+    status_code = 503
+    reason = "upstream"
+
+
+class UserRateLimiter:
+    """
+    Token bucket per user: ``burst`` requests at once, refilled at ``per_minute`` per minute.
+    Buckets of the ``max_users`` least recently seen users are kept; evicted users start full.
+    """
+
+    def __init__(self, per_minute=CHAT_RATE_LIMIT_PER_MINUTE, burst=CHAT_RATE_LIMIT_BURST, max_users=10000, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_users = max_users
+        self.clock = clock
+        self._buckets = OrderedDict()  # user key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def acquire(self, user_key, cost=1):
+        """
+        Take ``cost`` tokens or raise UserRateLimited with the wait until they are available.
+        Costs above ``burst`` are capped, so a large request drains the bucket instead of never fitting.
+        """
+        if self.rate <= 0:
+            return
+        cost = min(cost, self.burst)
+        now = self.clock()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(user_key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                retry_after = None
+            else:
+                retry_after = (cost - tokens) / self.rate
+            self._buckets[user_key] = (tokens, now)
+            self._buckets.move_to_end(user_key)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        if retry_after is not None:
+            chat_rejected_total.labels(reason=UserRateLimited.reason).inc()
+            raise UserRateLimited(f"rate limit exceeded for user {user_key}", retry_after)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive upstream failures and fails fast for
+    ``reset_timeout`` seconds; then lets a single trial call through (half-open) and closes
+    again if it succeeds.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, failure_threshold=CIRCUIT_BREAKER_FAILURES, reset_timeout=CIRCUIT_BREAKER_RESET_SECONDS, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        self.state = state
+        circuit_breaker_state.set(state)
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self._opened_at + self.reset_timeout - self.clock()
+            if self.state == self.OPEN and remaining <= 0:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+        chat_rejected_total.labels(reason=CircuitOpen.reason).inc()
+        raise CircuitOpen("LLM provider circuit is open", max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self.state != self.CLOSED:
+                logger.info("LLM circuit breaker closed.")
+                self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    circuit_breaker_opened_total.inc()
+                    logger.warning(f"LLM circuit breaker opened after {self._failures} consecutive failures.")
+                self._opened_at = self.clock()
+                self._set_state(self.OPEN)
+
+    def reset(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            self._set_state(self.CLOSED)
+
+
+def is_retryable(error):
+    """Throttling (429), timeouts, connection errors and 5xx responses from the provider."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    try:
+        import openai
+        return isinstance(error, (openai.APIConnectionError, openai.APITimeoutError))
+    except ImportError:  # pragma: no cover
+        return False
+
+
+def _retry_after_hint(error):
+    """Seconds the provider asked us to wait, from the Retry-After header of its response."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Waiter:
+    """A thread (``loop`` None) or coroutine queued for a slot of a ``_Slots`` pool."""
+    __slots__ = ("loop", "ready", "granted", "withdrawn")
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.ready = loop.create_future() if loop is not None else threading.Event()
+        self.granted = False
+        self.withdrawn = False
+
+    def grant(self):
+        """Hand this waiter a slot; False if it gave up or its event loop is gone. Called under the pool lock."""
+        if self.withdrawn:
+            return False
+        if self.loop is None:
+            self.ready.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(_resolve, self.ready)
+            except RuntimeError:  # loop closed
+                return False
+        self.granted = True
+        return True
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Slots:
+    """
+    Process-wide budget of ``size`` slots shared by threads and coroutines, handed out first
+    come, first served. Threads block on an Event; coroutines await a future that the
+    releasing caller resolves on their loop with ``call_soon_threadsafe``, so a waiting
+    coroutine blocks neither its loop nor an executor thread.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._in_use = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, loop=None):
+        """Take a free slot and return None, or queue and return a _Waiter."""
+        with self._lock:
+            if self._in_use < self.size and not self._waiters:
+                self._in_use += 1
+                return None
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _withdraw(self, waiter):
+        """Stop waiting; True if a slot was granted in the meantime (the caller now holds it)."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            waiter.withdrawn = True
+            self._waiters.remove(waiter)
+            return False
+
+    def acquire(self, timeout=None):
+        waiter = self._try_acquire()
+        if waiter is None or waiter.ready.wait(timeout):
+            return True
+        return self._withdraw(waiter)
+
+    async def aacquire(self, timeout=None):
+        waiter = self._try_acquire(asyncio.get_running_loop())
+        if waiter is None:
+            return True
+        try:
+            await asyncio.wait_for(waiter.ready, timeout)
+        except asyncio.TimeoutError:
+            return self._withdraw(waiter)
+        except asyncio.CancelledError:
+            if self._withdraw(waiter):
+                self.release()
+            raise
+        return True
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                if self._waiters.popleft().grant():
+                    return  # the slot passes straight to the waiter
+            self._in_use -= 1
+
+
+class LLMGuard:
+    """
+    Wraps every LLM call: at most ``max_concurrency`` calls in flight (waiting up to
+    ``queue_timeout`` for a slot), retries of retryable upstream errors with full-jitter
+    exponential backoff (honouring the provider's Retry-After), and a circuit breaker that
+    fails fast while the provider is down. Non-retryable errors are raised unchanged.
+
+    Threads and coroutines draw on the same ``max_concurrency`` slots. Coroutines wait without
+    blocking their event loop or occupying an executor thread, and a cancelled waiter never
+    holds a slot.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, queue_timeout=LLM_QUEUE_TIMEOUT, max_retries=LLM_MAX_RETRIES,
+                 base_delay=LLM_RETRY_BASE_DELAY, max_delay=LLM_RETRY_MAX_DELAY, breaker=None,
+                 sleep=time.sleep, asleep=asyncio.sleep, jitter=random.uniform):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+        self.asleep = asleep
+        self.jitter = jitter
+        self._slots = _Slots(max_concurrency)
+
+    def _backoff(self, attempt, error):
+        hint = _retry_after_hint(error)
+        if hint is not None:
+            return min(hint, self.max_delay)
+        return self.jitter(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _rejected(self):
+        chat_rejected_total.labels(reason=ConcurrencyLimited.reason).inc()
+        return ConcurrencyLimited(f"{self.max_concurrency} LLM calls already in flight", self.queue_timeout or 1.0)
+
+    @contextmanager
+    def _slot(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise self._rejected()
+        llm_in_flight.inc()
+        try:
+            yield
+        finally:
+            llm_in_flight.dec()
+            self._slots.release()
+
+    @asynccontextmanager
+    async def _aslot(self):
+        if not await self._slots.aacquire(self.queue_timeout):
+            raise self._rejected()
+        llm_in_flight.inc()
+        try:
+            yield
+        finally:
+            llm_in_flight.dec()
+            self._slots.release()
+
+    def _on_error(self, error, attempt):
+        """Record a failed attempt and return the delay before retrying, or raise."""
+        if not is_retryable(error):
+            self.breaker.record_success()  # the provider answered; the request itself was bad
+            raise error
+        if attempt >= self.max_retries:
+            self.breaker.record_failure()
+            chat_rejected_total.labels(reason=UpstreamUnavailable.reason).inc()
+            raise UpstreamUnavailable(f"LLM call failed after {attempt + 1} attempts: {error}", self._backoff(attempt, error)) from error
+        if self.breaker.state == CircuitBreaker.HALF_OPEN:
+            self.breaker.record_failure()  # the trial call failed: reopen instead of retrying
+        llm_retries_total.inc()
+        delay = self._backoff(attempt, error)
+        logger.warning(f"LLM call failed ({error}), retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries}).")
+        return delay
+
+    def call(self, fn, *args, **kwargs):
+        with self._slot():
+            for attempt in range(self.max_retries + 1):
+                self.breaker.before_call()
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    self.sleep(self._on_error(e, attempt))
+                    continue
+                self.breaker.record_success()
+                return result
+
+    def stream(self, fn, *args, **kwargs):
+        """
+        Yield the chunks of ``fn(*args, **kwargs)`` holding a slot for the whole stream. Only
+        the first chunk is retried: once text has been sent it cannot be taken back.
+        """
+        with self._slot():
+            for attempt in range(self.max_retries + 1):
+                self.breaker.before_call()
+                try:
+                    chunks = iter(fn(*args, **kwargs))
+                    first = next(chunks, _EXHAUSTED)
+                except Exception as e:
+                    self.sleep(self._on_error(e, attempt))
+                    continue
+                self.breaker.record_success()
+                break
+            if first is _EXHAUSTED:
+                return
+            yield first
+            yield from chunks
+
+    async def acall(self, fn, *args, **kwargs):
+        async with self._aslot():
+            for attempt in range(self.max_retries + 1):
+                self.breaker.before_call()
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception as e:
+                    await self.asleep(self._on_error(e, attempt))
+                    continue
+                self.breaker.record_success()
+                return result
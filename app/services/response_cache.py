@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.services.knowledge_base import detect_destination
+from app.services.text import normalize_text
+
+
+class ResponseCache:
+    """
+    Two-tier cache of final chat answers.
+
+    - Exact tier: keyed on the normalized query (lowercased, accent-folded, punctuation
+      stripped), so "¿Qué precio tiene el viaje?" and "que precio tiene el viaje" share an entry.
+    - Semantic tier: on an exact miss, the query embedding is compared against cached queries
+      and the closest answer is reused if its cosine similarity reaches ``similarity_threshold``.
+      Only entries for the same destination (``detect_destination``) are compared, since
+      templated questions about different trips embed almost identically.
+      Disabled when ``embed_query`` is None, and per call with ``semantic=False`` so queries
+      that retrieval answers without an embedding do not pay for one here either. Callers
+      that already embedded the query (e.g. a whole batch in one call) pass it as ``vector``.
+
+    Entries expire after ``ttl_seconds`` and the least recently used one is evicted beyond
+    ``max_entries``. Every lookup carries the knowledge base version; when it changes the whole
+    cache is dropped so answers never outlive the content they were generated from.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, similarity_threshold=0.95, embed_query=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.embed_query = embed_query
+        self.clock = clock
+        self.version = None
+        self._entries = OrderedDict()  # key -> (answer, unit vector or None, expires_at, destination)
+        self._matrix = None  # stacked vectors of entries that have one, rebuilt lazily
+        self._matrix_keys = []
+        self._matrix_destinations = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._entries.clear()
+            self._matrix = None
+            self.version = version
+
+    def _expire(self, now):
+        expired = [key for key, (_, _, expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _embed(self, query, vector=None):
+        vector = np.asarray(self.embed_query(query) if vector is None else vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _semantic_match(self, vector, destination):
+        if self._matrix is None:
+            self._matrix_keys = [key for key, (_, v, _, _) in self._entries.items() if v is not None]
+            self._matrix = np.vstack([self._entries[key][1] for key in self._matrix_keys]) if self._matrix_keys else None
+            self._matrix_destinations = np.array([self._entries[key][3] for key in self._matrix_keys], dtype=object)
+        if self._matrix is None:
+            return None
+        scores = np.where(self._matrix_destinations == destination, self._matrix @ vector, -np.inf)
+        best = int(np.argmax(scores))
+        return self._matrix_keys[best] if scores[best] >= self.similarity_threshold else None
+
+    def get(self, query, version=None, semantic=True, vector=None):
+        """Return ``(answer, tier)`` with tier "exact" or "semantic", or ``(None, None)`` on a miss."""
+        key = normalize_text(query)
+        with self._lock:
+            self._check_version(version)
+            self._expire(self.clock())
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0], "exact"
+            if not semantic or self.embed_query is None or not self._entries:
+                return None, None
+
+        vector = self._embed(query, vector)
+        with self._lock:
+            if version != self.version:
+                return None, None
+            match = self._semantic_match(vector, detect_destination(query))
+            if match is None or match not in self._entries:
+                return None, None
+            self._entries.move_to_end(match)
+            return self._entries[match][0], "semantic"
+
+    def put(self, query, answer, version=None, semantic=True, vector=None):
+        """Store ``answer``; with ``semantic=False`` it is only found again by the exact tier."""
+        key = normalize_text(query)
+        vector = self._embed(query, vector) if semantic and self.embed_query is not None else None
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (answer, vector, self.clock() + self.ttl_seconds, detect_destination(query))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
@@ -0,0 +1,192 @@
+import os
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from prometheus_flask_exporter import Counter
+
+from app.services.embedding_cache import embed_queries
+from app.services.knowledge_base import detect_destination
+from app.services.lexical import BM25Index
+from app.services.timing import span
+
+
+# Lexical fast path: short keyword queries fully matched by one clear BM25 winner skip the embedding call
+LEXICAL_FAST_PATH_MAX_TERMS = int(os.environ.get("LEXICAL_FAST_PATH_MAX_TERMS", "4"))
+LEXICAL_FAST_PATH_MARGIN = float(os.environ.get("LEXICAL_FAST_PATH_MARGIN", "1.2"))
+# Reciprocal rank fusion constant; larger values flatten the advantage of top ranks
+RRF_K = 60
+
+retrieval_requests_total = Counter('retrieval_requests_total', 'Total number of knowledge base retrievals by path', ['path'])
+
+
+class DestinationRetriever(BaseRetriever):
+    """
+    Vector retriever over FAQ documents that narrows the search to a single destination when
+    the query names one (e.g. "precio Gorgona"). Falls back to the whole index otherwise, or
+    when the destination has no documents. Returned documents carry their similarity in
+    ``metadata["score"]``.
+    """
+
+    vectorstore: VectorStore
+    k: int = 4
+
+    def _search_by_vector(self, embedding, destination):
+        # The query is embedded once and reused by the unfiltered fallback search.
+        filter = {"destination": destination} if destination else None
+        with span("vector_search"):
+            results = self.vectorstore.similarity_search_with_score_by_vector(embedding, k=self.k, filter=filter)
+            if not results and filter is not None:
+                results = self.vectorstore.similarity_search_with_score_by_vector(embedding, k=self.k)
+        return results
+
+    def _search(self, query, destination):
+        with span("embedding"):
+            embedding = self.vectorstore.embeddings.embed_query(query)
+        return self._search_by_vector(embedding, destination)
+
+    async def _asearch(self, query, destination):
+        with span("embedding"):
+            embedding = await self.vectorstore.embeddings.aembed_query(query)
+        return self._search_by_vector(embedding, destination)
+
+    @staticmethod
+    def _with_scores(results):
+        return [
+            Document(id=doc.id, page_content=doc.page_content, metadata={**doc.metadata, "score": score})
+            for doc, score in results
+        ]
+
+    def _get_relevant_documents(self, query, *, run_manager, destination=None):
+        return self._with_scores(self._search(query, destination or detect_destination(query)))
+
+    async def _aget_relevant_documents(self, query, *, run_manager, destination=None):
+        return self._with_scores(await self._asearch(query, destination or detect_destination(query)))
+
+    def batch_retrieve(self, queries, destinations=None, vectors=None):
+        """
+        Retrieve for many queries at once: one embeddings call for all of them and one matrix
+        search per destination group. ``vectors`` holds query embeddings the caller already has
+        (None where it has none); only the others are embedded. Returns one Document list per
+        query, in order.
+        """
+        queries = list(queries)
+        destinations = destinations or [detect_destination(query) for query in queries]
+        embeddings = list(vectors) if vectors is not None else [None] * len(queries)
+        missing = [position for position, vector in enumerate(embeddings) if vector is None]
+        if missing:
+            with span("embedding"):
+                for position, vector in zip(missing, embed_queries(self.vectorstore.embeddings, [queries[p] for p in missing])):
+                    embeddings[position] = vector
+        groups = {}
+        for position, destination in enumerate(destinations):
+            groups.setdefault(destination, []).append(position)
+
+        results = [None] * len(queries)
+        with span("vector_search"):
+            for destination, positions in groups.items():
+                filter = {"destination": destination} if destination else None
+                batch = self.vectorstore.batch_similarity_search_with_score_by_vector(
+                    [embeddings[p] for p in positions], k=self.k, filter=filter
+                )
+                for position, found in zip(positions, batch):
+                    if not found and filter is not None:
+                        found = self.vectorstore.similarity_search_with_score_by_vector(embeddings[position], k=self.k)
+                    results[position] = self._with_scores(found)
+        return results
+
+
+def reciprocal_rank_fusion(*rankings, k=RRF_K):
+    """Fuse ranked Document lists, keyed by document id, into one list of ``(document, score)``."""
+    scores, documents = {}, {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            key = document.id or document.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            documents.setdefault(key, document)
+    return [(documents[key], scores[key]) for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Combines a local BM25 index with vector search over the same FAQ documents.
+
+    When the BM25 result is confident (see ``BM25Index.is_confident``) the lexical hits are
+    returned directly and no query embedding is requested. Otherwise lexical and vector rankings
+    are merged with reciprocal rank fusion. Both sides honour the destination named in the query.
+    ``metadata["retrieval"]`` records which path produced each document.
+    """
+
+    vector_retriever: DestinationRetriever
+    lexical_index: BM25Index
+    k: int = 4
+    max_terms: int = LEXICAL_FAST_PATH_MAX_TERMS
+    margin: float = LEXICAL_FAST_PATH_MARGIN
+
+    def _lexical(self, query, destination):
+        filter = {"destination": destination} if destination else None
+        with span("lexical_search"):
+            results = self.lexical_index.search(query, k=self.k, filter=filter)
+            if not results and filter is not None:
+                results = self.lexical_index.search(query, k=self.k)
+        return results
+
+    @staticmethod
+    def _tag(scored, path):
+        return [
+            Document(id=doc.id, page_content=doc.page_content, metadata={**doc.metadata, "score": score, "retrieval": path})
+            for doc, score in scored
+        ]
+
+    def takes_lexical_path(self, query):
+        """Whether ``query`` is answered by the lexical fast path, i.e. without a query embedding."""
+        lexical = self._lexical(query, detect_destination(query))
+        return self.lexical_index.is_confident(query, lexical, max_terms=self.max_terms, margin=self.margin)
+
+    def _fast_path(self, query, lexical):
+        if self.lexical_index.is_confident(query, lexical, max_terms=self.max_terms, margin=self.margin):
+            retrieval_requests_total.labels(path="lexical").inc()
+            return self._tag([(doc, score) for doc, score, _ in lexical], "lexical")
+        return None
+
+    def _fuse(self, lexical, vector):
+        retrieval_requests_total.labels(path="hybrid").inc()
+        fused = reciprocal_rank_fusion([doc for doc, _, _ in lexical], vector)
+        return self._tag(fused[:self.k], "hybrid")
+
+    def _get_relevant_documents(self, query, *, run_manager, destination=None):
+        destination = destination or detect_destination(query)
+        lexical = self._lexical(query, destination)
+        fast = self._fast_path(query, lexical)
+        if fast is not None:
+            return fast
+        return self._fuse(lexical, self.vector_retriever.invoke(query, destination=destination))
+
+    async def _aget_relevant_documents(self, query, *, run_manager, destination=None):
+        destination = destination or detect_destination(query)
+        lexical = self._lexical(query, destination)
+        fast = self._fast_path(query, lexical)
+        if fast is not None:
+            return fast
+        return self._fuse(lexical, await self.vector_retriever.ainvoke(query, destination=destination))
+
+    def batch_retrieve(self, queries, vectors=None):
+        """
+        Batch counterpart of ``invoke``: confident lexical hits are answered directly and every
+        remaining query goes through a single batched vector retrieval, reusing any query
+        embeddings passed in ``vectors``. One list per query, in order.
+        """
+        queries = list(queries)
+        destinations = [detect_destination(query) for query in queries]
+        lexical = [self._lexical(query, destination) for query, destination in zip(queries, destinations)]
+        results = [self._fast_path(query, hits) for query, hits in zip(queries, lexical)]
+        pending = [position for position, result in enumerate(results) if result is None]
+        if pending:
+            vector = self.vector_retriever.batch_retrieve(
+                [queries[p] for p in pending],
+                destinations=[destinations[p] for p in pending],
+                vectors=[vectors[p] for p in pending] if vectors is not None else None,
+            )
+            for position, found in zip(pending, vector):
+                results[position] = self._fuse(lexical[position], found)
+        return results
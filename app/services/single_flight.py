@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+import threading
+
+from prometheus_flask_exporter import Counter
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds a request waits for an identical in-flight one before answering on its own (0 disables coalescing)
+CHAT_COALESCE_WAIT_TIMEOUT = float(os.environ.get("CHAT_COALESCE_WAIT_TIMEOUT", "30"))
+
+chat_coalesced_requests_total = Counter('chat_coalesced_requests_total', 'Total number of chat requests answered by an identical in-flight request')
+chat_coalesce_timeouts_total = Counter('chat_coalesce_timeouts_total', 'Total number of chat requests that stopped waiting for an identical in-flight request')
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing a key: the first caller (the leader) runs the function
+    and every caller arriving while it is in flight waits for and receives the same result, or
+    the same exception. Followers give up after ``wait_timeout`` seconds and run the function
+    themselves. Nothing is kept once the leader finishes; caching is left to the caller.
+    """
+
+    def __init__(self, wait_timeout=CHAT_COALESCE_WAIT_TIMEOUT):
+        self.wait_timeout = wait_timeout
+        self._flights = {}
+        self._futures = {}  # asyncio futures, keyed by (event loop id, key)
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return ``(result, shared)``; ``shared`` is True when the result came from another caller."""
+        if self.wait_timeout <= 0:
+            return fn(), False
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if leader:
+            try:
+                flight.result = fn()
+                return flight.result, False
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+        if not flight.done.wait(self.wait_timeout):
+            chat_coalesce_timeouts_total.inc()
+            logger.warning(f"Gave up waiting {self.wait_timeout}s for an identical in-flight request; answering separately.")
+            return fn(), False
+        chat_coalesced_requests_total.inc()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+    async def ado(self, key, fn):
+        """Asyncio counterpart of ``do`` for coroutine functions; coalesces within one event loop."""
+        if self.wait_timeout <= 0:
+            return await fn(), False
+        loop = asyncio.get_running_loop()
+        key = (id(loop), key)
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = loop.create_future()
+        if leader:
+            try:
+                result = await fn()
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()  # followers may not exist; don't log it as never retrieved
+                raise
+            except BaseException:
+                future.cancel()
+                raise
+            else:
+                future.set_result(result)
+                return result, False
+            finally:
+                with self._lock:
+                    del self._futures[key]
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+        except asyncio.TimeoutError:
+            chat_coalesce_timeouts_total.inc()
+            logger.warning(f"Gave up waiting {self.wait_timeout}s for an identical in-flight request; answering separately.")
+            return await fn(), False
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            return await fn(), False
+        except Exception:
+            chat_coalesced_requests_total.inc()
+            raise
+        chat_coalesced_requests_total.inc()
+        return result, True
@@ -0,0 +1,18 @@
+import re
+import unicodedata
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fold_accents(text):
+    """Strip diacritics so 'San Andrés' and 'san andres' compare equal."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def normalize_text(text):
+    """Lowercase, accent-fold and drop punctuation, collapsing runs of whitespace."""
+    text = fold_accents(text or "").lower()
+    text = _NON_WORD.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
@@ -0,0 +1,118 @@
+import cProfile
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_flask_exporter import Counter, Histogram
+
+
+logger = logging.getLogger(__name__)
+
+# Sampled profiling of slow chat requests: profile this fraction of requests and keep the
+# .prof dump only when the request took at least CHAT_PROFILE_SLOW_SECONDS
+CHAT_PROFILE_SAMPLE_RATE = float(os.environ.get("CHAT_PROFILE_SAMPLE_RATE", "0"))
+CHAT_PROFILE_SLOW_SECONDS = float(os.environ.get("CHAT_PROFILE_SLOW_SECONDS", "2.0"))
+CHAT_PROFILE_DIR = os.environ.get("CHAT_PROFILE_DIR", "instance/profiles")
+
+chat_stage_latency_seconds = Histogram(
+    'chat_stage_latency_seconds', 'Latency of chat pipeline stages in seconds', ['stage'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+chat_profiles_written_total = Counter('chat_profiles_written_total', 'Total number of cProfile dumps written for slow chat requests')
+
+_current_timings = ContextVar("chat_request_timings", default=None)
+
+
+class RequestTimings:
+    """Per-request breakdown of stage durations, in the order the stages first ran."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self):
+        """Value for a ``Server-Timing`` header, durations in milliseconds."""
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+
+@contextmanager
+def track_request():
+    """Collect the spans recorded by this request (thread or asyncio task) into a RequestTimings."""
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a pipeline stage: always observed in ``chat_stage_latency_seconds`` and, inside
+    ``track_request``, added to the request's breakdown. Stages that run several times in one
+    request (e.g. a filtered search plus its fallback) accumulate.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        chat_stage_latency_seconds.labels(stage=stage).observe(elapsed)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(stage, elapsed)
+
+
+class SlowRequestProfiler:
+    """
+    Runs a sampled fraction of requests under cProfile and writes a ``.prof`` file (readable
+    with ``python -m pstats`` or snakeviz) for those slower than ``slow_seconds``. Only use it
+    around synchronous handlers: on an event loop it would also profile unrelated tasks.
+    """
+
+    def __init__(self, sample_rate=CHAT_PROFILE_SAMPLE_RATE, slow_seconds=CHAT_PROFILE_SLOW_SECONDS,
+                 output_dir=CHAT_PROFILE_DIR, sample=random.random):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.output_dir = output_dir
+        self.sample = sample
+
+    @contextmanager
+    def profile(self, label):
+        if self.sample_rate <= 0 or self.sample() >= self.sample_rate:
+            yield
+            return
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler is already active in this thread
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.slow_seconds:
+                self._dump(profiler, label, elapsed)
+
+    def _dump(self, profiler, label, elapsed):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"{label}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{int(elapsed * 1000)}ms.prof")
+            profiler.dump_stats(path)
+        except OSError as e:
+            logger.warning(f"Could not write request profile: {e}")
+            return
+        chat_profiles_written_total.inc()
+        logger.warning(f"Slow {label} request took {elapsed:.2f}s, profile written to {path}")
+
+
+profiler = SlowRequestProfiler()
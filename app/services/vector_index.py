@@ -0,0 +1,326 @@
+import json
+import os
+import shutil
+import uuid
+from collections.abc import Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+
+def _normalize_rows(vectors):
+    """Return a float32 copy of ``vectors`` with every row scaled to unit length."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores, k):
+    """Indices of the ``k`` highest scores, best first, using argpartition instead of a full sort."""
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def _matches(document, filter):
+    if callable(filter):
+        return filter(document)
+    return all(document.metadata.get(key) == value for key, value in filter.items())
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store backed by a contiguous, pre-normalized float32 matrix.
+
+    Cosine similarity for a query is a single matrix-vector product and top-k selection uses
+    ``argpartition``, so search cost stays in NumPy instead of Python loops over documents.
+    ``batch_similarity_search_with_score_by_vector`` answers many queries with one matmul.
+    Works anywhere a LangChain ``VectorStore`` does, including ``as_retriever()``.
+
+    ``filter`` may be a callable taking a ``Document`` or a dict of metadata values to match.
+    """
+
+    def __init__(self, embedding):
+        self.embedding = embedding
+        # Snapshot replaced atomically on writes so concurrent searches never see a torn index.
+        self._state = (np.empty((0, 0), dtype=np.float32), [], [])
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def __len__(self):
+        return len(self._state[1])
+
+    def copy(self):
+        """Cheap copy sharing the current arrays; writes to either store never affect the other."""
+        clone = type(self)(self.embedding)
+        clone._state = self._state
+        return clone
+
+    def add_vectors(self, vectors, documents, ids=None):
+        """Add precomputed embeddings for ``documents``. Returns the ids assigned to them."""
+        documents = list(documents)
+        if not documents:
+            return []
+        ids = list(ids) if ids is not None else [doc.id or str(uuid.uuid4()) for doc in documents]
+        new_rows = _normalize_rows(vectors)
+        matrix, current_docs, current_ids = self._state
+        if matrix.size:
+            new_rows = np.vstack([matrix, new_rows])
+        stored = [Document(id=i, page_content=doc.page_content, metadata=doc.metadata) for i, doc in zip(ids, documents)]
+        self._state = (np.ascontiguousarray(new_rows), current_docs + stored, current_ids + ids)
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return self.add_vectors(self.embedding.embed_documents(texts), documents, ids=ids)
+
+    def delete(self, ids=None, **kwargs):
+        if ids is None:
+            return None
+        drop = set(ids)
+        matrix, documents, current_ids = self._state
+        keep = [row for row, doc_id in enumerate(current_ids) if doc_id not in drop]
+        self._state = (
+            np.ascontiguousarray(matrix[keep]) if keep else np.empty((0, 0), dtype=np.float32),
+            [documents[row] for row in keep],
+            [current_ids[row] for row in keep],
+        )
+        return True
+
+    def get_by_ids(self, ids):
+        _, documents, current_ids = self._state
+        by_id = dict(zip(current_ids, documents))
+        return [by_id[i] for i in ids if i in by_id]
+
+    def _filter_mask(self, documents, filter):
+        return np.fromiter((_matches(doc, filter) for doc in documents), dtype=bool, count=len(documents))
+
+    def _search_rows(self, scores, documents, k, filter):
+        if filter is not None:
+            mask = self._filter_mask(documents, filter)
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, int(mask.sum()))
+        if k <= 0:
+            return []
+        return [(documents[row], float(scores[row])) for row in _top_k(scores, k)]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        matrix, documents, _ = self._state
+        if not documents:
+            return []
+        scores = matrix @ _normalize_rows(embedding)[0]
+        return self._search_rows(scores, documents, k, filter)
+
+    def batch_similarity_search_with_score_by_vector(self, embeddings, k=4, filter=None, **kwargs):
+        """Search for many query embeddings at once. Returns one result list per query, in order."""
+        matrix, documents, _ = self._state
+        queries = _normalize_rows(embeddings)
+        if not documents:
+            return [[] for _ in range(queries.shape[0])]
+        scores = queries @ matrix.T
+        return [self._search_rows(row_scores, documents, k, filter) for row_scores in scores]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k=k, filter=filter)
+
+    async def asimilarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        # Only the query embedding does I/O; the matrix search itself is fast enough to run inline.
+        embedding = await self.embedding.aembed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter)
+
+    async def asimilarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k=k, filter=filter)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]; map them onto [0, 1].
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+
+VECTORS_FILE = "vectors.f32"
+DOCUMENTS_FILE = "documents.jsonl"
+OFFSETS_FILE = "offsets.i64"
+INDEX_FILE = "index.json"  # written last: a directory without it is incomplete
+
+
+class ReadOnlyIndexError(TypeError):
+    """Raised when writing to a memory-mapped index; edit a ``copy()`` instead."""
+
+
+class MappedDocuments(Sequence):
+    """
+    Read-only Document sequence over a memory-mapped JSON-lines file: a Document is only
+    decoded when a search returns its row. Dict filters read metadata columns, each decoded
+    once per process on first use.
+    """
+
+    def __init__(self, data, offsets):
+        self._data = data
+        self._offsets = offsets
+        self._columns = {}
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _row(self, row):
+        return json.loads(self._data[self._offsets[row]:self._offsets[row + 1]].tobytes().decode("utf-8"))
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        entry = self._row(row)
+        return Document(id=entry["id"], page_content=entry["page_content"], metadata=entry["metadata"])
+
+    def column(self, key):
+        """``metadata[key]`` of every row as a NumPy object array."""
+        values = self._columns.get(key)
+        if values is None:
+            values = np.empty(len(self), dtype=object)
+            values[:] = [self._row(row)["metadata"].get(key) for row in range(len(self))]
+            self._columns[key] = values
+        return values
+
+
+def _write_rows(path, documents, ids):
+    offsets = [0]
+    with open(os.path.join(path, DOCUMENTS_FILE), "wb") as f:
+        for doc_id, document in zip(ids, documents):
+            line = json.dumps(
+                {"id": doc_id, "page_content": document.page_content, "metadata": document.metadata},
+                ensure_ascii=False,
+            ).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.asarray(offsets, dtype=np.int64).tofile(os.path.join(path, OFFSETS_FILE))
+
+
+class MmapVectorStore(NumpyVectorStore):
+    """
+    Read-only NumpyVectorStore whose matrix and documents live in files mapped with
+    ``np.memmap``. Every worker that opens the same directory shares one copy of the pages
+    through the OS page cache instead of holding the index in its own heap. It searches like
+    NumpyVectorStore and plugs into DestinationRetriever, ``as_retriever()`` and
+    ``create_retriever_tool`` the same way.
+
+    ``copy()`` returns an in-memory NumpyVectorStore, which is how incremental reloads edit it.
+    """
+
+    def __init__(self, embedding, path):
+        super().__init__(embedding)
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        rows, dim = index["rows"], index["dim"]
+        if rows:
+            matrix = np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode="r", shape=(rows, dim))
+            data = np.memmap(os.path.join(path, DOCUMENTS_FILE), dtype=np.uint8, mode="r")
+        else:
+            matrix, data = np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.uint8)
+        offsets = np.fromfile(os.path.join(path, OFFSETS_FILE), dtype=np.int64)
+        self._state = (matrix, MappedDocuments(data, offsets), index["ids"])
+
+    @staticmethod
+    def write(store, path):
+        """
+        Serialize ``store`` into directory ``path``. The files are written to a temporary
+        sibling directory and renamed into place, so readers never see a partial index; if
+        another process published ``path`` first, its files are kept.
+        """
+        matrix, documents, ids = store._state
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        try:
+            np.ascontiguousarray(matrix, dtype=np.float32).tofile(os.path.join(tmp_path, VECTORS_FILE))
+            _write_rows(tmp_path, documents, ids)
+            dim = int(matrix.shape[1]) if matrix.size else 0
+            with open(os.path.join(tmp_path, INDEX_FILE), "w", encoding="utf-8") as f:
+                json.dump({"rows": len(ids), "dim": dim, "ids": list(ids)}, f)
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                if not os.path.exists(os.path.join(path, INDEX_FILE)):
+                    raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    @classmethod
+    def share(cls, store, root, key, keep=2):
+        """
+        The MmapVectorStore for ``store`` under ``root/key``, writing it unless a worker already
+        did. ``key`` must identify the content (e.g. the knowledge base version). Only the
+        ``keep`` most recently published indexes are kept on disk; files still mapped by a
+        worker stay readable after removal.
+        """
+        if isinstance(store, MmapVectorStore) and os.path.abspath(store.path) == os.path.abspath(os.path.join(root, key)):
+            return store
+        os.makedirs(root, exist_ok=True)
+        path = os.path.join(root, key)
+        if not os.path.exists(os.path.join(path, INDEX_FILE)):
+            cls.write(store, path)
+        os.utime(path)
+        published = sorted(
+            (entry for entry in os.scandir(root) if entry.is_dir() and not entry.name.endswith(".tmp")),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+        for entry in published[keep:]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+        return cls(store.embedding, path)
+
+    @classmethod
+    def open(cls, embedding, root, key):
+        """
+        The MmapVectorStore published under ``root/key`` by ``share``, or None when no complete
+        index is there. Opening marks it as recently used, like ``share``.
+        """
+        path = os.path.join(root, key)
+        try:
+            store = cls(embedding, path)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return store
+
+    def copy(self):
+        matrix, documents, ids = self._state
+        clone = NumpyVectorStore(self.embedding)
+        clone._state = (np.array(matrix, dtype=np.float32), list(documents), list(ids))
+        return clone
+
+    def add_vectors(self, vectors, documents, ids=None):
+        raise ReadOnlyIndexError("MmapVectorStore is read-only; edit a copy() instead")
+
+    def delete(self, ids=None, **kwargs):
+        raise ReadOnlyIndexError("MmapVectorStore is read-only; edit a copy() instead")
+
+    def _filter_mask(self, documents, filter):
+        if isinstance(filter, dict):
+            mask = np.ones(len(documents), dtype=bool)
+            for key, value in filter.items():
+                mask &= documents.column(key) == value
+            return mask
+        return super()._filter_mask(documents, filter)
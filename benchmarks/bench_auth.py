@@ -0,0 +1,80 @@
+"""
+Measure per-request authentication overhead of token_required's authenticate(): JWT decode
+plus a SQLite user lookup on every request (no cache) against the token/user cache.
+
+Usage (from the project root):
+    python -m benchmarks.bench_auth --requests 5000 --users 50
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from flask import Flask
+
+from app.extensions import db
+from app.models.user import User
+from app.routes.auth import authenticate
+from app.services.auth_cache import AuthCache
+
+SECRET_KEY = "benchmark-secret-key-with-at-least-32-bytes"
+
+
+def _make_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    db.init_app(app)
+    return app
+
+
+def _time_per_request(headers, cache):
+    start = time.perf_counter()
+    for header in headers:
+        authenticate(header, SECRET_KEY, cache=cache)
+        # Flask-SQLAlchemy ends the session after every request.
+        db.session.remove()
+    return (time.perf_counter() - start) / len(headers)
+
+
+def run(n_requests, n_users, db_path):
+    app = _make_app(db_path)
+    with app.app_context():
+        db.create_all()
+        users = [User(username=f"diver{i}", password="x") for i in range(n_users)]
+        db.session.add_all(users)
+        db.session.commit()
+        exp = datetime.now(timezone.utc) + timedelta(hours=2)
+        tokens = [
+            jwt.encode({'user_id': user.id, 'username': user.username, 'exp': exp}, SECRET_KEY, algorithm='HS256')
+            for user in users
+        ]
+        rng = random.Random(0)
+        headers = [f"Bearer {rng.choice(tokens)}" for _ in range(n_requests)]
+
+        uncached = _time_per_request(headers, cache=None)
+        cache = AuthCache()
+        cold = _time_per_request(headers[:n_users], cache=cache)
+        warm = _time_per_request(headers, cache=cache)
+    return uncached, cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uncached, cold, warm = run(args.requests, args.users, os.path.join(tmp, "bench.db"))
+    print(f"{'mode':<28} {'us/request':>11}")
+    print(f"{'decode + DB (no cache)':<28} {uncached * 1e6:>11.1f}")
+    print(f"{'cache, first requests':<28} {cold * 1e6:>11.1f}")
+    print(f"{'cache, warm':<28} {warm * 1e6:>11.1f}")
+    print(f"speedup: {uncached / warm:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
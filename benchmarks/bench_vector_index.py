@@ -0,0 +1,75 @@
+"""
+Compare NumpyVectorStore against LangChain's InMemoryVectorStore on synthetic embeddings.
+
+Usage (from the project root):
+    python -m benchmarks.bench_vector_index --sizes 1000 10000 100000 --dim 384
+"""
+import argparse
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from app.services.vector_index import NumpyVectorStore
+
+
+class RandomEmbeddings:
+    """Local stand-in for OpenAIEmbeddings returning reproducible random vectors."""
+
+    def __init__(self, dim, seed=0):
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+
+    def embed_documents(self, texts):
+        return self.rng.standard_normal((len(texts), self.dim), dtype=np.float32).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _time_per_query(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def run(size, dim, n_queries, k):
+    embedding = RandomEmbeddings(dim)
+    vectors = embedding.embed_documents(range(size))
+    documents = [Document(id=str(i), page_content=f"chunk {i}") for i in range(size)]
+    queries = embedding.embed_documents(range(n_queries))
+
+    in_memory = InMemoryVectorStore(embedding)
+    in_memory.store = {
+        doc.id: {"id": doc.id, "vector": vector, "text": doc.page_content, "metadata": {}}
+        for doc, vector in zip(documents, vectors)
+    }
+    numpy_store = NumpyVectorStore(embedding)
+    numpy_store.add_vectors(vectors, documents)
+
+    baseline = _time_per_query(lambda q: in_memory.similarity_search_by_vector(q, k=k), queries)
+    single = _time_per_query(lambda q: numpy_store.similarity_search_by_vector(q, k=k), queries)
+    start = time.perf_counter()
+    numpy_store.batch_similarity_search_with_score_by_vector(queries, k=k)
+    batched = (time.perf_counter() - start) / n_queries
+    return baseline, single, batched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>8} {'InMemory ms/q':>14} {'Numpy ms/q':>11} {'Numpy batch ms/q':>17} {'speedup':>8}")
+    for size in args.sizes:
+        baseline, single, batched = run(size, args.dim, args.queries, args.k)
+        print(f"{size:>8} {baseline * 1e3:>14.3f} {single * 1e3:>11.3f} {batched * 1e3:>17.3f} {baseline / single:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
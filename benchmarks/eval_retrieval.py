@@ -0,0 +1,199 @@
+"""
+Retrieval quality and latency across index/retriever configurations, over the golden set of
+Spanish questions in benchmarks/golden_questions.yaml.
+
+Every configuration combines:
+  - chunking:  "entry" (one document per FAQ pair, as the service indexes them) or
+               "SIZE:OVERLAP" (each entry further split with RecursiveCharacterTextSplitter)
+  - retriever: "vector" (DestinationRetriever), "hybrid" (HybridRetriever, as the service
+               uses) or "lexical" (BM25 only)
+  - k:         documents returned per question
+
+and reports recall@k and MRR (judged on FAQ entries, so chunks of the same entry count once)
+next to index build time, memory retained by the index and per-query latency. Embeddings come
+from the local HashingEmbeddings by default; --embedder openai uses the real model (needs
+OPENAI_API_KEY and makes paid calls).
+
+Usage (from the project root):
+    python -m benchmarks.eval_retrieval --chunking entry 400:80 200:40 --retrievers vector hybrid lexical --k 2 4 6
+    python -m benchmarks.eval_retrieval --min-recall 0.9 --output retrieval-eval.json
+"""
+import argparse
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import yaml
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.services.knowledge_base import detect_destination, load_faq_documents
+from app.services.lexical import BM25Index
+from app.services.retrieval import DestinationRetriever, HybridRetriever
+from app.services.vector_index import NumpyVectorStore
+from benchmarks.fakes import HashingEmbeddings
+
+GOLDEN_SET = os.path.join(os.path.dirname(__file__), "golden_questions.yaml")
+RETRIEVERS = ("vector", "hybrid", "lexical")
+
+
+def load_golden_set(path=GOLDEN_SET):
+    """``[(question, {expected entry ids})]`` from the golden set YAML."""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = yaml.safe_load(f)
+    return [(entry["pregunta"], set(entry["entradas"])) for entry in entries]
+
+
+def entry_id(document):
+    return document.metadata.get("entry_id", document.id)
+
+
+def split_documents(documents, chunking):
+    """The FAQ documents as indexed under ``chunking``; chunks keep their entry in ``metadata["entry_id"]``."""
+    if chunking == "entry":
+        return list(documents)
+    size, overlap = (int(value) for value in chunking.split(":"))
+    splitter = RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap)
+    chunks = []
+    for document in documents:
+        for position, chunk in enumerate(splitter.split_documents([document])):
+            chunk.id = f"{document.id}~{position}"
+            chunk.metadata["entry_id"] = document.id
+            chunks.append(chunk)
+    return chunks
+
+
+class Index:
+    """Vector store and BM25 index for one chunking, with how long they took to build and their size."""
+
+    def __init__(self, documents, chunking, embeddings):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        self.documents = split_documents(documents, chunking)
+        self.vectorstore = NumpyVectorStore.from_documents(documents=self.documents, embedding=embeddings)
+        self.lexical_index = BM25Index(self.documents)
+        self.build_seconds = time.perf_counter() - start
+        self.memory_bytes = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+    def retriever(self, kind, k):
+        """Callable mapping a question to its ranked Documents."""
+        if kind == "vector":
+            return DestinationRetriever(vectorstore=self.vectorstore, k=k).invoke
+        if kind == "hybrid":
+            return HybridRetriever(
+                vector_retriever=DestinationRetriever(vectorstore=self.vectorstore, k=k),
+                lexical_index=self.lexical_index,
+                k=k,
+            ).invoke
+        if kind == "lexical":
+            def search(query):
+                destination = detect_destination(query)
+                filter = {"destination": destination} if destination else None
+                results = self.lexical_index.search(query, k=k, filter=filter)
+                if not results and filter is not None:
+                    results = self.lexical_index.search(query, k=k)
+                return [document for document, _, _ in results]
+            return search
+        raise ValueError(f"Unknown retriever: {kind}")
+
+
+def score(ranked_entries, expected, k):
+    """``(recall@k, reciprocal rank)`` of one question, given the entry ids in ranked order."""
+    top = []
+    for entry in ranked_entries:
+        if entry not in top:
+            top.append(entry)
+    top = top[:k]
+    recall = len(expected.intersection(top)) / len(expected)
+    rank = next((position for position, entry in enumerate(top, 1) if entry in expected), None)
+    return recall, (1.0 / rank if rank else 0.0)
+
+
+def evaluate(index, kind, k, golden):
+    retrieve = index.retriever(kind, k)
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for question, expected in golden:
+        start = time.perf_counter()
+        documents = retrieve(question)
+        latencies.append(time.perf_counter() - start)
+        recall, reciprocal_rank = score([entry_id(document) for document in documents], expected, k)
+        recalls.append(recall)
+        reciprocal_ranks.append(reciprocal_rank)
+    latencies_ms = np.asarray(latencies) * 1e3
+    return {
+        "recall": round(float(np.mean(recalls)), 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+        "query_ms_p50": round(float(np.percentile(latencies_ms, 50)), 3),
+        "query_ms_p95": round(float(np.percentile(latencies_ms, 95)), 3),
+    }
+
+
+def run(chunkings, retrievers, ks, embeddings, golden):
+    documents = load_faq_documents()
+    results = []
+    for chunking in chunkings:
+        index = Index(documents, chunking, embeddings)
+        for kind in retrievers:
+            for k in ks:
+                results.append({
+                    "chunking": chunking,
+                    "retriever": kind,
+                    "k": k,
+                    "documents": len(index.documents),
+                    "build_seconds": round(index.build_seconds, 4),
+                    "index_kib": round(index.memory_bytes / 1024, 1),
+                    **evaluate(index, kind, k, golden),
+                })
+    return results
+
+
+def pick(results, min_recall):
+    """The fastest configuration (p95 query latency) whose recall@k reaches ``min_recall``."""
+    acceptable = [result for result in results if result["recall"] >= min_recall]
+    return min(acceptable, key=lambda result: (result["query_ms_p95"], -result["mrr"]), default=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunking", nargs="+", default=["entry", "400:80", "200:40"], help='"entry" or "SIZE:OVERLAP"')
+    parser.add_argument("--retrievers", nargs="+", choices=RETRIEVERS, default=list(RETRIEVERS))
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 4, 6])
+    parser.add_argument("--embedder", choices=("hashing", "openai"), default="hashing")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="simulated latency of the hashing embedder")
+    parser.add_argument("--golden", default=GOLDEN_SET)
+    parser.add_argument("--min-recall", type=float, default=0.8)
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    if args.embedder == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings()
+    else:
+        embeddings = HashingEmbeddings(latency=args.embedding_latency)
+    golden = load_golden_set(args.golden)
+    results = run(args.chunking, args.retrievers, args.k, embeddings, golden)
+
+    print(f"{len(golden)} golden questions, {args.embedder} embeddings")
+    print(f"{'chunking':<9} {'retriever':<9} {'k':>2} {'docs':>5} {'recall@k':>9} {'MRR':>6} "
+          f"{'build s':>8} {'index KiB':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for r in results:
+        print(f"{r['chunking']:<9} {r['retriever']:<9} {r['k']:>2} {r['documents']:>5} {r['recall']:>9.3f} {r['mrr']:>6.3f} "
+              f"{r['build_seconds']:>8.3f} {r['index_kib']:>10.1f} {r['query_ms_p50']:>8.3f} {r['query_ms_p95']:>8.3f}")
+    best = pick(results, args.min_recall)
+    if best:
+        print(f"fastest with recall@k >= {args.min_recall}: chunking={best['chunking']} retriever={best['retriever']} k={best['k']}")
+    else:
+        print(f"no configuration reaches recall@k >= {args.min_recall}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"embedder": args.embedder, "questions": len(golden), "results": results, "best": best}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Local stand-ins for the OpenAI chat model and embeddings, so load tests run offline and for
+free. Both simulate network latency (``latency`` seconds, +/- ``jitter``) and are deterministic
+given a seed: the same text always gets the same vector and the same answer.
+"""
+import asyncio
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+import unicodedata
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class Latency:
+    """Samples delays uniformly from ``[latency - jitter, latency + jitter]``, never below zero."""
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        if self.latency <= 0 and self.jitter <= 0:
+            return 0.0
+        with self._lock:
+            offset = self._rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency + offset)
+
+    def sleep(self):
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+
+    async def asleep(self):
+        delay = self.sample()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def _tokens(text):
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r"\w+", text)
+
+
+class HashingEmbeddings:
+    """
+    Deterministic bag-of-words embedder: every word is hashed into one of ``dim`` buckets and
+    the vector is L2-normalized, so texts sharing words are close. Good enough for retrieval to
+    behave realistically (the right FAQ entries come back) without an embeddings API.
+    """
+
+    def __init__(self, dim=256, latency=0.0, jitter=0.0, seed=0):
+        self.dim = dim
+        self.delay = Latency(latency, jitter, seed)
+        self.calls = 0
+
+    def _embed(self, text):
+        vector = [0.0] * self.dim
+        for token in _tokens(text):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        # One round-trip per call, whatever the batch size, like the embeddings API.
+        self.calls += 1
+        self.delay.sleep()
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        await self.delay.asleep()
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChatModel:
+    """
+    Chat model answering after ``latency`` (+/- ``jitter``) seconds with ``answer_words`` words
+    derived from the prompt. ``stream`` yields one word per chunk, ``token_latency`` apart.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.0, answer_words=40, token_latency=0.0, seed=0):
+        self.delay = Latency(latency, jitter, seed)
+        self.answer_words = answer_words
+        self.token_latency = token_latency
+        self.calls = 0
+
+    def _words(self, prompt):
+        question = str(prompt).rsplit("Pregunta del usuario: ", 1)[-1]
+        seed = int.from_bytes(hashlib.blake2b(question.encode("utf-8"), digest_size=4).digest(), "little")
+        vocabulary = _tokens(prompt) or ["buceo"]
+        rng = random.Random(seed)
+        return [rng.choice(vocabulary) for _ in range(self.answer_words)]
+
+    def invoke(self, prompt, config=None, **kwargs):
+        self.calls += 1
+        self.delay.sleep()
+        return AIMessage(content=" ".join(self._words(prompt)))
+
+    async def ainvoke(self, prompt, config=None, **kwargs):
+        self.calls += 1
+        await self.delay.asleep()
+        return AIMessage(content=" ".join(self._words(prompt)))
+
+    def stream(self, prompt, config=None, **kwargs):
+        self.calls += 1
+        self.delay.sleep()
+        for position, word in enumerate(self._words(prompt)):
+            if position and self.token_latency:
+                time.sleep(self.token_latency)
+            yield AIMessageChunk(content=word if position == 0 else f" {word}")
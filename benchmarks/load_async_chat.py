@@ -0,0 +1,88 @@
+"""
+Load test: sync generate_rag_answer on a bounded thread pool (like gunicorn sync workers)
+versus agenerate_rag_answer on a single event loop, against a local fake LLM and retriever
+with artificial latency.
+
+Usage (from the project root):
+    python -m benchmarks.load_async_chat --requests 400 --threads 8 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.chat import agenerate_rag_answer, generate_rag_answer
+
+
+class FakeRetriever:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def invoke(self, query):
+        time.sleep(self.latency)
+        return "Contexto de prueba"
+
+    async def ainvoke(self, query):
+        await asyncio.sleep(self.latency)
+        return "Contexto de prueba"
+
+
+class FakeLLM:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def invoke(self, prompt):
+        time.sleep(self.latency)
+        return {"role": "assistant", "content": "Respuesta de prueba"}
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency)
+        return {"role": "assistant", "content": "Respuesta de prueba"}
+
+
+def state(i):
+    return {"messages": [{"role": "user", "content": f"Pregunta {i}"}]}
+
+
+def run_sync(n_requests, threads, retriever, llm):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: generate_rag_answer(state(i), retriever=retriever, llm=llm), range(n_requests)))
+    return time.perf_counter() - start
+
+
+async def run_async(n_requests, concurrency, retriever, llm):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            return await agenerate_rag_answer(state(i), retriever=retriever, llm=llm)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(n_requests)])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8, help="sync worker threads (workers x threads)")
+    parser.add_argument("--concurrency", type=int, default=400, help="max in-flight chats on the event loop")
+    parser.add_argument("--retrieval-latency", type=float, default=0.1)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    retriever, llm = FakeRetriever(args.retrieval_latency), FakeLLM(args.llm_latency)
+    sync_elapsed = run_sync(args.requests, args.threads, retriever, llm)
+    async_elapsed = asyncio.run(run_async(args.requests, args.concurrency, retriever, llm))
+
+    print(f"{'path':<8} {'requests':>8} {'seconds':>8} {'req/s':>8}")
+    print(f"{'sync':<8} {args.requests:>8} {sync_elapsed:>8.2f} {args.requests / sync_elapsed:>8.1f}")
+    print(f"{'async':<8} {args.requests:>8} {async_elapsed:>8.2f} {args.requests / async_elapsed:>8.1f}")
+    print(f"throughput gain: {sync_elapsed / async_elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Offline load-test suite: drives the real Flask app (auth, conversation memory, admission
+control, retrieval, prompt building) with the OpenAI chat model and embeddings replaced by the
+local fakes in benchmarks.fakes, and reports throughput and latency percentiles as JSON.
+
+Scenarios:
+    chat       POST /chat with a valid token (full pipeline, fake LLM and embedder; reports how
+               many answers came from the FAQ fast path, the cache, coalescing and the LLM)
+    login      POST /users/login (password verification on the hashing pool)
+    retrieval  hybrid retrieval only, in-process (BM25 + fake embedding + vector search)
+
+Usage (from the project root):
+    python -m benchmarks.load_suite --scenarios chat login retrieval --requests 500 --concurrency 16 \\
+        --llm-latency 0.3 --llm-jitter 0.1 --embedding-latency 0.05 --output bench-results.json
+    python -m benchmarks.load_suite --compare bench-results.json   # fails on regressions
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.fakes import FakeChatModel, HashingEmbeddings
+
+SCENARIOS = ("chat", "login", "retrieval")
+PASSWORD = "benchmark-password"
+
+
+def latency_summary(latencies):
+    """Percentiles and mean of per-request latencies (seconds), in milliseconds."""
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    values = np.asarray(latencies) * 1e3
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "mean": round(float(values.mean()), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def drive(request, n_requests, concurrency, warmup=0):
+    """
+    Call ``request(i)`` ``n_requests`` times from ``concurrency`` threads. ``request`` returns
+    True on success; False or an exception counts as an error. Returns the scenario report.
+    """
+    for i in range(warmup):
+        request(-1 - i)
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            ok = bool(request(i))
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    latencies = [latency for latency, ok in results if ok]
+    return {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "errors": n_requests - len(latencies),
+        "duration_seconds": round(elapsed, 4),
+        "rps": round(n_requests / elapsed, 2) if elapsed else None,
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def faq_queries(n, distinct):
+    """``n`` questions cycling over ``distinct`` variants of the knowledge base's own FAQ questions."""
+    from app.services.knowledge_base import load_faq_documents
+    questions = [doc.metadata["question"] for doc in load_faq_documents() if "question" in doc.metadata]
+    distinct = max(1, distinct)
+    variants = []
+    for i in range(distinct):
+        question = questions[i % len(questions)]
+        round_ = i // len(questions)
+        variants.append(question if round_ == 0 else f"{question} (consulta {round_})")
+    return [variants[i % distinct] for i in range(n)]
+
+
+def build_app(db_path, llm, embeddings, response_cache=False, faq_answers=False):
+    """
+    The real Flask app on a throwaway SQLite file, with the RAG pipeline built from the fakes
+    instead of OpenAI and the per-user rate limit disabled (every request comes from a handful
+    of benchmark users). The FAQ fast path is off unless ``faq_answers`` is set: the chat
+    scenario asks the knowledge base's own questions, which it would otherwise answer verbatim
+    without retrieval or the LLM.
+    """
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["CHAT_SERVICE_STARTUP"] = "lazy"
+    os.environ["KNOWLEDGE_BASE_WATCH_INTERVAL"] = "0"
+    os.environ.setdefault("CHAT_EVENTS_PATH", os.path.join(os.path.dirname(db_path), "chat_events.jsonl"))
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-with-at-least-32-bytes")
+
+    from app import create_app
+    from app.routes import chat as chat_routes
+    from app.services import chat as chat_service
+    from app.services.embedding_cache import QueryEmbeddingCache
+    from app.services.knowledge_base import load_faq_documents
+    from app.services.knowledge_index import build_snapshot
+    from app.services.rate_limit import UserRateLimiter
+    from app.services.response_cache import ResponseCache
+
+    app = create_app()
+    query_embeddings = QueryEmbeddingCache(embeddings)
+    chat_service.response_model = llm
+    chat_service.embeddings = query_embeddings
+    knowledge = build_snapshot(load_faq_documents(), query_embeddings)
+    chat_service.knowledge = knowledge if faq_answers else knowledge._replace(faq_matcher=None)
+    chat_service.response_cache = ResponseCache(embed_query=query_embeddings.embed_query) if response_cache else None
+    chat_service.is_initialized = True
+    chat_routes.user_rate_limiter = UserRateLimiter(per_minute=0)
+    return app
+
+
+def register_users(client, n_users):
+    usernames = [f"bench-diver-{i}" for i in range(n_users)]
+    for username in usernames:
+        response = client.post("/users/register", json={"username": username, "password": PASSWORD})
+        if response.status_code not in (201, 409):
+            raise RuntimeError(f"could not register {username}: {response.status_code} {response.get_json()}")
+    return usernames
+
+
+def login(client, username):
+    response = client.post("/users/login", json={"username": username, "password": PASSWORD})
+    return response.status_code == 200 and response.get_json()["token"]
+
+
+def answer_sources():
+    """Current ``chat_answers_total`` count per source (faq, cache, coalesced, llm)."""
+    from prometheus_client import REGISTRY
+    return {
+        source: REGISTRY.get_sample_value("chat_answers_total", {"source": source}) or 0.0
+        for source in ("faq", "cache", "coalesced", "llm")
+    }
+
+
+def run_chat(app, args, usernames):
+    from app.services.chat import ERROR_MESSAGE
+    client = app.test_client()
+    headers = [{"Authorization": f"Bearer {login(client, username)}"} for username in usernames]
+    queries = faq_queries(args.requests, args.distinct_queries or args.requests)
+
+    def request(i):
+        response = app.test_client().post("/chat", json={"message": queries[i]}, headers=headers[i % len(headers)])
+        return response.status_code == 200 and response.get_json()["response"] != ERROR_MESSAGE
+
+    for i in range(args.warmup):
+        request(-1 - i)
+    before = answer_sources()
+    report = drive(request, args.requests, args.concurrency)
+    after = answer_sources()
+    report["answer_sources"] = {source: int(after[source] - before[source]) for source in after}
+    return report
+
+
+def run_login(app, args, usernames):
+    def request(i):
+        return login(app.test_client(), usernames[i % len(usernames)])
+
+    return drive(request, args.requests, args.concurrency, args.warmup)
+
+
+def run_retrieval(app, args, usernames):
+    from app.services import chat as chat_service
+    retriever = chat_service.knowledge.retriever
+    queries = faq_queries(args.requests, args.distinct_queries or args.requests)
+
+    def request(i):
+        return len(retriever.invoke(queries[i])) > 0
+
+    return drive(request, args.requests, args.concurrency, args.warmup)
+
+
+RUNNERS = {"chat": run_chat, "login": run_login, "retrieval": run_retrieval}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, tolerance):
+    """Lines describing each scenario's change; regressions beyond ``tolerance`` are flagged."""
+    lines, regressed = [], False
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or not before.get("rps") or not before["latency_ms"]["p95"] or not result["latency_ms"]["p95"]:
+            continue
+        rps_change = result["rps"] / before["rps"] - 1
+        p95_change = result["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1
+        flag = rps_change < -tolerance or p95_change > tolerance
+        regressed |= flag
+        sources = result.get("answer_sources")
+        if sources and before.get("answer_sources") and sources != before["answer_sources"]:
+            lines.append(f"{name:<10} answer sources changed: {before['answer_sources']} -> {sources}")
+        lines.append(
+            f"{name:<10} rps {before['rps']:>9.1f} -> {result['rps']:>9.1f} ({rps_change:+.1%})  "
+            f"p95 {before['latency_ms']['p95']:>9.2f} -> {result['latency_ms']['p95']:>9.2f} ms ({p95_change:+.1%})"
+            + ("  REGRESSION" if flag else "")
+        )
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests before each scenario")
+    parser.add_argument("--users", type=int, default=8, help="benchmark users registered up front")
+    parser.add_argument("--distinct-queries", type=int, default=0, help="distinct questions (0: every request unique)")
+    parser.add_argument("--response-cache", action="store_true", help="enable the response cache for /chat")
+    parser.add_argument("--faq-answers", action="store_true",
+                        help="keep the FAQ fast path on (off by default so /chat exercises retrieval and the LLM)")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--fast-llm-latency", type=float, default=0.0,
+                        help="route questions through a fast-tier fake model with this latency (0: full model only)")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--embedding-jitter", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a previous JSON report; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative rps drop / p95 increase")
+    args = parser.parse_args()
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    llm = FakeChatModel(args.llm_latency, args.llm_jitter, seed=args.seed)
+    if args.fast_llm_latency > 0:
+        from app.services.model_router import ModelRouter
+        llm = ModelRouter(llm, fast=FakeChatModel(args.fast_llm_latency, args.llm_jitter / 2, seed=args.seed))
+    embeddings = HashingEmbeddings(latency=args.embedding_latency, jitter=args.embedding_jitter, seed=args.seed)
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "scenarios")},
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, "bench.db"), llm, embeddings, args.response_cache, args.faq_answers)
+        usernames = register_users(app.test_client(), args.users)
+        for name in args.scenarios:
+            print(f"running {name}...", file=sys.stderr)
+            report["scenarios"][name] = RUNNERS[name](app, args, usernames)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressed = compare(baseline, report, args.tolerance)
+        print("\n".join(lines), file=sys.stderr)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
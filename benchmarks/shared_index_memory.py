@@ -0,0 +1,158 @@
+"""
+Per-worker memory of the knowledge base snapshot (documents, vector index, BM25 index and FAQ
+matcher) when every worker keeps its vector index in process (NumpyVectorStore, as each
+gunicorn worker did before) versus on the memory-mapped shared files (share_snapshot, as the
+service does with VECTOR_INDEX_DIR). Only the vectors are shared; the other parts are built in
+every worker either way, and the figures include them.
+
+A synthetic knowledge base of --documents chunks with --dim dimensional vectors is published
+once. Then, for every worker count, that many spawned processes load the snapshot the way the
+service does (mapping the published index rather than embedding again), run hybrid retrievals
+and FAQ matches, and report their memory while all of them are alive:
+
+  rss      resident pages; pages shared through the page cache count in every worker
+  pss      proportional set size: shared pages divided among the processes mapping them
+  private  pages only this worker holds
+
+all measured as the increase over the worker's own baseline after imports, in MiB. The sum of
+PSS across workers is what the snapshot costs the node. Linux only (reads /proc/self/smaps_rollup).
+
+Usage (from the project root):
+    python -m benchmarks.shared_index_memory --workers 1 4 16 --documents 5000 --dim 1536
+    python -m benchmarks.shared_index_memory --output shared-index-memory.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.services.knowledge_index import build_snapshot, open_shared_snapshot, share_snapshot
+
+MODES = ("memory", "mmap")
+DESTINATIONS = ("Gorgona", "Providencia", "San Andrés", "Malpelo")
+
+
+def memory_kib():
+    """``{"rss", "pss", "private"}`` of the current process in KiB."""
+    fields = {}
+    with open("/proc/self/smaps_rollup", "r", encoding="utf-8") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "private": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+class RandomEmbeddings:
+    """Random ``dim``-float vectors; document vectors depend only on ``seed``, so every worker gets the same ones."""
+
+    def __init__(self, dim, seed):
+        self.dim = dim
+        self.seed = seed
+
+    def embed_documents(self, texts):
+        return np.random.default_rng(self.seed).standard_normal((len(texts), self.dim), dtype=np.float32)
+
+    def embed_query(self, text):
+        return np.random.default_rng().standard_normal(self.dim, dtype=np.float32)
+
+
+def make_documents(documents, seed):
+    """The same synthetic FAQ chunks in every process: ``documents`` entries over four destinations."""
+    rng = np.random.default_rng(seed)
+    words = ["buceo", "arrecife", "tiburón", "inmersión", "certificación", "hotel", "vuelo", "equipo"]
+    docs = []
+    for i in range(documents):
+        destination = DESTINATIONS[i % len(DESTINATIONS)]
+        question = f"¿{' '.join(rng.choice(words, size=4))} en {destination} {i}?"
+        answer = " ".join(rng.choice(words, size=80))
+        docs.append(Document(
+            id=f"doc-{i}",
+            page_content=f"Pregunta: {question}\nRespuesta: {answer}",
+            metadata={"destination": destination, "question": question, "answer": answer},
+        ))
+    return docs
+
+
+def load_snapshot(mode, root, documents, dim, seed):
+    """The snapshot a worker loads at startup: in memory, or on the shared index like the service."""
+    docs, embeddings = make_documents(documents, seed), RandomEmbeddings(dim, seed)
+    if mode == "mmap":
+        return open_shared_snapshot(docs, embeddings, root) or share_snapshot(build_snapshot(docs, embeddings), root)
+    return build_snapshot(docs, embeddings)
+
+
+def worker(mode, root, documents, dim, queries, seed, barrier, results):
+    baseline = memory_kib()
+    snapshot = load_snapshot(mode, root, documents, dim, seed)
+    questions = [doc.metadata["question"] for doc in snapshot.documents[:queries]]
+    for question in questions:
+        snapshot.retriever.invoke(question)
+        snapshot.faq_matcher.match(question)
+    barrier.wait()  # every worker holds its snapshot before anyone measures
+    usage = memory_kib()
+    results.put({key: (usage[key] - baseline[key]) / 1024 for key in usage})
+    barrier.wait()
+
+
+def measure(mode, root, workers, documents, dim, queries, seed):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(mode, root, documents, dim, queries, seed, barrier, results))
+        for n in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {
+        "mode": mode,
+        "workers": workers,
+        **{f"{key}_mib_per_worker": round(float(np.mean([s[key] for s in samples])), 1) for key in ("rss", "pss", "private")},
+        "pss_mib_total": round(sum(s["pss"] for s in samples), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536, help="embedding size (text-embedding-3-small: 1536)")
+    parser.add_argument("--queries", type=int, default=20, help="retrievals and FAQ matches per worker before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "vector_index")
+        path = load_snapshot("mmap", root, args.documents, args.dim, args.seed).vectorstore.path
+        index_mib = sum(entry.stat().st_size for entry in os.scandir(path)) / 2 ** 20
+        print(f"index: {args.documents} documents x {args.dim} dims, {index_mib:.1f} MiB on disk")
+        print(f"{'mode':<7} {'workers':>7} {'RSS/worker':>11} {'PSS/worker':>11} {'private/worker':>15} {'PSS total':>10}  (MiB)")
+        results = []
+        for mode in args.modes:
+            for workers in args.workers:
+                r = measure(mode, root, workers, args.documents, args.dim, args.queries, args.seed)
+                results.append(r)
+                print(f"{mode:<7} {workers:>7} {r['rss_mib_per_worker']:>11.1f} {r['pss_mib_per_worker']:>11.1f} "
+                      f"{r['private_mib_per_worker']:>15.1f} {r['pss_mib_total']:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"documents": args.documents, "dim": args.dim, "index_mib": round(index_mib, 1), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
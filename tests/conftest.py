@@ -0,0 +1,107 @@
+import pytest
+from flask import Flask
+from unittest.mock import patch
+from app.routes.chat import user_rate_limiter
+from app.services import chat as chat_service
+from app.services import chat_events, conversation
+from app.services.chat import llm_guard
+from app.services.conversation import ConversationMemory, InMemoryConversationStore
+from app.services.timing import span
+
+
+class FakeEmbeddings:
+    """
+    Deterministic stand-in for the OpenAI embedder: one dimension per keyword in ``KEYWORDS``, so
+    similarity reflects shared keywords, plus a constant and a tiny per-text component so every
+    text gets its own vector (all exact in float32, so cached vectors compare equal). Records
+    ``calls`` (the texts of each model call) and the ``embedded`` document and ``queries`` query
+    texts.
+    """
+    KEYWORDS = ["precio", "fechas", "destino", "incluye", "equipo", "buceo", "gorgona", "providencia", "natación"]
+    model = "fake-embedding"
+
+    def __init__(self):
+        self.calls = []
+        self.embedded = []
+        self.queries = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        self.embedded.extend(texts)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        self.queries.append(text)
+        return self.vector(text)
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+    def vector(self, text):
+        lowered = text.lower()
+        return [1.0 if keyword in lowered else 0.0 for keyword in self.KEYWORDS] + [0.125, sum(map(ord, text)) % 97 / 8192]
+
+
+@pytest.fixture
+def make_embeddings():
+    """Factory for fresh ``FakeEmbeddings``; call it once per embedder the test needs."""
+    return FakeEmbeddings
+
+
+@pytest.fixture(autouse=True)
+def reset_admission_control():
+    """Rate-limit buckets and the circuit breaker are process-wide; start every test from a clean state."""
+    user_rate_limiter.clear()
+    llm_guard.breaker.reset()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def reset_initialization_state(monkeypatch):
+    """A failed or background initialization in one test must not leak into the next."""
+    monkeypatch.setattr(chat_service, "init_error", None)
+    monkeypatch.setattr(chat_service, "_init_failed_at", None)
+    monkeypatch.setattr(chat_service, "_init_thread", None)
+
+
+@pytest.fixture(autouse=True)
+def vector_index_dir(tmp_path, monkeypatch):
+    """Memory-mapped vector indexes go to the test's temporary directory instead of instance/."""
+    monkeypatch.setattr(chat_service, "VECTOR_INDEX_DIR", str(tmp_path / "vector_index"))
+
+
+@pytest.fixture(autouse=True)
+def chat_event_log(tmp_path, monkeypatch):
+    """Chat events go to a JSONL file in the test's temporary directory; the writer stops afterwards."""
+    event_log = chat_events.ChatEventLog(chat_events.JsonlEventSink(str(tmp_path / "chat_events.jsonl"), 0, 0), flush_interval=0.01)
+    monkeypatch.setattr(chat_events, "_event_log", event_log)
+    monkeypatch.setattr(chat_events, "_event_log_created", True)
+    yield event_log
+    event_log.close()
+
+
+def fake_token_required(f):
+    """Stand-in for auth.token_required: every request is authenticated as ``dummy_user``."""
+    def wrapper(*args, **kwargs):
+        with span("auth"):
+            user = "dummy_user"
+        return f(user, *args, **kwargs)
+    return wrapper
+
+
+@pytest.fixture
+def app_authed(monkeypatch):
+    """Flask app with the chat blueprint, authentication faked and an empty conversation memory."""
+    monkeypatch.setattr(conversation, "_memory", ConversationMemory(InMemoryConversationStore()))
+    with patch("app.routes.auth.token_required", fake_token_required):
+        from app.routes.chat import create_chat_bp
+        app = Flask(__name__)
+        app.register_blueprint(create_chat_bp())
+        app.testing = True
+        yield app
+
+
+@pytest.fixture
+def client_authed(app_authed):
+    return app_authed.test_client()
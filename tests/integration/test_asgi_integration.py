@@ -0,0 +1,55 @@
+import asyncio
+import httpx
+import pytest
+from flask import Flask
+from unittest.mock import patch
+from app.asgi import create_asgi_app
+from app.extensions import db
+from app.routes.auth import auth_bp
+from app.routes.chat import create_chat_bp
+
+@pytest.fixture
+def flask_app():
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'integration_secret_with_enough_length'
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    db.init_app(app)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(create_chat_bp())
+    with app.app_context():
+        db.create_all()
+    yield app
+
+def run_requests(flask_app, steps):
+    async def runner():
+        transport = httpx.ASGITransport(app=create_asgi_app(flask_app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await steps(client)
+    return asyncio.run(runner())
+
+def test_asgi_chat_flow(flask_app):
+    async def steps(client):
+        # Auth routes are served by Flask through the WSGI adapter
+        resp = await client.post('/users/register', json={'username': 'asgi', 'password': 'pw'})
+        assert resp.status_code == 201
+        resp = await client.post('/users/login', json={'username': 'asgi', 'password': 'pw'})
+        token = resp.json()['token']
+
+        async def fake_answer(state):
+            return {"messages": [{"role": "assistant", "content": "Echo async"}]}
+
+        with patch('app.asgi.agenerate_rag_answer', fake_answer):
+            return await client.post('/chat', json={'message': 'Hola'}, headers={'Authorization': f'Bearer {token}'})
+
+    resp = run_requests(flask_app, steps)
+    assert resp.status_code == 200
+    assert resp.json() == {"response": "Echo async"}
+
+def test_asgi_chat_requires_auth(flask_app):
+    async def steps(client):
+        return await client.post('/chat', json={'message': 'Hola'})
+
+    resp = run_requests(flask_app, steps)
+    assert resp.status_code == 401
+    assert 'error' in resp.json()
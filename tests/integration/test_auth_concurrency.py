@@ -0,0 +1,46 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+from sqlalchemy import text
+from app.extensions import database_engine_options, db
+from app.routes.auth import auth_bp
+
+USERNAMES = [f"diver{i}" for i in range(8)]
+ATTEMPTS_PER_USERNAME = 2
+
+@pytest.fixture
+def app(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'load.db'}"
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'integration_secret'
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database_engine_options(uri, busy_timeout=10)
+    app.config['TESTING'] = True
+    db.init_app(app)
+    app.register_blueprint(auth_bp)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def test_sqlite_file_uses_wal(app):
+    with app.app_context():
+        assert db.session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+
+def test_concurrent_registrations_and_logins(app):
+    def register(username):
+        return username, app.test_client().post('/users/register', json={'username': username, 'password': 'pw'}).status_code
+
+    def login(username):
+        return app.test_client().post('/users/login', json={'username': username, 'password': 'pw'}).status_code
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(register, USERNAMES * ATTEMPTS_PER_USERNAME))
+        logins = list(pool.map(login, USERNAMES))
+
+    assert {status for _, status in results} <= {201, 409}
+    created = sorted(username for username, status in results if status == 201)
+    assert created == sorted(USERNAMES)
+    assert logins == [200] * len(logins)
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from app.services import chat as chat_service
+
+class DummyRetriever:
+    def invoke(self, query):
+        return "Dummy context"
+
+class SlowAsyncRetriever:
+    async def ainvoke(self, query):
+        await asyncio.sleep(0.05)
+        return "Async context"
+
+class SlowAsyncLLM:
+    """Fake chat model with artificial latency on its async path only."""
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(0.1)
+        return {"role": "assistant", "content": f"Echo: {prompt}"}
+
+class DummyLLM:
+    def invoke(self, prompt):
+        return {"role": "assistant", "content": f"Echo: {prompt}"}
+
+def test_agenerate_rag_answer_uses_async_dependencies():
+    state = {"messages": [{"role": "user", "content": "¿Cuál es el horario?"}]}
+    result = asyncio.run(chat_service.agenerate_rag_answer(state, retriever=SlowAsyncRetriever(), llm=SlowAsyncLLM()))
+    assert "Async context" in result["messages"][0]["content"]
+
+def test_agenerate_rag_answer_falls_back_to_sync_invoke():
+    state = {"messages": [{"role": "user", "content": "Hola"}]}
+    result = asyncio.run(chat_service.agenerate_rag_answer(state, retriever=DummyRetriever(), llm=DummyLLM()))
+    assert result["messages"][0]["content"].startswith("Echo: ")
+
+def test_concurrent_requests_overlap_on_one_event_loop():
+    async def run_many():
+        state = {"messages": [{"role": "user", "content": "Hola"}]}
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(*[
+            chat_service.agenerate_rag_answer(state, retriever=SlowAsyncRetriever(), llm=SlowAsyncLLM())
+            for _ in range(50)
+        ])
+        return asyncio.get_running_loop().time() - started
+    # 50 sequential requests would take 7.5s; multiplexed they take roughly one round-trip.
+    assert asyncio.run(run_many()) < 1.5
+
+def test_agenerate_rag_answer_reports_errors():
+    class FailingLLM:
+        async def ainvoke(self, prompt):
+            raise RuntimeError("boom")
+    state = {"messages": [{"role": "user", "content": "Hola"}]}
+    result = asyncio.run(chat_service.agenerate_rag_answer(state, retriever=DummyRetriever(), llm=FailingLLM()))
+    assert result["messages"][0]["content"] == chat_service.ERROR_MESSAGE
@@ -47,14 +47,17 @@ def test_register_missing_fields(client):
 
 def test_register_user_exists(client):
     """
-    Test registration with existing user. Should return 409 error. Mocks user query.
+    Test registration with existing user. Should return 409 error. Mocks the commit hitting
+    the unique constraint on username.
     """
+    from sqlalchemy.exc import IntegrityError
     with client.application.app_context():
-        with patch('app.models.user.User.query') as mock_query:
-            mock_query.filter_by.return_value.first.return_value = User(username='test', password='pw')
+        with patch('app.extensions.db.session') as mock_session:
+            mock_session.commit.side_effect = IntegrityError('INSERT', {}, Exception('UNIQUE constraint failed'))
             response = client.post('/users/register', json={'username': 'test', 'password': 'pw'})
             assert response.status_code == 409
             assert 'error' in response.get_json()
+            assert mock_session.rollback.called
 
 def test_login_success(client):
     """
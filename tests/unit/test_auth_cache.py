@@ -0,0 +1,84 @@
+import jwt
+import pytest
+from datetime import datetime, timedelta, timezone
+from flask import Flask
+from unittest.mock import patch
+from app.extensions import db
+from app.models.user import User
+from app.routes.auth import AuthError, authenticate
+from app.services.auth_cache import AuthCache, AuthenticatedUser
+
+SECRET = 'test_secret'
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='buzo', password='x'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def make_token(user_id=1, secret=SECRET, **claims):
+    claims = {'user_id': user_id, 'exp': datetime.now(timezone.utc) + timedelta(hours=2), **claims}
+    return jwt.encode(claims, secret, algorithm='HS256')
+
+def test_repeated_requests_skip_decode_and_database(app):
+    cache = AuthCache()
+    header = f"Bearer {make_token(username='buzo')}"
+    with patch('app.routes.auth.db.session.get', wraps=db.session.get) as get, \
+         patch('app.routes.auth.jwt.decode', wraps=jwt.decode) as decode:
+        users = [authenticate(header, SECRET, cache=cache) for _ in range(5)]
+    assert users == [AuthenticatedUser(1, 'buzo')] * 5
+    assert str(users[0]) == 'buzo'
+    assert get.call_count == 1
+    assert decode.call_count == 1
+
+def test_new_token_reuses_cached_user(app):
+    cache = AuthCache()
+    authenticate(f"Bearer {make_token()}", SECRET, cache=cache)
+    with patch('app.routes.auth.db.session.get') as get:
+        user = authenticate(f"Bearer {make_token(username='buzo', iat=1)}", SECRET, cache=cache)
+    assert user == AuthenticatedUser(1, 'buzo')
+    assert not get.called
+
+def test_invalidate_user_forces_database_check(app):
+    cache = AuthCache()
+    header = f"Bearer {make_token()}"
+    authenticate(header, SECRET, cache=cache)
+    db.session.delete(db.session.get(User, 1))
+    db.session.commit()
+    assert authenticate(header, SECRET, cache=cache).username == 'buzo'
+    cache.invalidate_user(1)
+    with pytest.raises(AuthError):
+        authenticate(header, SECRET, cache=cache)
+
+def test_cached_token_is_not_accepted_under_another_secret(app):
+    cache = AuthCache()
+    header = f"Bearer {make_token()}"
+    authenticate(header, SECRET, cache=cache)
+    with pytest.raises(AuthError):
+        authenticate(header, 'other_secret', cache=cache)
+
+def test_entries_expire_with_ttl_and_token_exp():
+    now = [1000.0]
+    cache = AuthCache(ttl_seconds=60, clock=lambda: now[0])
+    user = AuthenticatedUser(1, 'buzo')
+    cache.put_token('long', SECRET, user, token_expires_at=10_000)
+    cache.put_token('short', SECRET, user, token_expires_at=1010)
+    now[0] = 1020
+    assert cache.get_token('long', SECRET) == user
+    assert cache.get_token('short', SECRET) is None
+    now[0] = 1061
+    assert cache.get_token('long', SECRET) is None
+
+def test_cache_is_bounded():
+    cache = AuthCache(max_entries=2)
+    for user_id in (1, 2, 3):
+        cache.put_user(AuthenticatedUser(user_id, f'u{user_id}'))
+    assert cache.get_user(1) is None
+    assert cache.get_user(3).username == 'u3'
@@ -0,0 +1,105 @@
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from langchain_core.runnables import RunnableLambda
+from app.services import chat as chat_service
+from app.services.embedding_cache import QueryEmbeddingCache
+from app.services.knowledge_base import load_faq_documents
+from app.services.knowledge_index import build_snapshot
+
+class EchoLLM:
+    """Answers with the question found in the prompt; fails on prompts containing ``fail_on``."""
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+
+    def invoke(self, prompt):
+        if self.fail_on and self.fail_on in prompt:
+            raise RuntimeError("rate limited")
+        return {"role": "assistant", "content": prompt.rsplit("Pregunta del usuario: ", 1)[1]}
+
+QUESTIONS = [
+    "¿Qué fechas hay para bucear en Gorgona en temporada de ballenas?",
+    "cuéntame sobre el viaje a Providencia y lo que incluye",
+    "¿Hay clases de natación para niños pequeños?",
+]
+
+def test_batch_embeds_queries_in_one_call_and_keeps_order(make_embeddings):
+    embeddings = make_embeddings()
+    snapshot = build_snapshot(load_faq_documents(), embeddings)
+    embeddings.calls.clear()
+    results = chat_service.generate_rag_answers(QUESTIONS, retriever=snapshot.retriever, llm=EchoLLM())
+    assert [r["response"] for r in results] == QUESTIONS
+    assert embeddings.calls == [QUESTIONS]
+
+def test_batch_embeds_once_with_a_warm_response_cache(monkeypatch, make_embeddings):
+    from app.services.response_cache import ResponseCache
+    base = make_embeddings()
+    query_embeddings = QueryEmbeddingCache(base)
+    snapshot = build_snapshot(load_faq_documents(), query_embeddings)
+    cache = ResponseCache(embed_query=query_embeddings.embed_query)
+    cache.put("¿Cuál es el precio del viaje a Malpelo?", "Consultar", snapshot.version)
+    monkeypatch.setattr(chat_service, "is_initialized", True)
+    monkeypatch.setattr(chat_service, "response_model", EchoLLM())
+    monkeypatch.setattr(chat_service, "knowledge", snapshot)
+    monkeypatch.setattr(chat_service, "response_cache", cache)
+    base.calls.clear()
+    results = chat_service.generate_rag_answers(QUESTIONS)
+    assert [r["response"] for r in results] == QUESTIONS
+    assert base.calls == [QUESTIONS]
+    assert [r["cache"] for r in chat_service.generate_rag_answers(QUESTIONS)] == ["exact"] * 3
+    assert len(base.calls) == 1
+
+def test_batch_reports_per_item_errors(make_embeddings):
+    snapshot = build_snapshot(load_faq_documents(), make_embeddings())
+    results = chat_service.generate_rag_answers(QUESTIONS, retriever=snapshot.retriever, llm=EchoLLM(fail_on="Providencia y lo"))
+    assert results[0] == {"response": QUESTIONS[0]}
+    assert results[1] == {"error": chat_service.ERROR_MESSAGE}
+    assert results[2] == {"response": QUESTIONS[2]}
+
+def test_batch_bounds_llm_concurrency():
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def slow(prompt):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return {"role": "assistant", "content": "ok"}
+
+    class Retriever:
+        def invoke(self, value):
+            return "contexto"
+
+    results = chat_service.generate_rag_answers([f"pregunta {i}" for i in range(8)], retriever=Retriever(), llm=RunnableLambda(slow), max_concurrency=2)
+    assert [r["response"] for r in results] == ["ok"] * 8
+    assert peak[0] <= 2
+
+def test_query_cache_embeds_batch_misses_once(make_embeddings):
+    base = make_embeddings()
+    cache = QueryEmbeddingCache(base)
+    cache.embed_query("precio Gorgona")
+    base.calls.clear()
+    vectors = cache.embed_queries(["Precio gorgona", "fechas", "¿fechas?"])
+    assert base.calls == [["fechas"]]
+    assert vectors[0] == base.vector("precio Gorgona")
+    assert vectors[1] == vectors[2]
+
+def test_batch_route(client_authed):
+    answers = [{"response": "uno", "cache": "miss"}, {"error": "fallo"}]
+    with patch("app.routes.chat.generate_rag_answers", return_value=answers) as generate:
+        response = client_authed.post('/chat/batch', json={'messages': ['a', 'b']})
+    generate.assert_called_once_with(['a', 'b'])
+    assert response.status_code == 200
+    assert response.get_json() == {"results": [{"response": "uno"}, {"error": "fallo"}]}
+
+@pytest.mark.parametrize("payload", [{}, {"messages": []}, {"messages": "hola"}, {"messages": ["ok", ""]}])
+def test_batch_route_rejects_invalid_payloads(client_authed, payload):
+    assert client_authed.post('/chat/batch', json=payload).status_code == 400
+
+def test_batch_route_unavailable(client_authed):
+    with patch("app.routes.chat.generate_rag_answers", side_effect=chat_service.ChatServiceUnavailable("down")):
+        response = client_authed.post('/chat/batch', json={'messages': ['a']})
+    assert response.status_code == 503
@@ -0,0 +1,121 @@
+import json
+import sqlite3
+import threading
+import time
+
+from unittest.mock import patch
+from app.services.chat_events import ChatEventLog, JsonlEventSink, SQLiteEventSink, chat_events_dropped_total
+
+class RecordingSink:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+
+    def write(self, events):
+        time.sleep(self.delay)
+        if self.fail:
+            raise OSError("disk full")
+        self.batches.append(list(events))
+
+class BlockedSink:
+    """Sink stuck on a slow disk until released."""
+    def __init__(self):
+        self.release = threading.Event()
+
+    def write(self, events):
+        self.release.wait()
+
+def dropped(reason):
+    return chat_events_dropped_total.labels(reason=reason)._value.get()
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_events_are_written_in_batches():
+    sink = RecordingSink()
+    event_log = ChatEventLog(sink, batch_size=4, flush_interval=0.05)
+    for i in range(10):
+        assert event_log.emit({"n": i})
+    assert event_log.flush()
+    assert [event["n"] for batch in sink.batches for event in batch] == list(range(10))
+    assert max(len(batch) for batch in sink.batches) <= 4
+    event_log.close()
+
+def test_full_queue_drops_instead_of_blocking():
+    sink = BlockedSink()
+    event_log = ChatEventLog(sink, queue_size=5, batch_size=1, flush_interval=0.01)
+    before = dropped("queue_full")
+    start = time.perf_counter()
+    results = [event_log.emit({"n": i}) for i in range(50)]
+    assert time.perf_counter() - start < 0.5
+    assert results.count(False) >= 40
+    assert dropped("queue_full") == before + results.count(False)
+    sink.release.set()
+    assert event_log.flush()
+    event_log.close()
+
+def test_sink_failures_are_counted_and_survived():
+    sink = RecordingSink(fail=True)
+    event_log = ChatEventLog(sink, batch_size=10, flush_interval=0.01)
+    before = dropped("write_error")
+    event_log.emit({"n": 1})
+    assert event_log.flush()
+    assert dropped("write_error") == before + 1
+    sink.fail = False
+    event_log.emit({"n": 2})
+    assert event_log.flush()
+    assert sink.batches == [[{"n": 2}]]
+    event_log.close()
+
+def test_close_writes_pending_events(tmp_path):
+    path = tmp_path / "events.jsonl"
+    event_log = ChatEventLog(JsonlEventSink(str(path), 0, 0), flush_interval=10)
+    event_log.emit({"message": "¿Cuánto cuesta?"})
+    event_log.close()
+    assert read_jsonl(path) == [{"message": "¿Cuánto cuesta?"}]
+
+def test_jsonl_sink_rotates(tmp_path):
+    path = tmp_path / "events.jsonl"
+    sink = JsonlEventSink(str(path), max_bytes=100, backups=2)
+    for i in range(5):
+        sink.write([{"n": i, "text": "x" * 80}])
+    assert sorted(p.name for p in tmp_path.glob("events.jsonl*") if not p.name.endswith(".lock")) == \
+        ["events.jsonl", "events.jsonl.1", "events.jsonl.2"]
+    assert [event["n"] for event in read_jsonl(path)] == [4]
+    assert [event["n"] for event in read_jsonl(f"{path}.2")] == [2]
+
+def test_sqlite_sink_stores_and_rotates(tmp_path):
+    path = tmp_path / "events.sqlite3"
+    sink = SQLiteEventSink(str(path), max_bytes=0, backups=1)
+    sink.write([{"ts": 1.0, "endpoint": "chat", "user": "7", "status": 200, "latency_ms": 12.5, "message": "hola"}])
+    rows = sqlite3.connect(path).execute("SELECT endpoint, user, status, data FROM chat_events").fetchall()
+    assert rows[0][:3] == ("chat", "7", 200)
+    assert json.loads(rows[0][3])["message"] == "hola"
+
+    sink.max_bytes = 1
+    sink.write([{"ts": 2.0, "endpoint": "chat"}])
+    assert (tmp_path / "events.sqlite3.1").exists()
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM chat_events").fetchone() == (1,)
+
+def test_chat_requests_are_recorded(client_authed, chat_event_log, tmp_path):
+    with patch("app.routes.chat.generate_rag_answer") as mock_rag:
+        mock_rag.return_value = {"messages": [{"role": "assistant", "content": "¡Hola, buzo!"}], "cache": "miss"}
+        assert client_authed.post("/chat", json={"message": "Hola"}).status_code == 200
+        mock_rag.side_effect = RuntimeError("boom")
+        assert client_authed.post("/chat", json={"message": "Otra"}).status_code == 500
+    assert chat_event_log.flush()
+    success, failure = read_jsonl(tmp_path / "chat_events.jsonl")
+    assert success["endpoint"] == "chat" and success["user"] == "dummy_user" and success["status"] == 200
+    assert (success["message"], success["response"], success["cache"]) == ("Hola", "¡Hola, buzo!", "miss")
+    assert success["latency_ms"] >= 0
+    assert (failure["status"], failure["message"], failure["error"]) == (500, "Otra", "boom")
+
+def test_failed_batches_record_one_event_per_question(client_authed, chat_event_log, tmp_path):
+    with patch("app.routes.chat.generate_rag_answers", side_effect=RuntimeError("boom")):
+        assert client_authed.post("/chat/batch", json={"messages": ["uno", "dos"]}).status_code == 500
+    assert chat_event_log.flush()
+    events = read_jsonl(tmp_path / "chat_events.jsonl")
+    assert [(e["endpoint"], e["message"], e["status"], e["error"]) for e in events] == \
+        [("chat_batch", "uno", 500, "boom"), ("chat_batch", "dos", 500, "boom")]
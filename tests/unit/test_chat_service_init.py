@@ -0,0 +1,62 @@
+import threading
+import time
+import pytest
+from app.services import chat as chat_service
+from app.services.knowledge_index import KnowledgeSnapshot
+
+SNAPSHOT = KnowledgeSnapshot([], None, "tool", "v1")
+
+@pytest.fixture
+def fresh_service(monkeypatch):
+    """Reset the chat service globals so each test starts uninitialized."""
+    monkeypatch.setattr(chat_service, "is_initialized", False)
+    monkeypatch.setattr(chat_service, "response_model", None)
+    monkeypatch.setattr(chat_service, "knowledge", None)
+    monkeypatch.setattr(chat_service, "embeddings", None)
+    monkeypatch.setattr(chat_service, "response_cache", None)
+    return chat_service
+
+def test_concurrent_initialization_builds_once(fresh_service, monkeypatch, make_embeddings):
+    calls = []
+
+    def slow_build():
+        calls.append(1)
+        time.sleep(0.05)
+        return "model", make_embeddings(), SNAPSHOT
+
+    monkeypatch.setattr(fresh_service, "_build_pipeline", slow_build)
+    threads = [threading.Thread(target=fresh_service.initialize_chat_service) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert fresh_service.is_initialized
+    assert fresh_service.knowledge.retriever_tool == "tool"
+
+def test_failed_initialization_can_be_retried(fresh_service, monkeypatch, make_embeddings):
+    def failing_build():
+        raise RuntimeError("no api key")
+
+    monkeypatch.setattr(fresh_service, "_build_pipeline", failing_build)
+    fresh_service.initialize_chat_service()
+    assert not fresh_service.is_initialized
+
+    monkeypatch.setattr(fresh_service, "_build_pipeline", lambda: ("model", make_embeddings(), SNAPSHOT))
+    fresh_service.initialize_chat_service()
+    assert fresh_service.is_initialized
+
+def test_eager_startup_initializes_in_create_app(fresh_service, monkeypatch, make_embeddings):
+    from flask import Flask
+    from app import start_chat_service
+    monkeypatch.setattr(fresh_service, "_build_pipeline", lambda: ("model", make_embeddings(), SNAPSHOT))
+    app = Flask(__name__)
+    app.config['CHAT_SERVICE_STARTUP'] = 'eager'
+    start_chat_service(app)
+    assert fresh_service.is_initialized
+
+def test_lazy_startup_defers_initialization(fresh_service):
+    from flask import Flask
+    from app import start_chat_service
+    start_chat_service(Flask(__name__))
+    assert not fresh_service.is_initialized
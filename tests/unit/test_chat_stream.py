@@ -0,0 +1,66 @@
+import json
+import pytest
+from flask import Flask
+from app.services import chat as chat_service
+from app.services.knowledge_index import KnowledgeSnapshot
+
+class DummyRetriever:
+    def invoke(self, query):
+        return "Dummy context"
+
+class FakeStreamingLLM:
+    """Fake chat model that streams its answer word by word."""
+    def __init__(self, answer="Hola buzo feliz", fail_after=None):
+        self.answer = answer
+        self.fail_after = fail_after
+
+    def stream(self, prompt):
+        for i, word in enumerate(self.answer.split(" ")):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise RuntimeError("upstream disconnected")
+            yield {"content": word if i == 0 else f" {word}"}
+
+@pytest.fixture
+def streaming_service(monkeypatch):
+    monkeypatch.setattr(chat_service, "is_initialized", True)
+    monkeypatch.setattr(chat_service, "knowledge", KnowledgeSnapshot([], None, DummyRetriever(), "v1"))
+    monkeypatch.setattr(chat_service, "response_cache", None)
+    def use_llm(llm):
+        monkeypatch.setattr(chat_service, "response_model", llm)
+    return use_llm
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines.get("event", "message"), json.loads(lines["data"])))
+    return events
+
+def test_stream_rag_answer_yields_chunks():
+    state = {"messages": [{"role": "user", "content": "Hola"}]}
+    chunks = list(chat_service.stream_rag_answer(state, retriever=DummyRetriever(), llm=FakeStreamingLLM()))
+    assert chunks == ["Hola", " buzo", " feliz"]
+
+def test_chat_stream_sends_tokens_then_done(client_authed, streaming_service):
+    streaming_service(FakeStreamingLLM())
+    response = client_authed.post('/chat/stream', json={'message': 'Hola'})
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = parse_events(response.get_data(as_text=True))
+    assert [data["token"] for kind, data in events if kind == "message"] == ["Hola", " buzo", " feliz"]
+    assert events[-1][0] == "done"
+
+def test_chat_stream_reports_midstream_error(client_authed, streaming_service):
+    streaming_service(FakeStreamingLLM(fail_after=1))
+    response = client_authed.post('/chat/stream', json={'message': 'Hola'})
+    events = parse_events(response.get_data(as_text=True))
+    assert events[0] == ("message", {"token": "Hola"})
+    assert events[-1][0] == "error"
+
+def test_chat_stream_requires_auth():
+    from app.routes.chat import create_chat_bp
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test_secret'
+    app.register_blueprint(create_chat_bp())
+    response = app.test_client().post('/chat/stream', json={'message': 'Hola'})
+    assert response.status_code == 401
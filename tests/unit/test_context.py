@@ -0,0 +1,53 @@
+import pytest
+from langchain_core.documents import Document
+from app.services import chat as chat_service
+from app.services.context import ApproximateTokenCounter, build_context
+
+class WordCounter:
+    """Counts whitespace-separated words as tokens."""
+    def count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        return " ".join(text.split()[:max_tokens])
+
+def doc(text, score=None):
+    return Document(page_content=text, metadata={} if score is None else {"score": score})
+
+def test_orders_by_score_and_respects_budget():
+    docs = [doc("uno dos tres", 0.2), doc("cuatro cinco", 0.9), doc("seis siete ocho nueve", 0.5)]
+    context = build_context(docs, budget=5, counter=WordCounter())
+    assert context == "cuatro cinco\n\nuno dos tres"
+
+def test_deduplicates_overlapping_chunks():
+    docs = [doc("precio del viaje"), doc("El precio del viaje es alto"), doc("Precio del viaje!")]
+    assert build_context(docs, budget=100, counter=WordCounter()) == "El precio del viaje es alto"
+
+def test_accepts_retriever_tool_string_output():
+    context = build_context("Chunk uno\n\nChunk dos\n\nChunk uno", budget=100, counter=WordCounter())
+    assert context == "Chunk uno\n\nChunk dos"
+
+def test_truncates_best_chunk_when_nothing_fits():
+    assert build_context([doc("a b c d e f")], budget=3, counter=WordCounter()) == "a b c"
+
+def test_approximate_counter():
+    counter = ApproximateTokenCounter()
+    assert counter.count("12345678") == 2
+    assert counter.truncate("123456789", 2) == "12345678"
+
+class DummyRetriever:
+    def invoke(self, query):
+        return "\n\n".join(f"Fragmento {i} " + "palabra " * 50 for i in range(20))
+
+class DummyLLM:
+    def invoke(self, prompt):
+        return {"role": "assistant", "content": f"Echo: {prompt}"}
+
+def test_generate_rag_answer_bounds_context(monkeypatch):
+    monkeypatch.setattr(chat_service, "CONTEXT_TOKEN_BUDGET", 100)
+    monkeypatch.setattr("app.services.chat.get_token_counter", lambda: ApproximateTokenCounter())
+    monkeypatch.setattr("app.services.context.get_token_counter", lambda: ApproximateTokenCounter())
+    state = {"messages": [{"role": "user", "content": "¿Qué incluye?"}]}
+    prompt = chat_service.generate_rag_answer(state, retriever=DummyRetriever(), llm=DummyLLM())["messages"][0]["content"]
+    assert "Fragmento 0" in prompt
+    assert "Fragmento 2" not in prompt
@@ -0,0 +1,143 @@
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from app.services import chat as chat_service
+from app.services.context import ApproximateTokenCounter
+from app.services.conversation import (
+    Conversation,
+    ConversationMemory,
+    InMemoryConversationStore,
+    SQLiteConversationStore,
+)
+
+def exchange(memory, user, n):
+    memory.record(user, f"pregunta {n}", f"respuesta {n}. Detalles largos.")
+
+def test_old_messages_are_folded_into_summary():
+    memory = ConversationMemory(InMemoryConversationStore(), max_messages=4)
+    for n in range(3):
+        exchange(memory, "u1", n)
+    loaded = memory.load("u1")
+    assert [m["content"] for m in loaded.messages] == ["pregunta 1", "respuesta 1. Detalles largos.", "pregunta 2", "respuesta 2. Detalles largos."]
+    assert loaded.summary == "Usuario: pregunta 0\nAsistente: respuesta 0"
+    assert memory.load("u2") == Conversation()
+
+def test_summary_stays_within_budget():
+    counter = ApproximateTokenCounter()
+    memory = ConversationMemory(InMemoryConversationStore(), max_messages=2, summary_tokens=20, counter=counter)
+    for n in range(30):
+        exchange(memory, "u1", n)
+    summary = memory.load("u1").summary
+    assert counter.count(summary) <= 20
+    assert "pregunta 28" in summary
+
+def test_failing_summarizer_falls_back_to_extractive():
+    def broken(summary, messages):
+        raise RuntimeError("llm down")
+
+    memory = ConversationMemory(InMemoryConversationStore(), max_messages=2, summarizer=broken)
+    exchange(memory, "u1", 0)
+    exchange(memory, "u1", 1)
+    assert memory.load("u1").summary.startswith("Usuario: pregunta 0")
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    db_path = str(tmp_path / "conversations.sqlite3")
+    exchange(ConversationMemory(SQLiteConversationStore(db_path)), 7, 0)
+    other_worker = ConversationMemory(SQLiteConversationStore(db_path))
+    assert other_worker.load(7).messages[0] == {"role": "user", "content": "pregunta 0"}
+    other_worker.clear(7)
+    assert other_worker.load(7) == Conversation()
+
+def test_memory_store_is_bounded():
+    store = InMemoryConversationStore(max_users=2)
+    for user in ("a", "b", "c"):
+        store.save(user, Conversation("s", ()))
+    assert store.get("a") == Conversation()
+    assert store.get("c").summary == "s"
+
+@pytest.mark.parametrize("make_store", [
+    lambda tmp_path: InMemoryConversationStore(),
+    lambda tmp_path: SQLiteConversationStore(str(tmp_path / "conversations.sqlite3")),
+])
+def test_concurrent_exchanges_are_not_lost(tmp_path, make_store):
+    memory = ConversationMemory(make_store(tmp_path), max_messages=100)
+    barrier = threading.Barrier(16)
+
+    def worker(n):
+        barrier.wait()
+        exchange(memory, "u1", n)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    questions = [m["content"] for m in memory.load("u1").messages if m["role"] == "user"]
+    assert sorted(questions) == sorted(f"pregunta {n}" for n in range(16))
+
+def test_slow_summarizer_runs_after_the_request():
+    release = threading.Event()
+
+    def slow(summary, messages):
+        release.wait(5)
+        return "Resumen: " + ", ".join(m["content"] for m in messages if m["role"] == "user")
+
+    memory = ConversationMemory(InMemoryConversationStore(), max_messages=2, summarizer=slow, background_workers=1)
+    exchange(memory, "u1", 0)
+    start = time.perf_counter()
+    compaction = memory.record("u1", "pregunta 1", "respuesta 1")
+    assert time.perf_counter() - start < 1
+    assert compaction is not None
+    assert memory.record("u1", "pregunta 2", "respuesta 2") is None  # one compaction per user at a time
+    release.set()
+    compaction.result(5)
+    loaded = memory.load("u1")
+    assert loaded.summary == "Resumen: pregunta 0"
+    # The exchange recorded while the summary was being written is kept.
+    assert [m["content"] for m in loaded.messages if m["role"] == "user"] == ["pregunta 1", "pregunta 2"]
+
+class RecordingRetriever:
+    def __init__(self):
+        self.queries = []
+
+    def invoke(self, value):
+        self.queries.append(value["query"])
+        return "Gorgona: salidas en marzo, 1.200.000 COP"
+
+class PromptLLM:
+    def invoke(self, prompt):
+        self.prompt = prompt
+        return {"role": "assistant", "content": "Cuesta 1.200.000 COP"}
+
+def test_follow_up_uses_history_for_retrieval_and_prompt():
+    retriever, llm = RecordingRetriever(), PromptLLM()
+    state = {
+        "messages": [
+            {"role": "user", "content": "fechas Gorgona"},
+            {"role": "assistant", "content": "Salimos en marzo"},
+            {"role": "user", "content": "¿y cuánto cuesta?"},
+        ],
+        "summary": "Usuario: hola",
+    }
+    chat_service.generate_rag_answer(state, retriever=retriever, llm=llm)
+    assert retriever.queries == ["fechas Gorgona ¿y cuánto cuesta?"]
+    assert "Resumen de la conversación:\nUsuario: hola" in llm.prompt
+    assert "Usuario: fechas Gorgona\nAsistente: Salimos en marzo" in llm.prompt
+    assert llm.prompt.endswith("Pregunta del usuario: ¿y cuánto cuesta?")
+
+def test_chat_route_remembers_previous_exchange(client_authed):
+    states = []
+
+    def fake_answer(state):
+        states.append(state)
+        return {"messages": [{"role": "assistant", "content": f"respuesta {len(states)}"}]}
+
+    with patch("app.routes.chat.generate_rag_answer", side_effect=fake_answer):
+        client_authed.post('/chat', json={'message': 'fechas Gorgona'})
+        client_authed.post('/chat', json={'message': '¿y cuánto cuesta?'})
+        assert client_authed.delete('/chat/history').status_code == 200
+        client_authed.post('/chat', json={'message': 'hola'})
+
+    assert [m["content"] for m in states[1]["messages"]] == ["fechas Gorgona", "respuesta 1", "¿y cuánto cuesta?"]
+    assert [m["content"] for m in states[2]["messages"]] == ["hola"]
@@ -0,0 +1,78 @@
+import pytest
+from app.services.embedding_cache import PersistentEmbeddingCache, QueryEmbeddingCache, replace_base_embeddings
+
+def test_embeds_each_chunk_once(tmp_path, make_embeddings):
+    fake = make_embeddings()
+    cache = PersistentEmbeddingCache(fake, str(tmp_path))
+    first = cache.embed_documents(["buceo", "gorgona", "buceo"])
+    second = cache.embed_documents(["gorgona", "buceo"])
+    assert fake.embedded == ["buceo", "gorgona"]
+    assert first[0] == first[2] == second[1] == fake.embed_query("buceo")
+
+def test_cache_survives_restart_and_only_embeds_changes(tmp_path, make_embeddings):
+    PersistentEmbeddingCache(make_embeddings(), str(tmp_path)).embed_documents(["a", "b"])
+    fake = make_embeddings()
+    restarted = PersistentEmbeddingCache(fake, str(tmp_path))
+    vectors = restarted.embed_documents(["a", "b changed"])
+    assert fake.embedded == ["b changed"]
+    assert vectors == [fake.embed_query("a"), fake.embed_query("b changed")]
+
+def test_cache_is_namespaced_by_model(tmp_path, make_embeddings):
+    PersistentEmbeddingCache(make_embeddings(), str(tmp_path)).embed_documents(["a"])
+    other = make_embeddings()
+    other.model = "another-model"
+    PersistentEmbeddingCache(other, str(tmp_path)).embed_documents(["a"])
+    assert other.embedded == ["a"]
+
+def test_queries_are_not_cached(tmp_path, make_embeddings):
+    fake = make_embeddings()
+    cache = PersistentEmbeddingCache(fake, str(tmp_path))
+    assert cache.embed_query("hola") == fake.embed_query("hola")
+    assert fake.embedded == []
+
+def test_query_cache_reuses_normalized_queries(make_embeddings):
+    fake = make_embeddings()
+    cache = QueryEmbeddingCache(fake)
+    first = cache.embed_query("¿Qué precio tiene el viaje?")
+    second = cache.embed_query("que precio tiene el viaje")
+    assert first == second
+    assert fake.queries == ["¿Qué precio tiene el viaje?"]
+
+def test_query_cache_ttl_and_lru(make_embeddings):
+    now = [0.0]
+    fake = make_embeddings()
+    cache = QueryEmbeddingCache(fake, max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    cache.embed_query("a")
+    cache.embed_query("b")
+    cache.embed_query("a")
+    cache.embed_query("c")  # evicts "b"
+    cache.embed_query("b")
+    assert fake.queries == ["a", "b", "c", "b"]
+    now[0] = 11
+    cache.embed_query("c")
+    assert fake.queries[-1] == "c"
+
+def test_query_cache_shared_across_instances_through_sqlite(tmp_path, make_embeddings):
+    db_path = str(tmp_path / "queries.sqlite3")
+    QueryEmbeddingCache(make_embeddings(), db_path=db_path).embed_query("fechas Gorgona")
+    fake = make_embeddings()
+    other_worker = QueryEmbeddingCache(fake, db_path=db_path)
+    vector = other_worker.embed_query("Fechas gorgona")
+    assert fake.queries == []
+    assert vector == pytest.approx(fake.embed_query("fechas Gorgona"))
+
+def test_replace_base_embeddings_reaches_innermost_model(tmp_path, make_embeddings):
+    stack = PersistentEmbeddingCache(QueryEmbeddingCache(make_embeddings()), str(tmp_path))
+    fresh = make_embeddings()
+    replace_base_embeddings(stack, fresh)
+    assert stack.embeddings.embeddings is fresh
+
+def test_models_with_different_dimensions_share_cache_dir(tmp_path, make_embeddings):
+    PersistentEmbeddingCache(make_embeddings(), str(tmp_path)).embed_documents(["a", "b"])
+    wider = make_embeddings()
+    wider.model = "wider-model"
+    wider.vector = lambda text: [1.0] * 5
+    assert PersistentEmbeddingCache(wider, str(tmp_path)).embed_documents(["a"]) == [[1.0] * 5]
+    fake = make_embeddings()
+    assert PersistentEmbeddingCache(fake, str(tmp_path)).embed_documents(["b"]) == [fake.embed_query("b")]
+    assert fake.embedded == []
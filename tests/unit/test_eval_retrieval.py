@@ -0,0 +1,27 @@
+from app.services.knowledge_base import load_faq_documents
+from benchmarks.eval_retrieval import load_golden_set, score, split_documents
+from benchmarks.fakes import HashingEmbeddings
+
+def test_golden_set_points_at_existing_entries():
+    ids = {document.id for document in load_faq_documents()}
+    golden = load_golden_set()
+    assert len(golden) >= 30
+    for question, expected in golden:
+        assert expected and expected <= ids, question
+
+def test_score_counts_each_entry_once():
+    ranked = ["a", "a", "b", "c"]
+    assert score(ranked, {"b"}, k=2) == (1.0, 0.5)
+    assert score(ranked, {"c"}, k=2) == (0.0, 0.0)
+    assert score(ranked, {"a", "c"}, k=3) == (1.0, 1.0)
+
+def test_chunks_remember_their_entry():
+    documents = load_faq_documents()[:3]
+    chunks = split_documents(documents, "60:10")
+    assert len(chunks) > len(documents)
+    assert {chunk.metadata["entry_id"] for chunk in chunks} == {document.id for document in documents}
+
+def test_hashing_embeddings_are_deterministic():
+    embeddings = HashingEmbeddings(dim=32)
+    assert embeddings.embed_query("precio Gorgona") == HashingEmbeddings(dim=32).embed_query("Precio gorgona")
+    assert embeddings.embed_query("precio Gorgona") != embeddings.embed_query("fechas Providencia")
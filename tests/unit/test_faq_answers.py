@@ -0,0 +1,79 @@
+import pytest
+from app.services import chat as chat_service
+from app.services.faq_answers import FAQMatcher
+from app.services.knowledge_base import load_faq_documents
+from app.services.knowledge_index import build_snapshot
+
+class CountingLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        return {"role": "assistant", "content": "Respuesta generada"}
+
+@pytest.fixture(scope="module")
+def matcher():
+    return FAQMatcher(load_faq_documents())
+
+@pytest.mark.parametrize("query, entry", [
+    ("¿Cuál es el costo del viaje a Gorgona?", "faq_gorgona2024.yaml#6"),
+    ("precio Gorgona", "faq_gorgona2024.yaml#6"),
+    ("¿Qué fechas son el viaje a Providencia?", "faq_providencia2025.yaml#2"),
+    ("¿Cuál es el plan de pagos para no afiliados?", "faq_providencia2025.yaml#7"),
+    ("¿Qué incluye el viaje a San Andrés?", "faq_sai2024.yaml#3"),
+    ("¿Qué no incluye el viaje a San Andrés?", "faq_sai2024.yaml#4"),
+])
+def test_confident_matches(matcher, query, entry):
+    match = matcher.match(query)
+    assert match is not None and match.document.id == entry
+    assert match.answer == match.document.metadata["answer"]
+    assert match.source == {"type": "faq", "entry": entry, "score": round(match.score, 3)}
+
+@pytest.mark.parametrize("query", [
+    "¿Qué precio tiene el viaje?",  # several destinations answer it differently
+    "¿Cuánto cuesta?",
+    "¿cuál es el precio del hotel en Providencia?",
+    "hola",
+])
+def test_ambiguous_or_unknown_queries_fall_back(matcher, query):
+    assert matcher.match(query) is None
+
+def test_zero_threshold_disables_fast_path():
+    assert FAQMatcher(load_faq_documents(), threshold=0).match("precio Gorgona") is None
+
+@pytest.fixture
+def faq_service(monkeypatch, make_embeddings):
+    llm = CountingLLM()
+    monkeypatch.setattr(chat_service, "is_initialized", True)
+    monkeypatch.setattr(chat_service, "response_model", llm)
+    monkeypatch.setattr(chat_service, "knowledge", build_snapshot(load_faq_documents(), make_embeddings()))
+    monkeypatch.setattr(chat_service, "response_cache", None)
+    return llm
+
+def test_faq_answer_skips_llm(faq_service):
+    before = chat_service.chat_answers_total.labels(source="faq")._value.get()
+    result = chat_service.generate_rag_answer({"messages": [{"role": "user", "content": "¿Cuál es el costo del viaje a Gorgona?"}]})
+    assert result["messages"][0]["content"].startswith("El valor total del viaje es de 3.500.000 COP")
+    assert result["source"]["entry"] == "faq_gorgona2024.yaml#6"
+    assert faq_service.calls == 0
+    assert chat_service.chat_answers_total.labels(source="faq")._value.get() == before + 1
+
+    result = chat_service.generate_rag_answer({"messages": [{"role": "user", "content": "¿Qué precio tiene el viaje?"}]})
+    assert result["messages"][0]["content"] == "Respuesta generada"
+    assert "source" not in result
+    assert faq_service.calls == 1
+
+def test_faq_answers_in_batch_and_stream(faq_service):
+    results = chat_service.generate_rag_answers(["precio Gorgona", "¿Qué precio tiene el viaje?"])
+    assert results[0]["source"]["entry"] == "faq_gorgona2024.yaml#6"
+    assert results[1] == {"response": "Respuesta generada"}
+    meta = {}
+    chunks = list(chat_service.stream_rag_answer({"messages": [{"role": "user", "content": "precio Gorgona"}]}, meta=meta))
+    assert chunks == [results[0]["response"]]
+    assert meta["source"]["entry"] == "faq_gorgona2024.yaml#6"
+    assert faq_service.calls == 1
+
+def test_chat_route_tags_faq_answers(faq_service, client_authed):
+    response = client_authed.post('/chat', json={'message': 'precio Gorgona'})
+    assert response.get_json()["source"] == {"type": "faq", "entry": "faq_gorgona2024.yaml#6", "score": pytest.approx(0.91, abs=0.01)}
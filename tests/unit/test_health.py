@@ -0,0 +1,82 @@
+import threading
+import pytest
+from flask import Flask
+from app.routes.health import health_bp
+from app.services import chat as chat_service
+from app.services.knowledge_index import KnowledgeSnapshot
+
+SNAPSHOT = KnowledgeSnapshot([], None, "tool", "v1")
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(health_bp)
+    app.testing = True
+    return app.test_client()
+
+@pytest.fixture
+def uninitialized(monkeypatch):
+    monkeypatch.setattr(chat_service, "is_initialized", False)
+    monkeypatch.setattr(chat_service, "response_model", None)
+    monkeypatch.setattr(chat_service, "knowledge", None)
+    monkeypatch.setattr(chat_service, "embeddings", None)
+    monkeypatch.setattr(chat_service, "response_cache", None)
+    return chat_service
+
+def wait_for_init():
+    thread = chat_service._init_thread
+    if thread is not None:
+        thread.join(5)
+
+def test_health_ok(client):
+    response = client.get('/health')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'ok'
+
+def test_ready_starts_lazy_initialization(client, uninitialized, monkeypatch, make_embeddings):
+    release = threading.Event()
+
+    def slow_build():
+        release.wait(5)
+        return "model", make_embeddings(), SNAPSHOT
+
+    monkeypatch.setattr(uninitialized, "_build_pipeline", slow_build)
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'initializing'
+    release.set()
+    wait_for_init()
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'ready'
+
+def test_ready_reports_failure_and_retries(client, uninitialized, monkeypatch, make_embeddings):
+    def failing_build():
+        raise RuntimeError("no api key")
+
+    monkeypatch.setattr(uninitialized, "CHAT_SERVICE_INIT_RETRY_INTERVAL", 0)
+    monkeypatch.setattr(uninitialized, "_build_pipeline", failing_build)
+    uninitialized.initialize_chat_service()
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'failed'
+    wait_for_init()
+    assert uninitialized.init_error == "no api key"
+
+    monkeypatch.setattr(uninitialized, "_build_pipeline", lambda: ("model", make_embeddings(), SNAPSHOT))
+    assert client.get('/ready').get_json()['status'] == 'failed'
+    wait_for_init()
+    assert uninitialized.init_error is None
+    assert client.get('/ready').status_code == 200
+
+def test_failed_initialization_retries_are_spaced(uninitialized, monkeypatch):
+    monkeypatch.setattr(uninitialized, "CHAT_SERVICE_INIT_RETRY_INTERVAL", 60)
+    monkeypatch.setattr(uninitialized, "_build_pipeline", lambda: (_ for _ in ()).throw(RuntimeError("down")))
+    uninitialized.initialize_chat_service()
+    assert uninitialized.start_background_initialization() is None
+
+def test_ready_after_initialization(client, monkeypatch):
+    monkeypatch.setattr(chat_service, "is_initialized", True)
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'ready'
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from langchain_core.documents import Document
+from app.services.knowledge_base import load_faq_documents
+from app.services.lexical import BM25Index, tokenize
+from app.services.retrieval import DestinationRetriever, HybridRetriever, reciprocal_rank_fusion
+from app.services.vector_index import NumpyVectorStore
+
+@pytest.fixture
+def hybrid(make_embeddings):
+    documents = load_faq_documents()
+    embeddings = make_embeddings()
+    store = NumpyVectorStore.from_documents(documents, embeddings)
+    retriever = HybridRetriever(
+        vector_retriever=DestinationRetriever(vectorstore=store),
+        lexical_index=BM25Index(documents),
+    )
+    return retriever, embeddings
+
+def test_tokenize_folds_accents_stopwords_and_synonyms():
+    assert tokenize("¿Cuánto CUESTA el viaje a San Andrés?") == ["precio", "viaje", "san", "andre"]
+
+def test_bm25_ranks_matching_entry_first():
+    index = BM25Index(load_faq_documents())
+    doc, _, matched = index.search("horario natación", k=1)[0]
+    assert doc.metadata["question"] == "¿Qué días y horarios son las clases del curso de natación?"
+    assert matched == 2
+
+def test_keyword_query_takes_lexical_fast_path(hybrid):
+    retriever, embeddings = hybrid
+    docs = retriever.invoke("precio Gorgona")
+    assert embeddings.queries == []
+    assert docs[0].metadata["question"] == "¿Cuál es el costo del viaje?"
+    assert docs[0].metadata["destination"] == "Gorgona"
+    assert all(d.metadata["retrieval"] == "lexical" for d in docs)
+
+def test_ambiguous_query_fuses_lexical_and_vector(hybrid):
+    retriever, embeddings = hybrid
+    docs = retriever.invoke("¿Qué necesito llevar para bucear con tiburones?")
+    assert len(embeddings.queries) == 1
+    assert 0 < len(docs) <= 4
+    assert all(d.metadata["retrieval"] == "hybrid" for d in docs)
+
+def test_async_path_matches_sync(hybrid):
+    retriever, _ = hybrid
+    query = "¿Qué incluye el viaje a Providencia?"
+    sync_ids = [d.id for d in retriever.invoke(query)]
+    async_ids = [d.id for d in asyncio.run(retriever.ainvoke(query))]
+    assert sync_ids == async_ids
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    a, b, c = (Document(id=i, page_content=i) for i in "abc")
+    fused = reciprocal_rank_fusion([a, b, c], [b, c, a])
+    assert [doc.id for doc, _ in fused][0] == "b"
+
+class CountingLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        return {"role": "assistant", "content": f"Respuesta {self.calls}"}
+
+def test_keyword_query_skips_embedding_with_warm_response_cache(monkeypatch, make_embeddings):
+    from app.services import chat as chat_service
+    from app.services.knowledge_index import build_snapshot
+    from app.services.response_cache import ResponseCache
+
+    embeddings, llm = make_embeddings(), CountingLLM()
+    snapshot = build_snapshot(load_faq_documents(), embeddings)._replace(faq_matcher=None)
+    monkeypatch.setattr(chat_service, "is_initialized", True)
+    monkeypatch.setattr(chat_service, "response_model", llm)
+    monkeypatch.setattr(chat_service, "knowledge", snapshot)
+    monkeypatch.setattr(chat_service, "response_cache", ResponseCache(embed_query=embeddings.embed_query))
+    ask = lambda text: chat_service.generate_rag_answer({"messages": [{"role": "user", "content": text}]})
+
+    ask("¿Qué necesito llevar para bucear con tiburones?")
+    assert len(chat_service.response_cache) == 1 and embeddings.queries
+    embeddings.queries.clear()
+    assert ask("precio Gorgona")["cache"] == "miss"
+    assert ask("Precio, Gorgona")["cache"] == "exact"
+    assert embeddings.queries == []
+    assert llm.calls == 2
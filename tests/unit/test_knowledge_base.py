@@ -0,0 +1,48 @@
+import pytest
+from app.services.knowledge_base import load_faq_documents, load_faq_file, detect_destination, destination_for
+from app.services.retrieval import DestinationRetriever
+from app.services.vector_index import NumpyVectorStore
+
+def test_loads_one_document_per_question():
+    documents = load_faq_documents()
+    providencia = [d for d in documents if d.metadata["destination"] == "Providencia"]
+    assert len(providencia) == 16
+    first = providencia[0]
+    assert first.metadata["question"] == "¿Qué precio tiene el viaje?"
+    assert first.metadata["source"].endswith("faq_providencia2025.yaml")
+    assert first.page_content.startswith("Destino: Providencia\nPregunta: ¿Qué precio tiene el viaje?\nRespuesta: ")
+    assert {d.metadata["destination"] for d in documents} == {
+        "General", "Gorgona", "Natación", "Providencia", "Pulmón libre", "San Andrés"
+    }
+
+def test_invalid_yaml_falls_back_to_raw_text(tmp_path):
+    path = tmp_path / "faq_malpelo2026.yaml"
+    path.write_text("- pregunta: ¿Precio?\n  respuesta: 'sin cerrar\n- pregunta: x: y\n", encoding="utf-8")
+    documents = load_faq_file(str(path))
+    assert len(documents) == 1
+    assert documents[0].metadata["destination"] == "Malpelo"
+    assert "sin cerrar" in documents[0].page_content
+
+@pytest.mark.parametrize("query,expected", [
+    ("¿Qué precio tiene el viaje a San Andrés?", "San Andrés"),
+    ("fechas GORGONA", "Gorgona"),
+    ("¿Cuánto cuesta el curso de pulmón libre?", "Pulmón libre"),
+    ("¿Qué viajes tienen?", None),
+    ("Providencia o Gorgona?", None),
+])
+def test_detect_destination(query, expected):
+    assert detect_destination(query) == expected
+
+def test_destination_for_unknown_file():
+    assert destination_for("knowledge_base/faq_sai2024.yaml") == "San Andrés"
+    assert destination_for("knowledge_base/faq_bahia_solano2026.yaml") == "Bahia solano"
+
+def test_retriever_filters_by_destination(make_embeddings):
+    store = NumpyVectorStore.from_documents(load_faq_documents(), make_embeddings())
+    retriever = DestinationRetriever(vectorstore=store, k=3)
+    docs = retriever.invoke("¿Qué precio tiene Gorgona?")
+    assert len(docs) == 3
+    assert all(d.metadata["destination"] == "Gorgona" for d in docs)
+    assert docs[0].metadata["score"] >= docs[-1].metadata["score"]
+    docs = retriever.invoke("precio", destination="Providencia")
+    assert all(d.metadata["destination"] == "Providencia" for d in docs)
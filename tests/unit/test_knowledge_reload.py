@@ -0,0 +1,102 @@
+import pytest
+from flask import Flask
+from app.routes.admin import admin_bp
+from app.services import chat as chat_service
+from app.services.knowledge_base import KnowledgeBaseWatcher, load_faq_documents
+from app.services.knowledge_index import build_snapshot, update_snapshot
+
+def write_faq(path, entries):
+    path.write_text(
+        "".join(f"- pregunta: {question}\n  respuesta: {answer}\n" for question, answer in entries),
+        encoding="utf-8",
+    )
+
+@pytest.fixture
+def faq(tmp_path):
+    path = tmp_path / "faq_malpelo2026.yaml"
+    write_faq(path, [("¿Precio?", "1000 USD"), ("¿Fechas?", "Marzo"), ("¿Incluye?", "Todo")])
+    return path
+
+def test_update_snapshot_only_embeds_changed_entries(faq, make_embeddings):
+    embeddings = make_embeddings()
+    previous = build_snapshot(load_faq_documents([str(faq)]), embeddings)
+    embeddings.embedded.clear()
+
+    write_faq(faq, [("¿Precio?", "1200 USD"), ("¿Fechas?", "Marzo")])
+    snapshot, changes = update_snapshot(previous, load_faq_documents([str(faq)]))
+
+    assert (changes.added, changes.updated, changes.removed) == (0, 1, 1)
+    assert len(embeddings.embedded) == 1 and "1200 USD" in embeddings.embedded[0]
+    assert len(snapshot.vectorstore) == 2
+    assert snapshot.version != previous.version
+    # The old snapshot keeps serving in-flight requests unchanged.
+    assert len(previous.vectorstore) == 3
+    assert "1000 USD" in previous.vectorstore.get_by_ids([f"{faq.name}#0"])[0].page_content
+
+def test_update_snapshot_without_changes_returns_previous(faq, make_embeddings):
+    previous = build_snapshot(load_faq_documents([str(faq)]), make_embeddings())
+    snapshot, changes = update_snapshot(previous, load_faq_documents([str(faq)]))
+    assert snapshot is previous
+    assert changes.total == 0
+
+def test_watcher_detects_file_changes(faq):
+    calls = []
+    watcher = KnowledgeBaseWatcher(lambda: calls.append(1), interval=60, pattern=str(faq.parent / "*.yaml"))
+    watcher.start()
+    watcher.stop()
+    assert watcher.check() is False
+    write_faq(faq, [("¿Precio?", "un precio bastante distinto")])
+    assert watcher.check() is True
+    assert watcher.check() is False
+    assert calls == [1]
+
+def test_reload_swaps_snapshot(faq, monkeypatch, make_embeddings):
+    embeddings = make_embeddings()
+    monkeypatch.setattr(chat_service, "is_initialized", True)
+    monkeypatch.setattr(chat_service, "knowledge", build_snapshot(load_faq_documents([str(faq)]), embeddings))
+    write_faq(faq, [("¿Precio?", "1000 USD"), ("¿Fechas?", "Marzo"), ("¿Incluye?", "Todo"), ("¿Nivel?", "Avanzado")])
+    stats = chat_service.reload_knowledge_base([str(faq)])
+    assert stats["added"] == 1 and stats["updated"] == 0 and stats["removed"] == 0
+    assert stats["version"] == chat_service.knowledge.version
+    assert len(chat_service.knowledge.vectorstore) == 4
+
+def test_reload_maps_the_index_another_worker_published(faq, monkeypatch, make_embeddings):
+    from app.services.vector_index import MmapVectorStore
+    embeddings = make_embeddings()
+    old = build_snapshot(load_faq_documents([str(faq)]), embeddings)
+    monkeypatch.setattr(chat_service, "is_initialized", True)
+    monkeypatch.setattr(chat_service, "knowledge", old)
+    write_faq(faq, [("¿Precio?", "1200 USD"), ("¿Fechas?", "Marzo")])
+    chat_service.reload_knowledge_base([str(faq)])
+    published = chat_service.knowledge.vectorstore
+
+    # A second worker still on the old snapshot reloads the same files.
+    embeddings.embedded.clear()
+    monkeypatch.setattr(chat_service, "knowledge", old)
+    monkeypatch.setattr(type(old.vectorstore), "copy", lambda self: pytest.fail("heap copy of the index"))
+    stats = chat_service.reload_knowledge_base([str(faq)])
+    assert (stats["added"], stats["updated"], stats["removed"]) == (0, 1, 1)
+    assert isinstance(chat_service.knowledge.vectorstore, MmapVectorStore)
+    assert chat_service.knowledge.vectorstore.path == published.path
+    assert embeddings.embedded == []
+
+@pytest.fixture
+def admin_client():
+    app = Flask(__name__)
+    app.config['ADMIN_API_KEY'] = "secreto"
+    app.register_blueprint(admin_bp)
+    app.testing = True
+    return app.test_client()
+
+def test_admin_reload_requires_key(admin_client, monkeypatch):
+    monkeypatch.setattr(chat_service, "reload_knowledge_base", lambda: {"added": 0})
+    assert admin_client.post('/admin/reload-knowledge-base').status_code == 403
+    assert admin_client.post('/admin/reload-knowledge-base', headers={'X-Admin-Key': 'otro'}).status_code == 403
+    response = admin_client.post('/admin/reload-knowledge-base', headers={'X-Admin-Key': 'secreto'})
+    assert response.status_code == 200
+    assert response.get_json() == {"added": 0}
+
+def test_admin_reload_before_initialization(admin_client, monkeypatch):
+    monkeypatch.setattr(chat_service, "is_initialized", False)
+    response = admin_client.post('/admin/reload-knowledge-base', headers={'X-Admin-Key': 'secreto'})
+    assert response.status_code == 503
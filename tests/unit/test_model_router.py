@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+from app.services import chat as chat_service
+from app.services.knowledge_base import load_faq_documents
+from app.services.knowledge_index import build_snapshot
+from app.services.model_router import (
+    FAST, FULL, ModelRouter, classify_query, escalation_reason,
+    llm_escalations_total, llm_tier_requests_total, llm_tier_tokens_total,
+)
+from app.services.rate_limit import CircuitOpen
+
+class FakeTierModel:
+    """Chat model fake for one tier: answers with ``answer`` (an AIMessage) or raises ``error``."""
+
+    def __init__(self, answer="Respuesta", error=None, usage=None, finish_reason="stop"):
+        self.answer = answer
+        self.error = error
+        self.usage = usage
+        self.finish_reason = finish_reason
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        if self.error is not None:
+            raise self.error
+        return AIMessage(content=self.answer, usage_metadata=self.usage, response_metadata={"finish_reason": self.finish_reason})
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+    def stream(self, prompt):
+        self.prompts.append(prompt)
+        yield AIMessage(content=self.answer)
+
+def counter(metric, **labels):
+    return metric.labels(**labels)._value.get()
+
+@pytest.mark.parametrize("query, tier, reason", [
+    ("hola", FAST, "small_talk"),
+    ("¡Muchas gracias!", FAST, "small_talk"),
+    ("¿Cuál es el precio del viaje a Gorgona?", FAST, "lookup"),
+    ("¿Qué me recomiendas, Providencia o San Andrés?", FULL, "complex"),
+    ("¿Cuál es la diferencia entre los planes de pago?", FULL, "complex"),
+    ("¿Cuándo salimos? ¿Y a qué hora llegamos?", FULL, "multi_question"),
+    (" ".join(["palabra"] * 30) + "?", FULL, "long_question"),
+    ("¿", FULL, "empty"),
+])
+def test_classify_query(query, tier, reason):
+    assert classify_query(query) == (tier, reason)
+
+def test_long_conversations_go_to_the_full_model():
+    assert classify_query("¿y cuánto cuesta?", summary="El usuario preguntó por Gorgona.") == (FULL, "long_conversation")
+    assert classify_query("¿y cuánto cuesta?", history=[{"role": "user", "content": "Gorgona"}]) == (FAST, "lookup")
+
+@pytest.mark.parametrize("response, reason", [
+    (AIMessage(content="El viaje cuesta 3.500.000 COP."), None),
+    (AIMessage(content="No se permite bucear sin certificación."), None),
+    (AIMessage(content="Lo siento, no tengo información sobre eso."), "uncertain"),
+    (AIMessage(content="No estoy seguro de las fechas."), "uncertain"),
+    (AIMessage(content="   "), "empty"),
+    (AIMessage(content="El viaje incluye", response_metadata={"finish_reason": "length"}), "truncated"),
+    ({"role": "assistant", "content": "Claro, con gusto."}, None),
+])
+def test_escalation_reason(response, reason):
+    assert escalation_reason(response) == reason
+
+def test_fast_tier_answers_lookups():
+    fast, full = FakeTierModel("Rápida", usage={"input_tokens": 50, "output_tokens": 7, "total_tokens": 57}), FakeTierModel("Completa")
+    router = ModelRouter(full, fast)
+    before_calls = counter(llm_tier_requests_total, tier=FAST)
+    before_tokens = counter(llm_tier_tokens_total, tier=FAST, kind="prompt")
+    response = router.generate("prompt", "¿Cuál es el precio del viaje a Gorgona?")
+    assert response.content == "Rápida"
+    assert fast.prompts == ["prompt"] and full.prompts == []
+    assert counter(llm_tier_requests_total, tier=FAST) == before_calls + 1
+    assert counter(llm_tier_tokens_total, tier=FAST, kind="prompt") == before_tokens + 50
+
+def test_complex_questions_skip_the_fast_tier():
+    fast, full = FakeTierModel("Rápida"), FakeTierModel("Completa")
+    response = ModelRouter(full, fast).generate("prompt", "¿Qué destino me recomiendas?")
+    assert response.content == "Completa"
+    assert fast.prompts == []
+
+@pytest.mark.parametrize("fast, reason", [
+    (FakeTierModel("No tengo información sobre ese viaje."), "uncertain"),
+    (FakeTierModel("El viaje", finish_reason="length"), "truncated"),
+    (FakeTierModel(error=ValueError("bad request")), "error"),
+])
+def test_low_confidence_fast_answers_escalate(fast, reason):
+    full = FakeTierModel("Completa")
+    before = counter(llm_escalations_total, reason=reason)
+    response = ModelRouter(full, fast).generate("prompt", "¿Cuál es el precio del viaje?")
+    assert response.content == "Completa"
+    assert len(fast.prompts) == 1 and full.prompts == ["prompt"]
+    assert counter(llm_escalations_total, reason=reason) == before + 1
+
+def test_admission_control_rejections_are_not_escalated():
+    fast, full = FakeTierModel(error=CircuitOpen("open", 5)), FakeTierModel("Completa")
+    with pytest.raises(CircuitOpen):
+        ModelRouter(full, fast).generate("prompt", "hola")
+    assert full.prompts == []
+
+def test_without_fast_tier_everything_goes_to_full_model():
+    full = FakeTierModel("Completa")
+    assert ModelRouter(full).generate("prompt", "hola").content == "Completa"
+    assert ModelRouter(full).invoke("resume").content == "Completa"
+
+def test_agenerate_escalates():
+    fast, full = FakeTierModel("No cuento con esos datos."), FakeTierModel("Completa")
+    response = asyncio.run(ModelRouter(full, fast).agenerate("prompt", "hola"))
+    assert response.content == "Completa"
+    assert fast.prompts == ["prompt"] and full.prompts == ["prompt"]
+
+@pytest.fixture
+def routed_service(monkeypatch, make_embeddings):
+    fast, full = FakeTierModel("Rápida"), FakeTierModel("Completa")
+    monkeypatch.setattr(chat_service, "is_initialized", True)
+    monkeypatch.setattr(chat_service, "response_model", ModelRouter(full, fast))
+    monkeypatch.setattr(chat_service, "knowledge", build_snapshot(load_faq_documents(), make_embeddings()))
+    monkeypatch.setattr(chat_service, "response_cache", None)
+    return fast, full
+
+def test_chat_service_routes_each_question(routed_service):
+    fast, full = routed_service
+    ask = lambda text: chat_service.generate_rag_answer({"messages": [{"role": "user", "content": text}]})
+    assert chat_service.message_content(ask("hola")["messages"][0]) == "Rápida"
+    assert chat_service.message_content(ask("¿Por qué conviene ir en temporada seca?")["messages"][0]) == "Completa"
+
+    results = chat_service.generate_rag_answers(["buenas tardes", "¿Cuál es mejor, Gorgona o Providencia?"])
+    assert [result["response"] for result in results] == ["Rápida", "Completa"]
+
+def test_streams_use_the_full_model(routed_service):
+    fast, full = routed_service
+    chunks = list(chat_service.stream_rag_answer({"messages": [{"role": "user", "content": "hola"}]}))
+    assert chunks == ["Completa"]
+    assert fast.prompts == []
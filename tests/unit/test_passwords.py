@@ -0,0 +1,83 @@
+import threading
+import time
+import pytest
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models.user import User
+from app.routes import auth
+from app.services.passwords import PasswordHasher, PasswordHasherBusy
+
+FAST_METHOD = "pbkdf2:sha256:1000"
+
+def test_hash_and_verify_run_on_pool():
+    observed = []
+    hasher = PasswordHasher(method=FAST_METHOD, workers=2, queue_size=0, observe=lambda op, s: observed.append(op))
+    stored = hasher.hash("secreto")
+    assert stored.startswith(FAST_METHOD + "$")
+    assert hasher.verify(stored, "secreto")
+    assert not hasher.verify(stored, "otro")
+    assert observed == ["hash", "verify", "verify"]
+    assert hasher.pending == 0
+
+def test_rejects_when_workers_and_queue_are_full():
+    hasher = PasswordHasher(method=FAST_METHOD, workers=1, queue_size=1)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+
+    threads = [threading.Thread(target=hasher._run, args=("hash", blocking)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    started.wait(5)
+    while hasher.pending < 2:
+        time.sleep(0.001)
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash("pw")
+    release.set()
+    for t in threads:
+        t.join()
+    assert hasher.hash("pw")
+
+def test_needs_rehash_compares_parameters():
+    hasher = PasswordHasher(method=FAST_METHOD)
+    assert not hasher.needs_rehash(generate_password_hash("pw", FAST_METHOD))
+    assert hasher.needs_rehash(generate_password_hash("pw", "pbkdf2:sha256:2000"))
+    assert PasswordHasher(method="pbkdf2:sha256").needs_rehash(generate_password_hash("pw", FAST_METHOD))
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(auth, "password_hasher", PasswordHasher(method=FAST_METHOD, workers=1, queue_size=0))
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test_secret'
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    app.register_blueprint(auth.auth_bp)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def test_login_upgrades_outdated_hash(app):
+    db.session.add(User(username='buzo', password=generate_password_hash('pw', 'pbkdf2:sha256:500')))
+    db.session.commit()
+    response = app.test_client().post('/users/login', json={'username': 'buzo', 'password': 'pw'})
+    assert response.status_code == 200
+    assert db.session.get(User, 1).password.startswith(FAST_METHOD + "$")
+
+def test_busy_hasher_returns_503_with_retry_after(app, monkeypatch):
+    def busy(*args):
+        raise PasswordHasherBusy("full")
+
+    monkeypatch.setattr(auth.password_hasher, "hash", busy)
+    monkeypatch.setattr(auth.password_hasher, "verify", busy)
+    client = app.test_client()
+    db.session.add(User(username='buzo', password=generate_password_hash('pw', FAST_METHOD)))
+    db.session.commit()
+    for path in ('/users/register', '/users/login'):
+        response = client.post(path, json={'username': 'nuevo' if path == '/users/register' else 'buzo', 'password': 'pw'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == str(auth.PASSWORD_HASH_RETRY_AFTER)
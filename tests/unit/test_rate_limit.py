@@ -0,0 +1,285 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from app.routes import chat as chat_routes
+from app.services import chat as chat_service
+from app.services.rate_limit import (
+    CircuitBreaker,
+    CircuitOpen,
+    ConcurrencyLimited,
+    LLMGuard,
+    UpstreamUnavailable,
+    UserRateLimited,
+    UserRateLimiter,
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class ProviderRateLimitError(Exception):
+    """Shaped like openai.RateLimitError: a status code and a response with headers."""
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("429 Too Many Requests")
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after} if retry_after else {}})()
+
+class ThrottlingLLM:
+    """Fake chat model that answers 429 for its first ``throttle`` calls."""
+    def __init__(self, throttle, retry_after=None):
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.calls <= self.throttle:
+            raise ProviderRateLimitError(self.retry_after)
+        return {"role": "assistant", "content": "Hola"}
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+    def stream(self, prompt):
+        yield self.invoke(prompt)["content"]
+        yield "!"
+
+class StaticRetriever:
+    def invoke(self, value):
+        return "contexto"
+
+def guard(**kwargs):
+    delays = []
+    options = dict(max_retries=3, base_delay=0.5, max_delay=8, sleep=delays.append, jitter=lambda low, high: high)
+    options.update(kwargs)
+    return LLMGuard(**options), delays
+
+def test_token_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    limiter = UserRateLimiter(per_minute=60, burst=2, clock=clock)
+    limiter.acquire("u1")
+    limiter.acquire("u1")
+    with pytest.raises(UserRateLimited) as rejected:
+        limiter.acquire("u1")
+    assert rejected.value.retry_after == pytest.approx(1.0)
+    assert rejected.value.retry_after_header == "1"
+    limiter.acquire("u2")
+    clock.now = 1.0
+    limiter.acquire("u1")
+
+def test_large_cost_drains_the_bucket():
+    clock = FakeClock()
+    limiter = UserRateLimiter(per_minute=60, burst=5, clock=clock)
+    limiter.acquire("u1", cost=50)
+    with pytest.raises(UserRateLimited):
+        limiter.acquire("u1")
+
+def test_upstream_429_is_retried_with_exponential_backoff():
+    llm_guard, delays = guard()
+    llm = ThrottlingLLM(throttle=2)
+    assert llm_guard.call(llm.invoke, "hola")["content"] == "Hola"
+    assert llm.calls == 3
+    assert delays == [0.5, 1.0]
+
+def test_provider_retry_after_is_honoured():
+    llm_guard, delays = guard()
+    llm_guard.call(ThrottlingLLM(throttle=1, retry_after="3").invoke, "hola")
+    assert delays == [3.0]
+
+def test_non_retryable_errors_are_raised_unchanged():
+    llm_guard, delays = guard()
+
+    def broken(prompt):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        llm_guard.call(broken, "hola")
+    assert delays == []
+
+def test_circuit_opens_after_failures_and_fails_fast():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    llm_guard, _ = guard(max_retries=1, breaker=breaker)
+    llm = ThrottlingLLM(throttle=100)
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailable):
+            llm_guard.call(llm.invoke, "hola")
+    assert breaker.state == CircuitBreaker.OPEN
+    calls = llm.calls
+    with pytest.raises(CircuitOpen) as rejected:
+        llm_guard.call(llm.invoke, "hola")
+    assert llm.calls == calls
+    assert rejected.value.status_code == 503 and rejected.value.retry_after == 30
+
+    clock.now = 31
+    llm.throttle = 0
+    assert llm_guard.call(llm.invoke, "hola")["content"] == "Hola"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_failed_trial_call_reopens_the_circuit():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    llm_guard, delays = guard(max_retries=3, breaker=breaker)
+    llm = ThrottlingLLM(throttle=100)
+    with pytest.raises(UpstreamUnavailable):
+        llm_guard.call(llm.invoke, "hola")
+    clock.now = 11
+    calls = llm.calls
+    with pytest.raises(CircuitOpen):
+        llm_guard.call(llm.invoke, "hola")
+    assert llm.calls == calls + 1
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_concurrency_limit_rejects_when_no_slot_frees_up():
+    llm_guard, _ = guard(max_concurrency=1, queue_timeout=0.01)
+    entered, release = threading.Event(), threading.Event()
+
+    def slow(prompt):
+        entered.set()
+        release.wait(5)
+        return "ok"
+
+    worker = threading.Thread(target=llm_guard.call, args=(slow, "a"))
+    worker.start()
+    entered.wait(5)
+    with pytest.raises(ConcurrencyLimited) as rejected:
+        llm_guard.call(slow, "b")
+    assert rejected.value.status_code == 429
+    release.set()
+    worker.join()
+    assert llm_guard.call(slow, "c") == "ok"
+
+def test_async_concurrency_limit_waits_on_the_event_loop():
+    llm_guard, _ = guard(max_concurrency=1, queue_timeout=0.05)
+    release = asyncio.Event()
+
+    async def slow(prompt):
+        await release.wait()
+        return prompt
+
+    async def scenario():
+        first = asyncio.create_task(llm_guard.acall(slow, "a"))
+        await asyncio.sleep(0)
+        with patch("asyncio.to_thread", side_effect=AssertionError("no executor threads")):
+            with pytest.raises(ConcurrencyLimited):
+                await llm_guard.acall(slow, "b")
+            # A waiter cancelled while queued must not keep a slot.
+            waiter = asyncio.create_task(llm_guard.acall(slow, "c"))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            release.set()
+            assert await first == "a"
+            assert await llm_guard.acall(slow, "d") == "d"
+            assert await llm_guard.acall(slow, "e") == "e"
+
+    asyncio.run(scenario())
+
+def test_threads_and_coroutines_share_one_concurrency_limit():
+    llm_guard, _ = guard(max_concurrency=2, queue_timeout=0.05)
+    active, peak, lock = [0], [0], threading.Lock()
+    entered, release = threading.Semaphore(0), threading.Event()
+
+    def track(delta):
+        with lock:
+            active[0] += delta
+            peak[0] = max(peak[0], active[0])
+
+    def blocking(prompt):
+        track(1)
+        entered.release()
+        release.wait(5)
+        track(-1)
+        return prompt
+
+    async def quick(prompt):
+        track(1)
+        await asyncio.sleep(0.01)
+        track(-1)
+        return prompt
+
+    def quick_blocking(prompt):
+        track(1)
+        time.sleep(0.01)
+        track(-1)
+        return prompt
+
+    threads = [threading.Thread(target=llm_guard.call, args=(blocking, i)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    assert entered.acquire(timeout=5) and entered.acquire(timeout=5)
+
+    async def scenario():
+        with pytest.raises(ConcurrencyLimited):
+            await llm_guard.acall(quick, "a")  # both slots are held by threads
+        waiter = asyncio.create_task(llm_guard.acall(quick, "b"))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await waiter
+
+    assert asyncio.run(scenario()) == "b"
+    for thread in threads:
+        thread.join()
+
+    llm_guard.queue_timeout = 5
+    mixed = [threading.Thread(target=llm_guard.call, args=(quick_blocking, i)) for i in range(4)]
+    for thread in mixed:
+        thread.start()
+
+    async def coroutines():
+        return await asyncio.gather(*(llm_guard.acall(quick, i) for i in range(4)))
+
+    assert asyncio.run(coroutines()) == [0, 1, 2, 3]
+    for thread in mixed:
+        thread.join()
+    assert peak[0] == 2
+
+def test_async_and_stream_calls_are_retried():
+    llm_guard, _ = guard()
+
+    async def asleep(delay):
+        pass
+
+    llm_guard.asleep = asleep
+    llm = ThrottlingLLM(throttle=1)
+    assert asyncio.run(llm_guard.acall(llm.ainvoke, "hola"))["content"] == "Hola"
+    llm = ThrottlingLLM(throttle=2)
+    assert list(llm_guard.stream(llm.stream, "hola")) == ["Hola", "!"]
+
+def test_conversation_summaries_go_through_the_guard(monkeypatch):
+    from app.services.conversation import LLMSummarizer
+    llm_guard, delays = guard()
+    monkeypatch.setattr(chat_service, "llm_guard", llm_guard)
+    llm = ThrottlingLLM(throttle=1)
+    summary = LLMSummarizer(lambda: llm)("", [{"role": "user", "content": "fechas Gorgona"}])
+    assert summary == "Hola"
+    assert llm.calls == 2 and delays == [0.5]
+
+def test_rejections_propagate_from_generate_rag_answer(monkeypatch):
+    llm_guard, _ = guard(max_retries=1)
+    monkeypatch.setattr(chat_service, "llm_guard", llm_guard)
+    with pytest.raises(UpstreamUnavailable):
+        chat_service.generate_rag_answer({"messages": [{"role": "user", "content": "hola"}]}, retriever=StaticRetriever(), llm=ThrottlingLLM(throttle=100))
+    answer = chat_service.generate_rag_answer({"messages": [{"role": "user", "content": "hola"}]}, retriever=StaticRetriever(), llm=ThrottlingLLM(throttle=1))
+    assert answer["messages"][-1]["content"] == "Hola"
+
+def test_chat_route_returns_429_when_user_exceeds_rate(client_authed, monkeypatch):
+    monkeypatch.setattr(chat_routes, "user_rate_limiter", UserRateLimiter(per_minute=6, burst=1, clock=FakeClock()))
+    answer = {"messages": [{"role": "assistant", "content": "Hola"}]}
+    with patch("app.routes.chat.generate_rag_answer", return_value=answer) as generate:
+        assert client_authed.post('/chat', json={'message': 'hola'}).status_code == 200
+        response = client_authed.post('/chat', json={'message': 'hola'})
+    assert generate.call_count == 1
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+
+def test_chat_route_returns_503_while_circuit_is_open(client_authed):
+    with patch("app.routes.chat.generate_rag_answer", side_effect=CircuitOpen("open", 12.5)):
+        response = client_authed.post('/chat', json={'message': 'hola'})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "13"
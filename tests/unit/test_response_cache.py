@@ -0,0 +1,89 @@
+import pytest
+from app.services import chat as chat_service
+from app.services.knowledge_index import KnowledgeSnapshot
+from app.services.response_cache import ResponseCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_exact_tier_ignores_case_accents_and_punctuation():
+    cache = ResponseCache()
+    cache.put("¿Qué precio tiene el viaje?", "3.650.000 COP")
+    assert cache.get("que PRECIO tiene el viaje") == ("3.650.000 COP", "exact")
+    assert cache.get("¿Qué fechas son el viaje?") == (None, None)
+
+def test_semantic_tier_respects_threshold(make_embeddings):
+    cache = ResponseCache(similarity_threshold=0.9, embed_query=make_embeddings().embed_query)
+    cache.put("¿Qué precio tiene el viaje?", "3.650.000 COP")
+    assert cache.get("¿Cuál es el precio?") == ("3.650.000 COP", "semantic")
+    assert cache.get("¿Qué fechas tiene?") == (None, None)
+
+def test_semantic_tier_only_matches_the_same_destination(make_embeddings):
+    cache = ResponseCache(similarity_threshold=0.9, embed_query=make_embeddings().embed_query)
+    cache.put("¿Cuál es el precio del viaje a Providencia?", "4.200.000 COP")
+    assert cache.get("¿Cuál es el precio del viaje a Gorgona?") == (None, None)
+    assert cache.get("¿Qué precio tiene el viaje?") == (None, None)
+    assert cache.get("Precio del viaje a Providencia") == ("4.200.000 COP", "semantic")
+    cache.put("¿Cuál es el precio del viaje a Gorgona?", "3.650.000 COP")
+    assert cache.get("precio para Gorgona") == ("3.650.000 COP", "semantic")
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(ttl_seconds=10, clock=clock)
+    cache.put("hola", "¡Hola!")
+    clock.now = 9
+    assert cache.get("hola")[0] == "¡Hola!"
+    clock.now = 11
+    assert cache.get("hola") == (None, None)
+    assert len(cache) == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") == (None, None)
+    assert cache.get("a")[0] == "1"
+    assert cache.get("c")[0] == "3"
+
+def test_knowledge_base_change_invalidates_cache():
+    cache = ResponseCache()
+    cache.put("precio", "viejo", version="v1")
+    assert cache.get("precio", version="v1")[0] == "viejo"
+    assert cache.get("precio", version="v2") == (None, None)
+    assert len(cache) == 0
+
+class CountingLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        return {"role": "assistant", "content": "Respuesta generada"}
+
+class DummyRetriever:
+    def invoke(self, query):
+        return "Dummy context"
+
+@pytest.fixture
+def cached_service(monkeypatch):
+    llm = CountingLLM()
+    monkeypatch.setattr(chat_service, "is_initialized", True)
+    monkeypatch.setattr(chat_service, "response_model", llm)
+    monkeypatch.setattr(chat_service, "knowledge", KnowledgeSnapshot([], None, DummyRetriever(), "v1"))
+    monkeypatch.setattr(chat_service, "response_cache", ResponseCache())
+    return llm
+
+def test_generate_rag_answer_uses_cache(cached_service):
+    state = {"messages": [{"role": "user", "content": "¿Qué precio tiene el viaje?"}]}
+    first = chat_service.generate_rag_answer(state)
+    second = chat_service.generate_rag_answer({"messages": [{"role": "user", "content": "que precio tiene el viaje"}]})
+    assert first["cache"] == "miss"
+    assert second["cache"] == "exact"
+    assert second["messages"][0]["content"] == "Respuesta generada"
+    assert cached_service.calls == 1
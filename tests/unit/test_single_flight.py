@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from app.services import chat as chat_service
+from app.services.knowledge_base import load_faq_documents
+from app.services.knowledge_index import build_snapshot
+from app.services.single_flight import SingleFlight, chat_coalesced_requests_total, chat_coalesce_timeouts_total
+
+class SlowLLM:
+    def __init__(self, delay=0.3, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        if self.fail:
+            raise RuntimeError("model down")
+        return {"role": "assistant", "content": "Respuesta lenta"}
+
+    def invoke(self, prompt):
+        time.sleep(self.delay)
+        return self._call()
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.delay)
+        return self._call()
+
+def run_threads(n, target):
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        barrier.wait()
+        results[i] = target()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight(wait_timeout=5)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "answer"
+
+    before = chat_coalesced_requests_total._value.get()
+    results = run_threads(20, lambda: flight.do("key", slow))
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["answer"] * 20
+    assert sum(shared for _, shared in results) == 19
+    assert chat_coalesced_requests_total._value.get() == before + 19
+    # Nothing is kept once the leader finishes.
+    assert flight.do("key", lambda: "again") == ("again", False)
+
+def test_followers_receive_the_leaders_error():
+    flight = SingleFlight(wait_timeout=5)
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flight.do("key", failing)
+        except ValueError as e:
+            return str(e)
+
+    assert run_threads(8, call) == ["boom"] * 8
+
+def test_followers_stop_waiting_after_timeout():
+    flight = SingleFlight(wait_timeout=0.05)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.3)
+        return len(calls)
+
+    before = chat_coalesce_timeouts_total._value.get()
+    results = run_threads(4, lambda: flight.do("key", slow))
+    assert len(calls) == 4
+    assert not any(shared for _, shared in results)
+    assert chat_coalesce_timeouts_total._value.get() == before + 3
+
+def test_zero_timeout_disables_coalescing():
+    flight = SingleFlight(wait_timeout=0)
+    calls = []
+    run_threads(3, lambda: flight.do("key", lambda: calls.append(1) or time.sleep(0.1)))
+    assert len(calls) == 3
+
+def test_async_coalescing_and_leader_cancellation():
+    flight = SingleFlight(wait_timeout=5)
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.ado("key", slow) for _ in range(10)))
+        assert len(calls) == 1
+        assert sum(shared for _, shared in results) == 9
+
+        leader = asyncio.create_task(flight.ado("other", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.ado("other", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        # A cancelled leader leaves its followers to answer on their own.
+        assert await follower == ("answer", False)
+
+    asyncio.run(scenario())
+
+@pytest.fixture
+def slow_service(monkeypatch, make_embeddings):
+    llm = SlowLLM()
+    monkeypatch.setattr(chat_service, "is_initialized", True)
+    monkeypatch.setattr(chat_service, "response_model", llm)
+    monkeypatch.setattr(chat_service, "knowledge", build_snapshot(load_faq_documents(), make_embeddings()))
+    monkeypatch.setattr(chat_service, "response_cache", None)
+    monkeypatch.setattr(chat_service, "single_flight", SingleFlight(wait_timeout=5))
+    return llm
+
+def ask(text):
+    return chat_service.generate_rag_answer({"messages": [{"role": "user", "content": text}]})
+
+def test_identical_chat_queries_call_the_llm_once(slow_service):
+    before = chat_service.chat_answers_total.labels(source="coalesced")._value.get()
+    # Same question up to case, accents and punctuation.
+    questions = ["¿Qué precio tiene el viaje?", "que precio tiene el viaje"] * 16
+    results = run_threads(len(questions), lambda: ask(questions.pop()))
+    assert slow_service.calls == 1
+    assert all(result["messages"][0]["content"] == "Respuesta lenta" for result in results)
+    assert chat_service.chat_answers_total.labels(source="coalesced")._value.get() == before + 31
+
+def test_different_questions_and_follow_ups_are_not_coalesced(slow_service):
+    slow_service.delay = 0.1
+    questions = ["¿Qué precio tiene el viaje?", "¿Qué fechas tiene el viaje?"]
+    run_threads(2, lambda: ask(questions.pop()))
+    assert slow_service.calls == 2
+
+    state = {"messages": [{"role": "user", "content": "hola"}, {"role": "assistant", "content": "¡Hola!"},
+                          {"role": "user", "content": "¿Qué precio tiene el viaje?"}]}
+    run_threads(2, lambda: chat_service.generate_rag_answer(state))
+    assert slow_service.calls == 4
+
+def test_coalesced_requests_share_errors(slow_service):
+    slow_service.fail = True
+    results = run_threads(6, lambda: ask("¿Qué precio tiene el viaje?"))
+    assert slow_service.calls == 1
+    assert all(result["messages"][0]["content"] == chat_service.ERROR_MESSAGE for result in results)
+
+def test_async_chat_queries_are_coalesced(slow_service):
+    async def scenario():
+        return await asyncio.gather(*(
+            chat_service.agenerate_rag_answer({"messages": [{"role": "user", "content": "¿Qué precio tiene el viaje?"}]})
+            for _ in range(12)
+        ))
+
+    results = asyncio.run(scenario())
+    assert slow_service.calls == 1
+    assert all(result["messages"][0]["content"] == "Respuesta lenta" for result in results)
@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import patch
+from langchain_core.documents import Document
+from app.services.retrieval import DestinationRetriever
+from app.services.timing import SlowRequestProfiler, span, track_request
+from app.services.vector_index import NumpyVectorStore
+
+def test_spans_are_collected_per_request():
+    with span("outside"):
+        pass
+    with track_request() as timings:
+        with span("llm"):
+            pass
+        with span("vector_search"):
+            pass
+        with span("vector_search"):
+            pass
+    assert list(timings.stages) == ["llm", "vector_search"]
+    header = timings.server_timing()
+    assert header.startswith("llm;dur=") and ", vector_search;dur=" in header
+
+def test_retriever_records_embedding_and_search_stages(make_embeddings):
+    store = NumpyVectorStore.from_documents([Document(page_content="precio Gorgona", metadata={"destination": "Gorgona"})], make_embeddings())
+    with track_request() as timings:
+        DestinationRetriever(vectorstore=store).invoke("precio Providencia")
+    assert {"embedding", "vector_search"} <= set(timings.stages)
+
+def test_profiler_dumps_only_slow_sampled_requests(tmp_path):
+    slow = SlowRequestProfiler(sample_rate=1.0, slow_seconds=0.0, output_dir=str(tmp_path), sample=lambda: 0.0)
+    with slow.profile("chat"):
+        sum(range(1000))
+    assert len(list(tmp_path.glob("chat-*.prof"))) == 1
+
+    fast = SlowRequestProfiler(sample_rate=1.0, slow_seconds=60.0, output_dir=str(tmp_path / "fast"), sample=lambda: 0.0)
+    with fast.profile("chat"):
+        pass
+    unsampled = SlowRequestProfiler(sample_rate=0.5, slow_seconds=0.0, output_dir=str(tmp_path / "unsampled"), sample=lambda: 0.9)
+    with unsampled.profile("chat"):
+        pass
+    assert not (tmp_path / "fast").exists() and not (tmp_path / "unsampled").exists()
+
+@pytest.fixture
+def timed_client(app_authed):
+    def fake_answer(state):
+        with span("llm"):
+            return {"messages": [{"role": "assistant", "content": "Hola"}]}
+
+    with patch("app.routes.chat.generate_rag_answer", fake_answer):
+        yield app_authed
+
+def test_server_timing_header_is_opt_in(timed_client):
+    response = timed_client.test_client().post('/chat', json={'message': 'Hola'})
+    assert "Server-Timing" not in response.headers
+
+    timed_client.config['CHAT_TIMING_HEADER'] = True
+    response = timed_client.test_client().post('/chat', json={'message': 'Hola'})
+    assert response.status_code == 200
+    stages = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+    assert stages == ["auth", "history_load", "llm", "history_save"]
@@ -0,0 +1,133 @@
+import os
+import time
+import numpy as np
+import pytest
+from langchain_core.vectorstores import InMemoryVectorStore
+from app.services.vector_index import MmapVectorStore, NumpyVectorStore, ReadOnlyIndexError
+
+class TableEmbeddings:
+    """Fake embedder returning fixed vectors looked up by text."""
+    def __init__(self, table):
+        self.table = table
+
+    def embed_documents(self, texts):
+        return [self.table[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.table[text]
+
+@pytest.fixture
+def store():
+    rng = np.random.default_rng(42)
+    table = {f"doc{i}": rng.standard_normal(8).tolist() for i in range(50)}
+    table.update({f"q{i}": rng.standard_normal(8).tolist() for i in range(5)})
+    embedding = TableEmbeddings(table)
+    texts = [f"doc{i}" for i in range(50)]
+    metadatas = [{"destination": "Gorgona" if i % 2 else "Providencia"} for i in range(50)]
+    return NumpyVectorStore.from_texts(texts, embedding, metadatas=metadatas), InMemoryVectorStore.from_texts(texts, embedding, metadatas=metadatas)
+
+def test_matches_in_memory_store(store):
+    numpy_store, in_memory = store
+    for q in ["q0", "q1", "q2"]:
+        expected = [(d.page_content, s) for d, s in in_memory.similarity_search_with_score(q, k=5)]
+        actual = [(d.page_content, s) for d, s in numpy_store.similarity_search_with_score(q, k=5)]
+        assert [text for text, _ in actual] == [text for text, _ in expected]
+        assert np.allclose([s for _, s in actual], [s for _, s in expected], atol=1e-5)
+
+def test_batch_search_matches_single_queries(store):
+    numpy_store, _ = store
+    queries = [numpy_store.embedding.embed_query(f"q{i}") for i in range(5)]
+    batched = numpy_store.batch_similarity_search_with_score_by_vector(queries, k=3)
+    for query, results in zip(queries, batched):
+        single = numpy_store.similarity_search_with_score_by_vector(query, k=3)
+        assert [d.page_content for d, _ in results] == [d.page_content for d, _ in single]
+
+def test_filter_by_metadata(store):
+    numpy_store, _ = store
+    results = numpy_store.similarity_search("q0", k=10, filter={"destination": "Gorgona"})
+    assert len(results) == 10
+    assert all(doc.metadata["destination"] == "Gorgona" for doc in results)
+    callable_results = numpy_store.similarity_search("q0", k=10, filter=lambda d: d.metadata["destination"] == "Gorgona")
+    assert [d.page_content for d in callable_results] == [d.page_content for d in results]
+
+def test_k_larger_than_index_and_empty_store():
+    embedding = TableEmbeddings({"a": [1.0, 0.0], "b": [0.0, 1.0], "q": [1.0, 0.1]})
+    empty = NumpyVectorStore(embedding)
+    assert empty.similarity_search("q") == []
+    store = NumpyVectorStore.from_texts(["a", "b"], embedding)
+    assert [d.page_content for d in store.similarity_search("q", k=10)] == ["a", "b"]
+
+def test_delete_and_retriever_interface():
+    embedding = TableEmbeddings({"a": [1.0, 0.0], "b": [0.0, 1.0], "q": [1.0, 0.1]})
+    store = NumpyVectorStore.from_texts(["a", "b"], embedding, ids=["1", "2"])
+    store.delete(["1"])
+    assert len(store) == 1
+    assert [d.page_content for d in store.as_retriever().invoke("q")] == ["b"]
+
+def test_mmap_store_matches_numpy_store(store, tmp_path):
+    numpy_store, _ = store
+    mapped = MmapVectorStore.share(numpy_store, str(tmp_path), "v1")
+    assert isinstance(mapped._state[0], np.memmap)
+    assert len(mapped) == len(numpy_store)
+    for q in ["q0", "q1"]:
+        for filter in (None, {"destination": "Gorgona"}, lambda d: d.metadata["destination"] == "Providencia"):
+            expected = numpy_store.similarity_search_with_score(q, k=5, filter=filter)
+            actual = mapped.similarity_search_with_score(q, k=5, filter=filter)
+            assert [(d.id, d.page_content, d.metadata) for d, _ in actual] == [(d.id, d.page_content, d.metadata) for d, _ in expected]
+            assert np.allclose([s for _, s in actual], [s for _, s in expected])
+    queries = [numpy_store.embedding.embed_query(f"q{i}") for i in range(3)]
+    assert [[d.id for d, _ in found] for found in mapped.batch_similarity_search_with_score_by_vector(queries, k=3)] == \
+        [[d.id for d, _ in found] for found in numpy_store.batch_similarity_search_with_score_by_vector(queries, k=3)]
+
+def test_mmap_store_is_published_once_and_pruned(store, tmp_path):
+    numpy_store, _ = store
+    first = MmapVectorStore.share(numpy_store, str(tmp_path), "v1")
+    written = os.path.getmtime(os.path.join(first.path, "vectors.f32"))
+    # Another worker publishing the same version maps the existing files.
+    again = MmapVectorStore.share(numpy_store, str(tmp_path), "v1")
+    assert again.path == first.path
+    assert os.path.getmtime(os.path.join(again.path, "vectors.f32")) == written
+    MmapVectorStore.write(numpy_store.copy(), first.path)  # losing a publish race keeps the winner's files
+    for version in ("v2", "v3"):
+        time.sleep(0.01)
+        MmapVectorStore.share(numpy_store, str(tmp_path), version)
+    assert sorted(os.listdir(tmp_path)) == ["v2", "v3"]
+    # Files removed from disk stay readable through existing maps.
+    assert len(first.similarity_search("q0", k=3)) == 3
+
+def test_mmap_store_is_read_only_but_copies_are_editable(store, tmp_path):
+    numpy_store, _ = store
+    mapped = MmapVectorStore.share(numpy_store, str(tmp_path), "v1")
+    with pytest.raises(ReadOnlyIndexError):
+        mapped.delete(["x"])
+    with pytest.raises(ReadOnlyIndexError):
+        mapped.add_texts(["q0"])
+    clone = mapped.copy()
+    assert type(clone) is NumpyVectorStore
+    doomed = mapped.similarity_search("q0", k=1)[0].id
+    clone.delete([doomed])
+    assert len(clone) == len(mapped) - 1
+    assert mapped.similarity_search("q0", k=1)[0].id == doomed
+
+def test_shared_snapshot_serves_retrieval_and_reloads(tmp_path, make_embeddings):
+    from app.services.knowledge_base import load_faq_documents
+    from app.services.knowledge_index import build_snapshot, open_shared_snapshot, share_snapshot, update_snapshot
+    documents = load_faq_documents()
+    assert open_shared_snapshot(documents, make_embeddings(), str(tmp_path)) is None
+    snapshot = build_snapshot(documents, make_embeddings())
+    shared = share_snapshot(snapshot, str(tmp_path))
+    assert isinstance(shared.vectorstore, MmapVectorStore)
+    assert share_snapshot(shared, str(tmp_path)) is shared
+    query = "¿Cuál es el precio del viaje a Gorgona?"
+    expected = [d.id for d in snapshot.retriever.invoke(query)]
+    assert [d.id for d in shared.retriever.invoke(query)] == expected
+    assert shared.retriever_tool.invoke(query)
+    # Another worker maps the published index without embedding the documents again.
+    embeddings = make_embeddings()
+    embeddings.embed_documents = lambda texts: pytest.fail("documents embedded again")
+    opened = open_shared_snapshot(documents, embeddings, str(tmp_path))
+    assert opened.vectorstore.path == shared.vectorstore.path
+    assert opened.version == shared.version
+
+    reloaded, changes = update_snapshot(shared, documents[1:])
+    assert changes.removed == 1 and len(reloaded.vectorstore) == len(documents) - 1